@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compares the in-memory rate limiters on requests of many tenants.
+
+Every request is checked against the default limits plus a number of
+limits on specific URLs, for a tenant picked at random. The report shows
+the throughput of each limiter and how many tenants it keeps state for.
+
+    python tools/benchmark_limits.py --tenants 50000 --requests 200000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'trove', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+from trove.common import limits
+
+
+LIMITERS = [limits.Limiter, limits.CompiledLimiter]
+VERBS = ['GET', 'GET', 'GET', 'POST', 'PUT', 'DELETE']
+
+
+def build_limits(url_limits):
+    rules = list(limits.DEFAULT_LIMITS)
+    for i in range(url_limits):
+        verb = VERBS[i % len(VERBS)]
+        rules.append(limits.Limit(verb, '/v1.0/*/resource%d' % i,
+                                  '^/v1.0/[^/]+/resource%d' % i,
+                                  100, limits.PER_MINUTE))
+    return rules
+
+
+def run(limiter_class, rules, tenants, requests, url_limits, max_tenants):
+    if limiter_class is limits.CompiledLimiter:
+        limiter = limiter_class(rules, max_tenants=max_tenants)
+    else:
+        limiter = limiter_class(rules)
+    random.seed(0)
+    workload = [(random.choice(VERBS),
+                 '/v1.0/tenant/resource%d' % random.randint(0, url_limits),
+                 'tenant%d' % random.randint(0, tenants - 1))
+                for i in range(requests)]
+
+    delayed = 0
+    start = time.time()
+    for verb, url, tenant in workload:
+        if limiter.check_for_delay(verb, url, tenant)[0]:
+            delayed += 1
+    elapsed = time.time() - start
+
+    print("%s:" % limiter_class.__name__)
+    print("  %d requests in %.2fs, %.1f requests/s" %
+          (requests, elapsed, requests / elapsed))
+    print("  delayed: %d, tenants kept: %d" % (delayed, len(limiter.levels)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--tenants', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--url-limits', type=int, default=20,
+                        help='Limits on specific URLs besides the defaults.')
+    parser.add_argument('--max-tenants', type=int, default=10000,
+                        help='Tenants kept by the CompiledLimiter.')
+    args = parser.parse_args()
+
+    rules = build_limits(args.url_limits)
+    for limiter_class in LIMITERS:
+        run(limiter_class, rules, args.tenants, args.requests,
+            args.url_limits, args.max_tenants)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures the cost of validating request bodies against their schemas.
+
+Valid and invalid instance, user and database create bodies are validated
+by building a validator for every request, as requests used to be, and
+through the validators kept by wsgi.VALIDATORS. The report shows the time
+per validation of each.
+
+    python tools/benchmark_validation.py --iterations 5000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'trove', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+import jsonschema
+
+from trove.common import apischema
+from trove.common import wsgi
+
+
+USERS = [{'name': 'user%d' % i, 'password': 'password',
+          'databases': [{'name': 'db%d' % i}]} for i in range(5)]
+DATABASES = [{'name': 'db%d' % i, 'character_set': 'utf8'}
+             for i in range(5)]
+BODIES = [
+    ('instance create', apischema.instance['create'],
+     {'instance': {'name': 'instance', 'flavorRef': '7',
+                   'volume': {'size': 2}, 'databases': DATABASES,
+                   'users': USERS}},
+     {'instance': {'name': '', 'flavorRef': 'flavor',
+                   'volume': {'size': -1}, 'users': [{}]}}),
+    ('user create', apischema.user['create'],
+     {'users': USERS},
+     {'users': [{'name': 'user'}, {'password': ''}]}),
+    ('database create', apischema.dbschema['create'],
+     {'databases': DATABASES},
+     {'databases': [{}, {'name': ''}]}),
+]
+
+
+def validate_per_request(schema, body):
+    validator = jsonschema.Draft4Validator(schema)
+    if not validator.is_valid(body):
+        return sorted(validator.iter_errors(body), key=lambda e: e.path)
+    return []
+
+
+def validate_registry(schema, body):
+    return wsgi.VALIDATORS.validate(schema, body)
+
+
+def measure(validate, schema, body, iterations):
+    start = time.time()
+    for i in range(iterations):
+        validate(schema, body)
+    return (time.time() - start) / iterations * 1000000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    wsgi.VALIDATORS.compile(apischema.instance)
+    wsgi.VALIDATORS.compile(apischema.user)
+    wsgi.VALIDATORS.compile(apischema.dbschema)
+
+    print("%-24s %16s %16s" % ('body', 'per request (us)', 'registry (us)'))
+    for name, schema, valid, invalid in BODIES:
+        for kind, body in (('valid', valid), ('invalid', invalid)):
+            print("%-24s %16.1f %16.1f" %
+                  ('%s, %s' % (name, kind),
+                   measure(validate_per_request, schema, body,
+                           args.iterations),
+                   measure(validate_registry, schema, body,
+                           args.iterations)))
+
+
+if __name__ == '__main__':
+    main()
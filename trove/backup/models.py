@@ -45,7 +45,8 @@ class BackupState(object):
 class Backup(object):
 
     @classmethod
-    def create(cls, context, instance, name, description=None):
+    def create(cls, context, instance, name, description=None,
+               parent_id=None):
         """
         create db record for Backup
         :param cls:
@@ -53,6 +54,7 @@ class Backup(object):
         :param instance:
         :param name:
         :param description:
+        :param parent_id: Id of the backup an incremental backup builds on
         :return:
         """
 
@@ -67,12 +69,18 @@ class Backup(object):
 
             cls.verify_swift_auth_token(context)
 
+            parent = None
+            if parent_id:
+                parent = cls.get_by_id(context, parent_id)
+                cls.validate_parent(parent, instance_id)
+
             try:
                 db_info = DBBackup.create(name=name,
                                           description=description,
                                           tenant_id=context.tenant,
                                           state=BackupState.NEW,
                                           instance_id=instance_id,
+                                          parent_id=parent_id,
                                           deleted=False)
             except exception.InvalidModelError as ex:
                 LOG.exception("Unable to create Backup record:")
@@ -85,6 +93,10 @@ class Backup(object):
                            'backup_type': db_info.backup_type,
                            'checksum': db_info.checksum,
                            }
+            if parent:
+                backup_info['parent'] = {'location': parent.location,
+                                         'checksum': parent.checksum,
+                                         }
             api.API(context).create_backup(backup_info, instance_id)
             return db_info
 
@@ -92,6 +104,47 @@ class Backup(object):
                                {'backups': 1},
                                _create_resources)
 
+    @classmethod
+    def validate_parent(cls, parent, instance_id):
+        """
+        Check that an incremental backup of instance_id can build on parent
+        :param parent: the parent backup
+        :param instance_id: Id of the instance being backed up
+        """
+        if parent.instance_id != instance_id:
+            msg = ("Backup %s was not taken from instance %s." %
+                   (parent.id, instance_id))
+            raise exception.UnprocessableEntity(msg)
+        if parent.state != BackupState.COMPLETED:
+            msg = ("Backup %s can not be used as a parent because it is "
+                   "not completed." % parent.id)
+            raise exception.UnprocessableEntity(msg)
+        incremental = CONF.backup_incremental_strategy
+        if (parent.backup_type not in incremental and
+                parent.backup_type not in incremental.values()):
+            msg = ("Backup %s can not be used as a parent because its "
+                   "strategy %s does not support incremental backups." %
+                   (parent.id, parent.backup_type))
+            raise exception.UnprocessableEntity(msg)
+
+    @classmethod
+    def children(cls, backup_id):
+        """
+        Returns the live backups that build on backup_id, down the chain
+        of incremental backups. Parents come before their children.
+        :param backup_id: Id of the parent backup
+        """
+        children = []
+        parent_ids = [backup_id]
+        while parent_ids:
+            query = DBBackup.query()
+            query = query.filter(DBBackup.parent_id.in_(parent_ids))
+            query = query.filter_by(deleted=False)
+            found = query.all()
+            children.extend(found)
+            parent_ids = [child.id for child in found]
+        return children
+
     @classmethod
     def running(cls, instance_id, exclude=None):
         """
@@ -184,24 +237,32 @@ class Backup(object):
     @classmethod
     def delete(cls, context, backup_id):
         """
-        update Backup table on deleted flag for given Backup
+        update Backup table on deleted flag for given Backup and for the
+        incremental backups that build on it
         :param cls:
         :param context: context containing the tenant id and token
         :param backup_id: Backup uuid
         :return:
         """
+        backup = cls.get_by_id(context, backup_id)
+        children = cls.children(backup_id)
 
         def _delete_resources():
-            backup = cls.get_by_id(context, backup_id)
             if backup.is_running:
                 msg = ("Backup %s cannot be delete because it is running." %
                        backup_id)
                 raise exception.UnprocessableEntity(msg)
+            for child in children:
+                if child.is_running:
+                    msg = ("Backup %s cannot be deleted because its "
+                           "incremental backup %s is running." %
+                           (backup_id, child.id))
+                    raise exception.UnprocessableEntity(msg)
             cls.verify_swift_auth_token(context)
             api.API(context).delete_backup(backup_id)
 
         return run_with_quotas(context.tenant,
-                               {'backups': -1},
+                               {'backups': -(len(children) + 1)},
                                _delete_resources)
 
     @classmethod
@@ -222,7 +283,7 @@ class DBBackup(DatabaseModelBase):
     _data_fields = ['id', 'name', 'description', 'location', 'backup_type',
                     'size', 'tenant_id', 'state', 'instance_id',
                     'checksum', 'backup_timestamp', 'deleted', 'created',
-                    'updated', 'deleted_at']
+                    'updated', 'deleted_at', 'parent_id']
     preserve_on_delete = True
 
     @property
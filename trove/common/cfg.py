@@ -82,13 +82,33 @@ common_opts = [
     cfg.IntOpt('users_page_size', default=20),
     cfg.IntOpt('databases_page_size', default=20),
     cfg.IntOpt('instances_page_size', default=20),
+    cfg.IntOpt('mgmt_instances_page_size', default=100,
+               help='Maximum number of instances returned in one page of '
+                    'the management instance list.'),
+    cfg.IntOpt('mgmt_server_get_concurrency', default=10,
+               help='Number of Nova servers fetched at the same time for a '
+                    'page of the management instance list.'),
     cfg.IntOpt('backups_page_size', default=20),
+    cfg.StrOpt('instances_server_lookup', default='list',
+               help="How Nova servers are fetched when listing instances: "
+                    "'list' fetches all servers of the tenant, 'page' "
+                    "fetches only the servers of the instances on the "
+                    "requested page and 'cache' reuses the server list of "
+                    "the tenant for server_list_cache_ttl seconds."),
+    cfg.IntOpt('server_list_cache_ttl', default=5,
+               help='Seconds a tenant server list is cached when '
+                    'instances_server_lookup is set to cache.'),
+    cfg.IntOpt('server_list_cache_size', default=1000,
+               help='Maximum number of tenants whose server list is cached.'),
     cfg.ListOpt('ignore_users', default=['os_admin', 'root']),
     cfg.ListOpt('ignore_dbs', default=['lost+found',
                                        'mysql',
                                        'information_schema']),
     cfg.IntOpt('agent_call_low_timeout', default=5),
     cfg.IntOpt('agent_call_high_timeout', default=60),
+    cfg.IntOpt('host_update_concurrency', default=10,
+               help='Number of guests of a host updated at the same time by '
+                    'the management host update action.'),
     cfg.StrOpt('guest_id', default=None),
     cfg.IntOpt('state_change_wait_time', default=3 * 60),
     cfg.IntOpt('agent_heartbeat_time', default=10),
@@ -107,10 +127,20 @@ common_opts = [
                help='default maximum number of backups created by a tenant'),
     cfg.StrOpt('quota_driver',
                default='trove.quota.quota.DbQuotaDriver',
-               help='default driver to use for quota checks'),
+               help='default driver to use for quota checks. '
+               'trove.quota.quota.AtomicDbQuotaDriver reserves and commits '
+               'quotas in single transactions.'),
     cfg.StrOpt('taskmanager_queue', default='taskmanager'),
     cfg.StrOpt('conductor_queue', default='trove-conductor'),
     cfg.IntOpt('trove_conductor_workers', default=1),
+    cfg.IntOpt('conductor_heartbeat_flush_interval', default=0,
+               help='Seconds the conductor buffers guest heartbeats before '
+                    'writing them to the database in batches. Set to 0 to '
+                    'write every heartbeat as it arrives.'),
+    cfg.IntOpt('guest_status_keepalive_interval', default=0,
+               help='Seconds between heartbeats the guest sends when the '
+                    'status of its datastore has not changed. Set to 0 to '
+                    'send a heartbeat on every status update.'),
     cfg.BoolOpt('use_nova_server_volume', default=False),
     cfg.BoolOpt('use_heat', default=False),
     cfg.StrOpt('device_path', default='/dev/vdb'),
@@ -119,6 +149,18 @@ common_opts = [
                help="The default datastore id or name to use if one is not "
                "provided by the user. If the default value is None, the field"
                " becomes required in the instance-create request."),
+    cfg.IntOpt('datastore_cache_ttl', default=300,
+               help='Seconds datastore and datastore version metadata is '
+                    'cached in memory. Each process keeps its own cache, so '
+                    'running services may serve changes made with '
+                    'trove-manage for up to this long. Set to 0 to disable '
+                    'the cache.'),
+    cfg.IntOpt('flavor_cache_ttl', default=600,
+               help='Seconds Nova flavors are cached in memory. Set to 0 to '
+                    'disable the cache.'),
+    cfg.IntOpt('flavor_cache_stale_ttl', default=3600,
+               help='Seconds an expired flavor is still served from the '
+                    'cache while it is fetched again in the background.'),
     cfg.StrOpt('datastore_manager', default=None,
                help='manager class in guestagent, setup by taskmanager on '
                'instance provision'),
@@ -142,6 +184,21 @@ common_opts = [
     cfg.IntOpt('http_post_rate', default=200),
     cfg.IntOpt('http_delete_rate', default=200),
     cfg.IntOpt('http_put_rate', default=200),
+    cfg.IntOpt('http_rate_limit_max_tenants', default=10000,
+               help='Number of tenants the rate limiter keeps the request '
+                    'history of before dropping the idle ones.'),
+    cfg.IntOpt('http_rate_limit_batch_size', default=10,
+               help='Most requests the shared rate limiter asks the remote '
+                    'limiter to admit at once.'),
+    cfg.FloatOpt('http_rate_limit_lease_time', default=1.0,
+                 help='Seconds the shared rate limiter keeps requests '
+                      'admitted by the remote limiter.'),
+    cfg.IntOpt('http_rate_limit_pool_size', default=4,
+               help='Idle connections kept open to the remote rate '
+                    'limiter.'),
+    cfg.FloatOpt('http_rate_limit_timeout', default=0.5,
+                 help='Seconds to wait for the remote rate limiter before '
+                      'admitting the request.'),
     cfg.BoolOpt('hostname_require_ipv4', default=True,
                 help="Require user hostnames to be IPv4 addresses."),
     cfg.BoolOpt('trove_security_groups_support', default=True),
@@ -155,6 +212,35 @@ common_opts = [
                help='Time to sleep during the check active guest'),
     cfg.IntOpt('usage_timeout', default=300,
                help='Timeout to wait for an guest to become active'),
+    cfg.FloatOpt('poll_backoff', default=1.5,
+                 help='Factor the interval between two polls of an operation '
+                      'grows by, until poll_max_sleep_time.'),
+    cfg.IntOpt('poll_max_sleep_time', default=30,
+               help='Upper bound of the interval between two polls of an '
+                    'operation, in seconds.'),
+    cfg.FloatOpt('poll_jitter', default=0.2,
+                 help='Fraction of each polling interval randomly added or '
+                      'taken away, so that operations started together do '
+                      'not poll in lockstep.'),
+    cfg.BoolOpt('task_wait_notifications', default=True,
+                help='Wake taskmanager tasks waiting on an instance when the '
+                     'conductor reports a change of its service status or '
+                     'Nova a change of its server, polling only as a '
+                     'fallback.'),
+    cfg.IntOpt('task_wait_fallback_interval', default=5,
+               help='Seconds a task waits for a notification before polling '
+                    'the instance anyway. Doubled after every poll that '
+                    'finds nothing new.'),
+    cfg.IntOpt('task_wait_max_fallback_interval', default=60,
+               help='Upper bound of the fallback polling interval, in '
+                    'seconds.'),
+    cfg.StrOpt('nova_notification_topic', default=None,
+               help='Topic of the Nova notifications the taskmanager listens '
+                    'to for server state changes, e.g. notifications.info. '
+                    'Unset to not listen to Nova, tasks waiting on a server '
+                    'then poll it.'),
+    cfg.StrOpt('nova_notification_exchange', default='nova',
+               help='Exchange Nova publishes its notifications on.'),
     cfg.StrOpt('region', default='LOCAL_DEV',
                help='The region this service is located.'),
     cfg.StrOpt('backup_runner',
@@ -163,12 +249,28 @@ common_opts = [
                 help='Additional options to be passed to the backup runner'),
     cfg.StrOpt('backup_strategy', default='InnoBackupEx',
                help='Default strategy to perform backups'),
+    cfg.DictOpt('backup_incremental_strategy',
+                default={'InnoBackupEx': 'InnoBackupExIncremental'},
+                help='Incremental backup strategy for each backup strategy. '
+                     'Backups with a parent taken with a strategy missing '
+                     'here are full backups.'),
     cfg.StrOpt('backup_namespace',
                default='trove.guestagent.strategies.backup.mysql_impl',
                help='Namespace to load backup strategies from'),
     cfg.StrOpt('restore_namespace',
                default='trove.guestagent.strategies.restore.mysql_impl',
                help='Namespace to load restore strategies from'),
+    cfg.IntOpt('backup_logical_threads', default=4,
+               help='Number of threads dumping and loading tables in '
+                    'parallel with the MyDumper strategy.'),
+    cfg.IntOpt('backup_logical_rows', default=500000,
+               help='Rows in each chunk file of a table dumped with the '
+                    'MyDumper strategy.'),
+    cfg.StrOpt('backup_staging_dir', default=None,
+               help='Directory backups are staged in on the guest, writable '
+                    'by the guest agent. Put it on the data volume but '
+                    'outside mount_point, where mysqld would list it as a '
+                    'database. Required by the MyDumper strategy.'),
     cfg.BoolOpt('verify_swift_checksum_on_restore', default=True,
                 help='Enable verification of swift checksum before starting '
                 ' restore; makes sure the checksum of original backup matches '
@@ -181,6 +283,14 @@ common_opts = [
     cfg.StrOpt('backup_swift_container', default='database_backups'),
     cfg.BoolOpt('backup_use_gzip_compression', default=True,
                 help='Compress backups using gzip.'),
+    cfg.StrOpt('backup_compression', default='gzip',
+               help='Codec used to compress backups when '
+                    'backup_use_gzip_compression is enabled: gzip, pigz, '
+                    'lz4 or zstd. Falls back to gzip when the tool is not '
+                    'installed on the guest.'),
+    cfg.IntOpt('backup_compression_threads', default=0,
+               help='Threads used by codecs that compress in parallel. '
+                    '0 uses one thread per CPU.'),
     cfg.BoolOpt('backup_use_openssl_encryption', default=True,
                 help='Encrypt backups using openssl.'),
     cfg.StrOpt('backup_aes_cbc_key', default='default_aes_cbc_key',
@@ -195,6 +305,30 @@ common_opts = [
                ' See: http://stackoverflow.com/questions/1131220/'),
     cfg.IntOpt('backup_segment_max_size', default=2 * (1024 ** 3),
                help="Maximum size of each segment of the backup file."),
+    cfg.IntOpt('backup_upload_concurrency', default=1,
+               help='Number of backup segments uploaded to swift at the '
+                    'same time. With more than one, segments are buffered '
+                    'while they upload, so backup_staging_dir must be set '
+                    'as well.'),
+    cfg.IntOpt('backup_upload_buffer_size', default=64 * (1024 ** 2),
+               help='Bytes of each buffered backup segment kept in memory '
+                    'before the rest is spilled to backup_staging_dir.'),
+    cfg.IntOpt('backup_download_concurrency', default=1,
+               help='Number of backup segments downloaded from swift at the '
+                    'same time during a restore. With more than one, the '
+                    'segments are fetched natively instead of with the '
+                    'swift command line client and buffered until they are '
+                    'read, so backup_staging_dir must be set as well.'),
+    cfg.IntOpt('backup_download_buffer_size', default=64 * (1024 ** 2),
+               help='Bytes of each downloaded backup segment kept in memory '
+                    'before the rest is spilled to backup_staging_dir.'),
+    cfg.IntOpt('remote_client_cache_ttl', default=300,
+               help='Seconds nova and cinder clients are reused for '
+                    'requests made with the same auth token. Keep it below '
+                    'the token lifetime; 0 disables the reuse.'),
+    cfg.IntOpt('remote_client_cache_size', default=1000,
+               help='Maximum number of cached nova and cinder '
+                    'clients.'),
     cfg.StrOpt('remote_dns_client',
                default='trove.common.remote.dns_client'),
     cfg.StrOpt('remote_guest_client',
@@ -212,6 +346,9 @@ common_opts = [
     cfg.IntOpt('exists_notification_ticks', default=360,
                help='Number of report_intevals to wait between pushing events '
                     '(see report_interval)'),
+    cfg.IntOpt('exists_notification_chunk_size', default=500,
+               help='Number of instances loaded at a time while pushing '
+                    'exists events'),
     cfg.DictOpt('notification_service_id', default={},
                 help='Unique ID to tag notification events'),
     cfg.StrOpt('nova_proxy_admin_user', default='',
@@ -74,6 +74,11 @@ class ServiceStatus(object):
             raise ValueError(msg % desc)
         return ServiceStatus._lookup[status_codes[0]]
 
+    @staticmethod
+    def all_with_api_status(api_status):
+        return [status for status in ServiceStatus._lookup.values()
+                if status.api_status == api_status]
+
     @staticmethod
     def is_valid_code(code):
         return code in ServiceStatus._lookup
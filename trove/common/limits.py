@@ -19,10 +19,13 @@ Module dedicated functions/classes dealing with rate limiting requests.
 
 import collections
 import copy
+import heapq
 import httplib
 import math
 import re
+import socket
 import time
+from array import array
 import webob.dec
 import webob.exc
 
@@ -30,11 +33,13 @@ from trove.common import cfg
 from trove.common import wsgi as base_wsgi
 from trove.openstack.common import importutils
 from trove.openstack.common import jsonutils
+from trove.openstack.common import log as logging
 from trove.openstack.common import wsgi
 from trove.openstack.common.gettextutils import _
 
 
 CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
 
 # Convenience constants for the limits dictionary passed to Limiter().
 PER_SECOND = 1
@@ -42,6 +47,9 @@ PER_MINUTE = 60
 PER_HOUR = 60 * 60
 PER_DAY = 60 * 60 * 24
 
+# Most requests a WsgiLimiter admits at once.
+MAX_ADMIT_COUNT = 100
+
 
 class Limit(object):
     """
@@ -176,7 +184,7 @@ class RateLimitingMiddleware(base_wsgi.TroveMiddleware):
 
         # Select the limiter class
         if limiter is None:
-            limiter = Limiter
+            limiter = CompiledLimiter
         else:
             limiter = importutils.import_class(limiter)
 
@@ -325,20 +333,213 @@ class Limiter(object):
         return result
 
 
+class _LimitMatcher(object):
+    """
+    Finds the limits relevant to a request with one regex match per verb.
+    """
+
+    def __init__(self, limits):
+        self.limits = limits
+        self._verbs = {}
+        for verb in set(limit.verb for limit in limits):
+            indexes = [i for i, limit in enumerate(limits)
+                       if limit.verb == verb]
+            self._verbs[verb] = self._compile(indexes)
+
+    def _compile(self, indexes):
+        combined = []
+        single = []
+        for i in indexes:
+            regex = re.compile(self.limits[i].regex)
+            # Groups or inline flags of a regex would leak into the others
+            # once combined, so such a regex is matched on its own.
+            if regex.groups or regex.flags:
+                single.append((i, regex))
+            else:
+                combined.append(i)
+        # Each limit is an optional lookahead anchored at the start of the
+        # URL, so a single match captures a group for every relevant limit.
+        pattern = ''.join('(?=(%s))?' % self.limits[i].regex
+                          for i in combined)
+        return combined, re.compile(pattern), single
+
+    def match(self, verb, url):
+        """Returns the indexes of the limits relevant to verb and url."""
+        if verb not in self._verbs:
+            return []
+        combined, regex, single = self._verbs[verb]
+        groups = regex.match(url).groups()
+        matched = [i for i, group in zip(combined, groups)
+                   if group is not None]
+        matched.extend(i for i, regex in single if regex.match(url))
+        return matched
+
+
+class _Levels(object):
+    """
+    Leaky bucket state of one user, stored per limit in flat arrays.
+    """
+
+    __slots__ = ('water_level', 'last_request', 'next_request', 'remaining',
+                 'last_seen')
+
+    def __init__(self, limits):
+        # A bucket which never leaked since time 0 is as empty as a new one,
+        # so zero stands in for the first request.
+        zeros = array('d', [0.0]) * len(limits)
+        self.water_level = array('d', zeros)
+        self.last_request = array('d', zeros)
+        self.next_request = array('d', zeros)
+        self.remaining = array('d', [limit.value for limit in limits])
+        self.last_seen = 0.0
+
+
+class CompiledLimiter(Limiter):
+    """
+    Rate-limit checking class which handles limits in memory.
+
+    Unlike `Limiter`, the regexes of the limits are compiled once into a
+    single matcher per verb, and users only keep the state of their buckets
+    in a `_Levels`. Users which have not made a request for the longest
+    unit of the limits are dropped when the number of users reaches
+    max_tenants, followed by the least recently seen ones if needed.
+    """
+
+    def __init__(self, limits, max_tenants=None, **kwargs):
+        """
+        Initialize the new `CompiledLimiter`.
+
+        @param limits: List of `Limit` objects
+        @param max_tenants: Number of users to keep the state of
+        """
+        self.limits = list(limits)
+        self._default = _LimitMatcher(self.limits)
+        self._users = {}
+        self.levels = {}
+
+        # Pick up any per-user limit information
+        for key, value in kwargs.items():
+            if key.startswith('user:'):
+                username = key[5:]
+                self._users[username] = _LimitMatcher(
+                    self.parse_limits(value))
+
+        if max_tenants is None:
+            max_tenants = CONF.http_rate_limit_max_tenants
+        self.max_tenants = int(max_tenants)
+        # Every bucket is empty again after its unit of time.
+        self.idle_time = max([0] + [limit.unit for limit in self.limits] +
+                             [limit.unit for matcher in self._users.values()
+                              for limit in matcher.limits])
+
+    def _get_time(self):
+        """Retrieve the current time. Broken out for testability."""
+        return time.time()
+
+    def _evict(self, now):
+        """Drops idle users, then the least recently seen ones."""
+        idle = now - self.idle_time
+        for username, levels in self.levels.items():
+            if levels.last_seen <= idle:
+                del self.levels[username]
+        keep = self.max_tenants - max(self.max_tenants // 10, 1)
+        excess = len(self.levels) - keep
+        if excess > 0:
+            oldest = heapq.nsmallest(excess, self.levels.items(),
+                                     key=lambda item: item[1].last_seen)
+            for username, levels in oldest:
+                del self.levels[username]
+
+    def get_limits(self, username=None):
+        """
+        Return the limits for a given user.
+        """
+        matcher = self._users.get(username, self._default)
+        levels = self.levels.get(username)
+        now = self._get_time()
+        result = []
+        for i, limit in enumerate(matcher.limits):
+            if levels is None:
+                remaining = limit.value
+                next_request = None
+            else:
+                remaining = levels.remaining[i]
+                next_request = levels.next_request[i]
+            result.append({
+                "verb": limit.verb,
+                "URI": limit.uri,
+                "regex": limit.regex,
+                "value": limit.value,
+                "remaining": int(remaining),
+                "unit": limit.display_unit(),
+                "resetTime": int(next_request or now),
+            })
+        return result
+
+    def check_for_delay(self, verb, url, username=None):
+        """
+        Check the given verb/user/user triplet for limit.
+
+        @return: Tuple of delay (in seconds) and error message (or None, None)
+        """
+        matcher = self._users.get(username, self._default)
+        indexes = matcher.match(verb, url)
+        if not indexes:
+            return None, None
+
+        now = self._get_time()
+        levels = self.levels.get(username)
+        if levels is None:
+            if len(self.levels) >= self.max_tenants:
+                self._evict(now)
+            levels = self.levels[username] = _Levels(matcher.limits)
+        levels.last_seen = now
+
+        delays = []
+        for i in indexes:
+            limit = matcher.limits[i]
+            leak_value = now - levels.last_request[i]
+            water_level = max(levels.water_level[i] - leak_value, 0)
+            water_level += limit.request_value
+            levels.last_request[i] = now
+
+            difference = water_level - limit.capacity
+            if difference > 0:
+                levels.water_level[i] = water_level - limit.request_value
+                levels.next_request[i] = now + difference
+                delays.append((difference, limit.error_message))
+                continue
+
+            cap = limit.capacity
+            levels.water_level[i] = water_level
+            levels.remaining[i] = math.floor(
+                ((cap - water_level) / cap) * limit.value)
+            levels.next_request[i] = now
+
+        if delays:
+            delays.sort()
+            return delays[0]
+
+        return None, None
+
+
 class WsgiLimiter(object):
     """
-    Rate-limit checking from a WSGI application. Uses an in-memory `Limiter`.
+    Rate-limit checking from a WSGI application. Uses an in-memory
+    `CompiledLimiter`.
 
     To use, POST ``/<username>`` with JSON data such as::
 
         {
             "verb" : GET,
-            "path" : "/servers"
+            "path" : "/servers",
+            "count" : 1
         }
 
-    and receive a 204 No Content, or a 403 Forbidden with an X-Wait-Seconds
-    header containing the number of seconds to wait before the action would
-    succeed.
+    and receive a 204 No Content with an X-Admitted header containing how
+    many of the count requests were admitted, or a 403 Forbidden with an
+    X-Wait-Seconds header containing the number of seconds to wait before
+    the action would succeed.
     """
 
     def __init__(self, limits=None):
@@ -347,7 +548,15 @@ class WsgiLimiter(object):
 
         @param limits: List of `Limit` objects
         """
-        self._limiter = Limiter(limits or DEFAULT_LIMITS)
+        self._limiter = CompiledLimiter(limits or DEFAULT_LIMITS)
+
+    @classmethod
+    def factory(cls, global_config, **local_config):
+        """Used for paste app factories in paste.deploy config files."""
+        limits = local_config.get('limits')
+        if limits is not None:
+            limits = CompiledLimiter.parse_limits(limits)
+        return cls(limits)
 
     @webob.dec.wsgify(RequestClass=wsgi.Request)
     def __call__(self, request):
@@ -367,14 +576,62 @@ class WsgiLimiter(object):
         username = request.path_info_pop()
         verb = info.get("verb")
         path = info.get("path")
+        try:
+            count = int(info.get("count", 1))
+        except (TypeError, ValueError):
+            raise webob.exc.HTTPBadRequest()
+        count = min(max(count, 1), MAX_ADMIT_COUNT)
 
-        delay, error = self._limiter.check_for_delay(verb, path, username)
+        admitted = 0
+        while admitted < count:
+            delay, error = self._limiter.check_for_delay(verb, path, username)
+            if delay:
+                break
+            admitted += 1
 
-        if delay:
+        if not admitted:
             headers = {"X-Wait-Seconds": "%.2f" % delay}
             return webob.exc.HTTPForbidden(headers=headers, explanation=error)
         else:
-            return webob.exc.HTTPNoContent()
+            headers = {"X-Admitted": str(admitted)}
+            return webob.exc.HTTPNoContent(headers=headers)
+
+
+class _ConnectionPool(object):
+    """
+    Keeps HTTP connections to a host open between requests.
+    """
+
+    def __init__(self, address, size, timeout):
+        self.address = address
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+
+    def request(self, method, path, body=None, headers=None):
+        """Sends a request, returns the response and its whole body."""
+        while True:
+            reused = bool(self._idle)
+            if reused:
+                conn = self._idle.pop()
+            else:
+                conn = httplib.HTTPConnection(self.address,
+                                              timeout=self.timeout)
+            try:
+                conn.request(method, path, body, headers or {})
+                resp = conn.getresponse()
+                data = resp.read()
+            except (socket.error, httplib.HTTPException):
+                conn.close()
+                # The server may have closed a connection left idle.
+                if reused:
+                    continue
+                raise
+            if resp.will_close or len(self._idle) >= self.size:
+                conn.close()
+            else:
+                self._idle.append(conn)
+            return resp, data
 
 
 class WsgiLimiterProxy(object):
@@ -382,31 +639,46 @@ class WsgiLimiterProxy(object):
     Rate-limit requests based on answers from a remote source.
     """
 
-    def __init__(self, limiter_address):
+    def __init__(self, limiter_address, pool_size=None, timeout=None):
         """
         Initialize the new `WsgiLimiterProxy`.
 
         @param limiter_address: IP/port combination of where to request limit
+        @param pool_size: Number of idle connections to keep open
+        @param timeout: Seconds to wait for the remote limiter
         """
         self.limiter_address = limiter_address
+        if pool_size is None:
+            pool_size = CONF.http_rate_limit_pool_size
+        if timeout is None:
+            timeout = CONF.http_rate_limit_timeout
+        self._pool = _ConnectionPool(limiter_address, int(pool_size),
+                                     float(timeout))
+
+    def admit(self, verb, path, username=None, count=1):
+        """
+        Ask the remote limiter to admit up to count requests.
 
-    def check_for_delay(self, verb, path, username=None):
-        body = jsonutils.dumps({"verb": verb, "path": path})
+        @return: Tuple of the number of admitted requests, and the delay
+                 and error message if none was (or None, None)
+        """
+        body = jsonutils.dumps({"verb": verb, "path": path, "count": count})
         headers = {"Content-Type": "application/json"}
 
-        conn = httplib.HTTPConnection(self.limiter_address)
-
         if username:
-            conn.request("POST", "/%s" % (username), body, headers)
+            resp, body = self._pool.request("POST", "/%s" % (username), body,
+                                            headers)
         else:
-            conn.request("POST", "/", body, headers)
+            resp, body = self._pool.request("POST", "/", body, headers)
 
-        resp = conn.getresponse()
+        if 200 <= resp.status < 300:
+            return int(resp.getheader("X-Admitted", 1)), None, None
 
-        if 200 >= resp.status < 300:
-            return None, None
+        return 0, resp.getheader("X-Wait-Seconds"), body or None
 
-        return resp.getheader("X-Wait-Seconds"), resp.read() or None
+    def check_for_delay(self, verb, path, username=None):
+        admitted, delay, error = self.admit(verb, path, username)
+        return delay, error
 
     # This was ported from nova.
     # Keeping it as a static method for the sake of consistency
@@ -426,3 +698,116 @@ class WsgiLimiterProxy(object):
         """
 
         return []
+
+
+class _Lease(object):
+    """
+    Requests a remote limiter admitted in advance for one user and verb.
+    """
+
+    __slots__ = ('admitted', 'batch', 'expires', 'retry_at', 'error',
+                 'last_seen')
+
+    def __init__(self):
+        self.admitted = 0
+        self.batch = 1
+        self.expires = 0.0
+        self.retry_at = 0.0
+        self.error = None
+        self.last_seen = 0.0
+
+
+class SharedLimiter(CompiledLimiter):
+    """
+    Rate-limit checking class which shares the limits of every API worker
+    through a remote `WsgiLimiter`, such as one served with
+    ``paste.app_factory = trove.common.limits:WsgiLimiter.factory``.
+
+    Requests are matched against the limits locally, which must be the
+    same as the remote ones. The remote limiter is then asked to admit a
+    batch of requests for the user, verb and limits at once, and the
+    requests are admitted from this lease until it is used up or
+    lease_time is over. A denial is kept until the request may be retried
+    or lease_time is over. The batch doubles, up to batch_size, when a
+    lease is used up, and is halved when one expires unused, so that few
+    admitted requests are left unused. Requests are admitted when the
+    remote limiter cannot be reached or does not answer within timeout.
+    """
+
+    def __init__(self, limits, limiter_address=None, batch_size=None,
+                 lease_time=None, pool_size=None, timeout=None, **kwargs):
+        """
+        Initialize the new `SharedLimiter`.
+
+        @param limits: List of `Limit` objects
+        @param limiter_address: IP/port combination of the remote limiter
+        @param batch_size: Most requests to ask the remote limiter at once
+        @param lease_time: Seconds admitted requests and denials are kept
+        """
+        super(SharedLimiter, self).__init__(limits, **kwargs)
+        self._proxy = WsgiLimiterProxy(limiter_address, pool_size, timeout)
+        if batch_size is None:
+            batch_size = CONF.http_rate_limit_batch_size
+        if lease_time is None:
+            lease_time = CONF.http_rate_limit_lease_time
+        self.batch_size = int(batch_size)
+        self.lease_time = float(lease_time)
+        self.idle_time = self.lease_time
+
+    def check_for_delay(self, verb, url, username=None):
+        """
+        Check the given verb/user/user triplet for limit.
+
+        @return: Tuple of delay (in seconds) and error message (or None, None)
+        """
+        matcher = self._users.get(username, self._default)
+        indexes = matcher.match(verb, url)
+        if not indexes:
+            return None, None
+
+        now = self._get_time()
+        key = (username, verb, tuple(indexes))
+        lease = self.levels.get(key)
+        if lease is None:
+            if len(self.levels) >= self.max_tenants:
+                self._evict(now)
+            lease = self.levels[key] = _Lease()
+        lease.last_seen = now
+
+        if now < lease.expires:
+            if lease.admitted:
+                lease.admitted -= 1
+                return None, None
+            if now < lease.retry_at:
+                return lease.retry_at - now, lease.error
+            lease.batch = min(lease.batch * 2, self.batch_size)
+        elif lease.admitted:
+            lease.batch = max(lease.batch // 2, 1)
+
+        try:
+            admitted, delay, error = self._proxy.admit(verb, url, username,
+                                                       lease.batch)
+        except (socket.error, httplib.HTTPException) as e:
+            LOG.warn(_("Could not reach the rate limiter at %(address)s, "
+                       "admitting the request: %(error)s") %
+                     {'address': self._proxy.limiter_address, 'error': e})
+            return None, None
+
+        if admitted:
+            lease.admitted = admitted - 1
+            lease.expires = now + self.lease_time
+            lease.retry_at = 0.0
+            return None, None
+
+        if delay is None:
+            LOG.warn(_("The rate limiter at %s neither admitted the request "
+                       "nor said when to retry it, admitting it.") %
+                     self._proxy.limiter_address)
+            return None, None
+
+        delay = float(delay)
+        lease.admitted = 0
+        lease.retry_at = now + delay
+        lease.expires = now + min(delay, self.lease_time)
+        lease.error = error
+        return delay, error
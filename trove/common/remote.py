@@ -16,6 +16,7 @@
 #    under the License.
 
 from trove.common import cfg
+from trove.common import utils
 from trove.openstack.common.importutils import import_class
 from cinderclient.v2 import client as CinderClient
 from heatclient.v1 import client as HeatClient
@@ -31,6 +32,13 @@ OBJECT_STORE_URL = CONF.swift_url
 USE_SNET = CONF.backup_use_snet
 HEAT_URL = CONF.heat_url
 
+# Clients are reused for requests made with the same tenant and token, so
+# their HTTP connections are kept alive between calls. Entries expire after
+# remote_client_cache_ttl seconds, which should stay below the lifetime of
+# a token.
+CLIENT_CACHE = utils.TTLCache(CONF.remote_client_cache_ttl,
+                              max_size=CONF.remote_client_cache_size)
+
 
 def dns_client(context):
     from trove.dns.manager import DnsManager
@@ -56,7 +64,8 @@ def create_admin_nova_client(context):
     Creates client that uses trove admin credentials
     :return: a client for nova for the trove admin
     """
-    client = create_nova_client(context)
+    # The client is modified, so it must not be one shared from the cache.
+    client = _create_nova_client(context)
     client.client.auth_token = None
     return client
 
@@ -86,9 +95,38 @@ def swift_client(context):
     return client
 
 
+def cached_client(name, create_client):
+    """Wrap a client factory so that clients are reused for a token.
+
+    Clients are cached by service, tenant and auth token, so a new token
+    never gets the client of an old one. Only clients which are safe to use
+    from several greenthreads at once can be cached.
+    """
+    def create_cached_client(context):
+        if context is None:
+            return create_client(context)
+        key = (name, context.tenant, context.auth_token)
+        client = CLIENT_CACHE.get(key)
+        if client is None:
+            client = create_client(context)
+            CLIENT_CACHE.set(key, client)
+        return client
+
+    return create_cached_client
+
+
+def clear_client_cache():
+    CLIENT_CACHE.clear()
+
+
+_create_nova_client = import_class(CONF.remote_nova_client)
+
 create_dns_client = import_class(CONF.remote_dns_client)
 create_guest_client = import_class(CONF.remote_guest_client)
-create_nova_client = import_class(CONF.remote_nova_client)
+create_nova_client = cached_client('nova', _create_nova_client)
+# A swift Connection holds a single HTTP connection, which greenthreads
+# can not share, so each caller gets its own.
 create_swift_client = import_class(CONF.remote_swift_client)
-create_cinder_client = import_class(CONF.remote_cinder_client)
+create_cinder_client = cached_client('cinder',
+                                     import_class(CONF.remote_cinder_client))
 create_heat_client = import_class(CONF.remote_heat_client)
@@ -18,6 +18,7 @@
 
 import datetime
 import inspect
+import random
 import sys
 import time
 import urlparse
@@ -129,6 +130,64 @@ class cached_property(object):
         return value
 
 
+class TTLCache(object):
+    """A small in-process cache whose entries expire after ttl seconds.
+
+    Hits and misses are counted so the effectiveness of the cache can be
+    reported. A ttl of zero or less disables caching. When max_size is given
+    the entry closest to expiring is evicted to make room for new keys.
+
+    """
+
+    def __init__(self, ttl, max_size=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self.hits += 1
+                return value
+            self._entries.pop(key, None)
+        self.misses += 1
+        return default
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        if (self.max_size and key not in self._entries and
+                len(self._entries) >= self.max_size):
+            self._evict()
+        self._entries[key] = (time.time() + self.ttl, value)
+
+    def _evict(self):
+        now = time.time()
+        for key, (expires_at, value) in self._entries.items():
+            if expires_at <= now:
+                self._entries.pop(key, None)
+        if len(self._entries) >= self.max_size:
+            oldest = min(self._entries, key=lambda k: self._entries[k][0])
+            self._entries.pop(oldest, None)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._entries)}
+
+    def __len__(self):
+        return len(self._entries)
+
+
 class MethodInspector(object):
 
     def __init__(self, func):
@@ -230,24 +289,89 @@ class LoopingCall(object):
         return self.done.wait()
 
 
+class Backoff(object):
+    """The intervals between the polls of one operation.
+
+    The first interval is initial, every following one is multiplier times
+    the previous, up to maximum. Each interval returned is randomly spread
+    by up to jitter times itself, so that callers started together do not
+    keep polling in lockstep.
+
+    """
+
+    def __init__(self, initial, maximum=None, multiplier=1, jitter=0):
+        self.interval = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def next(self):
+        interval = self.interval
+        self.interval *= self.multiplier
+        if self.maximum is not None:
+            self.interval = min(self.interval, self.maximum)
+        if self.jitter:
+            interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return interval
+
+
+# Number of polls of each operation waited for with poll_until, by name.
+POLL_STATS = {}
+
+
+def record_polls(name, polls):
+    stats = POLL_STATS.setdefault(name, {'count': 0, 'polls': 0, 'last': 0,
+                                         'max': 0})
+    stats['count'] += 1
+    stats['polls'] += polls
+    stats['last'] = polls
+    stats['max'] = max(stats['max'], polls)
+    LOG.debug("%(name)s finished polling after %(polls)d polls." %
+              {'name': name, 'polls': polls})
+
+
 def poll_until(retriever, condition=lambda value: value,
-               sleep_time=1, time_out=None):
+               sleep_time=1, time_out=None, max_sleep_time=None,
+               backoff=None, jitter=None, max_polls=None, name=None):
     """Retrieves object until it passes condition, then returns it.
 
-    If time_out_limit is passed in, PollTimeOut will be raised once that
-    amount of time is eclipsed.
+    The sleep between polls starts at sleep_time and grows by backoff up to
+    max_sleep_time, spread by jitter; see Backoff. Unless given, these come
+    from the poll_backoff, poll_max_sleep_time and poll_jitter options.
+
+    If time_out is passed in, PollTimeOut will be raised once that amount
+    of time is eclipsed, and if max_polls is, once that many polls did not
+    pass condition. The number of polls is recorded in POLL_STATS under
+    name, or the name of retriever.
 
     """
+    if backoff is None:
+        backoff = CONF.poll_backoff
+    if max_sleep_time is None:
+        max_sleep_time = max(sleep_time, CONF.poll_max_sleep_time)
+    if jitter is None:
+        jitter = CONF.poll_jitter
+    name = name or getattr(retriever, '__name__', 'poll')
+    intervals = Backoff(sleep_time, max_sleep_time, backoff, jitter)
     start_time = time.time()
-
-    def poll_and_check():
-        obj = retriever()
-        if condition(obj):
-            raise LoopingCallDone(retvalue=obj)
-        if time_out is not None and time.time() > start_time + time_out:
-            raise exception.PollTimeOut
-    lc = LoopingCall(f=poll_and_check).start(sleep_time, True)
-    return lc.wait()
+    polls = 0
+    try:
+        while True:
+            polls += 1
+            obj = retriever()
+            if condition(obj):
+                return obj
+            if max_polls is not None and polls >= max_polls:
+                raise exception.PollTimeOut
+            interval = intervals.next()
+            if time_out is not None:
+                remaining = start_time + time_out - time.time()
+                if remaining <= 0:
+                    raise exception.PollTimeOut
+                interval = min(interval, remaining)
+            greenthread.sleep(interval)
+    finally:
+        record_polls(name, polls)
 
 
 # Copied from nova.api.openstack.common in the old code.
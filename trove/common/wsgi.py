@@ -301,6 +301,48 @@ class Result(object):
         return self._data
 
 
+class ValidatorRegistry(object):
+    """Keeps one jsonschema validator per request schema.
+
+    A Draft4Validator is cheap to use but not to build, and the schemas
+    are static, so each one is only built the first time its schema is
+    seen. Schemas are looked up by identity.
+    """
+
+    def __init__(self):
+        self._validators = {}
+
+    def get(self, schema):
+        entry = self._validators.get(id(schema))
+        if entry is None or entry[0] is not schema:
+            entry = (schema, jsonschema.Draft4Validator(schema))
+            self._validators[id(schema)] = entry
+        return entry[1]
+
+    def compile(self, schemas):
+        """Builds the validators of the schemas of a controller.
+
+        Action schemas which are picked by the body of the request, such
+        as those of the instance actions, are maps of schemas without a
+        type and are compiled as well.
+        """
+        for schema in schemas.values():
+            if not isinstance(schema, dict):
+                continue
+            if 'type' in schema:
+                self.get(schema)
+            else:
+                self.compile(schema)
+
+    def validate(self, schema, body):
+        """Returns the errors of body against schema, sorted by path."""
+        return sorted(self.get(schema).iter_errors(body),
+                      key=lambda e: e.path)
+
+
+VALIDATORS = ValidatorRegistry()
+
+
 class Resource(openstack_wsgi.Resource):
     def __init__(self, controller, deserializer, serializer,
                  exception_map=None):
@@ -457,15 +499,14 @@ class Controller(object):
         body = action_args.get('body', {})
         schema = self.get_schema(action, body)
         if schema:
-            validator = jsonschema.Draft4Validator(schema)
-            if not validator.is_valid(body):
-                errors = sorted(validator.iter_errors(body),
-                                key=lambda e: e.path)
+            errors = VALIDATORS.validate(schema, body)
+            if errors:
                 error_msg = self.format_validation_msg(errors)
                 LOG.info(error_msg)
                 raise exception.BadRequest(message=error_msg)
 
     def create_resource(self):
+        VALIDATORS.compile(self.schemas)
         serializer = TroveResponseSerializer(
             body_serializers={'application/xml': TroveXMLDictSerializer()})
         return Resource(
@@ -15,16 +15,88 @@
 from trove.backup import models as bkup_models
 from trove.common.context import TroveContext
 from trove.common.instance import ServiceStatus
+from trove.common import utils
 from trove.instance import models as t_models
+from trove.openstack.common import loopingcall
 from trove.openstack.common import periodic_task
 from trove.openstack.common import log as logging
+from trove.openstack.common.gettextutils import _
 from trove.common import cfg
+from trove.taskmanager import api as task_api
 
 LOG = logging.getLogger(__name__)
 RPC_API_VERSION = "1.0"
 CONF = cfg.CONF
 
 
+class HeartbeatBuffer(object):
+    """Coalesces guest heartbeats so they can be written in batches.
+
+    Only the latest heartbeat of each instance is kept. A flush reads the
+    stored statuses with one query and writes one UPDATE per distinct new
+    status, plus one UPDATE touching the instances whose status is unchanged
+    and one storing the volume usage the guests reported.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._volume_used = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, instance_id, service_status, volume_used=None):
+        if volume_used is not None:
+            self._volume_used[instance_id] = volume_used
+        # A heartbeat without a status must not hide a pending status change.
+        if service_status is None and instance_id in self._pending:
+            return
+        self._pending[instance_id] = service_status
+
+    def flush(self):
+        """Writes the buffered heartbeats.
+
+        Returns the ids of the instances whose status changed.
+        """
+        if not self._pending:
+            return []
+        pending, self._pending = self._pending, {}
+        volume_used, self._volume_used = self._volume_used, {}
+        current = t_models.InstanceServiceStatus.find_all_by_instance_ids(
+            pending.keys())
+        changed = {}
+        unchanged = []
+        for instance_id, service_status in pending.items():
+            if instance_id not in current:
+                LOG.error(_("Dropping heartbeat for instance %s, its service "
+                            "status could not be found.") % instance_id)
+            elif (service_status is None or
+                    current[instance_id].status_id == service_status.code):
+                unchanged.append(instance_id)
+            else:
+                changed.setdefault(service_status.code, []).append(
+                    instance_id)
+        now = utils.utcnow()
+        for code, instance_ids in changed.items():
+            service_status = ServiceStatus.from_code(code)
+            t_models.InstanceServiceStatus.update_all_by_instance_ids(
+                instance_ids, status_id=code,
+                status_description=service_status.description,
+                updated_at=now)
+        if unchanged:
+            t_models.InstanceServiceStatus.update_all_by_instance_ids(
+                unchanged, updated_at=now)
+        volume_used = dict((instance_id, used)
+                           for instance_id, used in volume_used.items()
+                           if instance_id in current)
+        if volume_used:
+            t_models.InstanceServiceStatus.update_volume_used(volume_used)
+        LOG.debug("Flushed %d heartbeats, %d with a changed status." %
+                  (len(pending), len(pending) - len(unchanged)))
+        return [instance_id for instance_ids in changed.values()
+                for instance_id in instance_ids]
+
+
 class Manager(periodic_task.PeriodicTasks):
 
     def __init__(self):
@@ -33,16 +105,55 @@ class Manager(periodic_task.PeriodicTasks):
             user=CONF.nova_proxy_admin_user,
             auth_token=CONF.nova_proxy_admin_pass,
             tenant=CONF.nova_proxy_admin_tenant_name)
+        self.heartbeats = None
+        if CONF.conductor_heartbeat_flush_interval > 0:
+            self.heartbeats = HeartbeatBuffer()
+            flusher = loopingcall.FixedIntervalLoopingCall(
+                self._flush_heartbeats)
+            flusher.start(interval=CONF.conductor_heartbeat_flush_interval)
+
+    def _flush_heartbeats(self):
+        try:
+            changed = self.heartbeats.flush()
+        except Exception:
+            LOG.exception(_("Error flushing buffered heartbeats."))
+        else:
+            self._notify_status_changed(changed)
+
+    def _notify_status_changed(self, instance_ids):
+        """Wakes the taskmanager tasks waiting on these instances."""
+        if not instance_ids or not CONF.task_wait_notifications:
+            return
+        try:
+            task_api.API(self.admin_context).service_status_changed(
+                instance_ids)
+        except Exception:
+            LOG.exception(_("Error sending service status changes to the "
+                            "taskmanagers."))
 
     def heartbeat(self, context, instance_id, payload):
         LOG.debug("Instance ID: %s" % str(instance_id))
         LOG.debug("Payload: %s" % str(payload))
+        service_status = None
+        if payload.get('service_status') is not None:
+            service_status = ServiceStatus.from_description(
+                payload['service_status'])
+        volume_used = payload.get('volume_used')
+        if self.heartbeats is not None:
+            self.heartbeats.add(instance_id, service_status, volume_used)
+            return
         status = t_models.InstanceServiceStatus.find_by(
             instance_id=instance_id)
-        if payload.get('service_status') is not None:
-            status.set_status(ServiceStatus.from_description(
-                payload['service_status']))
+        changed = (service_status is not None and
+                   status.status_id != service_status.code)
+        if service_status is not None:
+            status.set_status(service_status)
+        if volume_used is not None:
+            status.volume_used = volume_used
+            status.volume_used_updated = utils.utcnow()
         status.save()
+        if changed:
+            self._notify_status_changed([instance_id])
 
     def update_backup(self, context, instance_id, backup_id,
                       **backup_fields):
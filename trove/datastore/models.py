@@ -18,14 +18,22 @@
 
 from trove.common import cfg
 from trove.common import exception
+from trove.common import utils
 from trove.db import models as dbmodels
 from trove.db import get_db_api
+from trove.openstack.common import log as logging
 from trove.openstack.common import uuidutils
 
 
 CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
 db_api = get_db_api()
 
+# Datastore metadata rarely changes, so rows are kept in memory keyed by id
+# and by the name they were looked up with.
+DATASTORE_CACHE = utils.TTLCache(CONF.datastore_cache_ttl)
+DATASTORE_VERSION_CACHE = utils.TTLCache(CONF.datastore_cache_ttl)
+
 
 def persisted_models():
     return {
@@ -45,6 +53,52 @@ class DBDatastoreVersion(dbmodels.DatabaseModelBase):
                     'active']
 
 
+def _find_by_id_or_name(model, cache, id_or_name):
+    db_info = cache.get(id_or_name)
+    if db_info is not None:
+        return db_info
+    LOG.debug("%s cache miss for %s" % (model.__name__, id_or_name))
+    try:
+        db_info = model.find_by(id=id_or_name)
+    except exception.ModelNotFoundError:
+        db_info = model.find_by(name=id_or_name)
+        cache.set(id_or_name, db_info)
+    cache.set(db_info.id, db_info)
+    return db_info
+
+
+def _find_all_by_ids(model, cache, ids):
+    db_infos = {}
+    missing = []
+    for id in set(ids):
+        db_info = cache.get(id)
+        if db_info is None:
+            missing.append(id)
+        else:
+            db_infos[id] = db_info
+    if missing:
+        query = model.query().filter(model.id.in_(missing))
+        for db_info in query.all():
+            cache.set(db_info.id, db_info)
+            db_infos[db_info.id] = db_info
+    return db_infos
+
+
+def invalidate_cache():
+    """Drops all cached datastore metadata of this process.
+
+    Other processes are not told; their entries expire after
+    datastore_cache_ttl seconds.
+    """
+    DATASTORE_CACHE.clear()
+    DATASTORE_VERSION_CACHE.clear()
+
+
+def get_cache_stats():
+    return {'datastore': DATASTORE_CACHE.stats(),
+            'datastore_version': DATASTORE_VERSION_CACHE.stats()}
+
+
 class Datastore(object):
 
     def __init__(self, db_info):
@@ -53,12 +107,16 @@ class Datastore(object):
     @classmethod
     def load(cls, id_or_name):
         try:
-            return cls(DBDatastore.find_by(id=id_or_name))
+            return cls(_find_by_id_or_name(DBDatastore, DATASTORE_CACHE,
+                                           id_or_name))
         except exception.ModelNotFoundError:
-            try:
-                return cls(DBDatastore.find_by(name=id_or_name))
-            except exception.ModelNotFoundError:
-                raise exception.DatastoreNotFound(datastore=id_or_name)
+            raise exception.DatastoreNotFound(datastore=id_or_name)
+
+    @classmethod
+    def load_by_ids(cls, ids):
+        """Loads several datastores with at most one query, keyed by id."""
+        db_infos = _find_all_by_ids(DBDatastore, DATASTORE_CACHE, ids)
+        return dict((id, cls(db_info)) for id, db_info in db_infos.items())
 
     @property
     def id(self):
@@ -99,12 +157,18 @@ class DatastoreVersion(object):
     @classmethod
     def load(cls, id_or_name):
         try:
-            return cls(DBDatastoreVersion.find_by(id=id_or_name))
+            return cls(_find_by_id_or_name(DBDatastoreVersion,
+                                           DATASTORE_VERSION_CACHE,
+                                           id_or_name))
         except exception.ModelNotFoundError:
-            try:
-                return cls(DBDatastoreVersion.find_by(name=id_or_name))
-            except exception.ModelNotFoundError:
-                raise exception.DatastoreVersionNotFound(version=id_or_name)
+            raise exception.DatastoreVersionNotFound(version=id_or_name)
+
+    @classmethod
+    def load_by_ids(cls, ids):
+        """Loads several datastore versions with at most one query."""
+        db_infos = _find_all_by_ids(DBDatastoreVersion,
+                                    DATASTORE_VERSION_CACHE, ids)
+        return dict((id, cls(db_info)) for id, db_info in db_infos.items())
 
     @property
     def id(self):
@@ -184,6 +248,7 @@ def update_datastore(name, manager, default_version):
     if default_version:
         datastore.default_version_id = version.id
     db_api.save(datastore)
+    invalidate_cache()
 
 
 def update_datastore_version(datastore, name, image_id, packages, active):
@@ -201,3 +266,4 @@ def update_datastore_version(datastore, name, image_id, packages, active):
     version.packages = packages
     version.active = active
     db_api.save(version)
+    invalidate_cache()
@@ -15,6 +15,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
 import sqlalchemy.exc
 
 from trove.common import exception
@@ -70,6 +72,17 @@ def delete_all(query_func, model, **conditions):
     query_func(model, **conditions).delete()
 
 
+@contextlib.contextmanager
+def transaction():
+    """Yield a session whose statements are committed together.
+
+    Everything done with the session is rolled back if the block raises.
+    """
+    db_session = session.get_session()
+    with db_session.begin():
+        yield db_session
+
+
 def update(model, **values):
     for k, v in values.iteritems():
         model[k] = v
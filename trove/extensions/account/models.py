@@ -15,6 +15,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from sqlalchemy import func
+
 from trove.openstack.common import log as logging
 
 from trove.common.remote import create_nova_client
@@ -64,15 +66,13 @@ class AccountsSummary(object):
 
     @classmethod
     def load(cls):
-        # TODO(pdmars): This should probably be changed to a more generic
-        # database filter query if one is added, however, this should suffice
-        # for now.
-        db_infos = DBInstance.find_all(deleted=False)
-        tenant_ids_for_instances = [db_info.tenant_id for db_info in db_infos]
-        tenant_ids = set(tenant_ids_for_instances)
-        LOG.debug("All tenants with instances: %s" % tenant_ids)
-        accounts = []
-        for tenant_id in tenant_ids:
-            num_instances = tenant_ids_for_instances.count(tenant_id)
-            accounts.append({'id': tenant_id, 'num_instances': num_instances})
+        # The instances are counted per tenant by the database rather than
+        # loading every instance of the fleet.
+        query = DBInstance.query().filter_by(deleted=False).group_by(
+            DBInstance.tenant_id)
+        counts = query.values(DBInstance.tenant_id, func.count(DBInstance.id))
+        accounts = [{'id': tenant_id, 'num_instances': num_instances}
+                    for tenant_id, num_instances in counts]
+        LOG.debug("All tenants with instances: %s" %
+                  [account['id'] for account in accounts])
         return cls(accounts)
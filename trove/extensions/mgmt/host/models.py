@@ -19,17 +19,22 @@
 Model classes that extend the instances functionality for MySQL instances.
 """
 
+from eventlet import greenpool
+
 from trove.openstack.common import log as logging
 
+from trove.common import cfg
 from trove.common import exception
 from trove.instance.models import DBInstance
 from trove.instance.models import InstanceServiceStatus
 from trove.instance.models import SimpleInstance
+from trove.instance.models import load_datastores
 from trove.common.remote import create_guest_client
 from trove.common.remote import create_nova_client
 from novaclient import exceptions as nova_exceptions
 
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
 
@@ -62,14 +67,28 @@ class DetailedHost(object):
         for instance in self.instances:
             instance['server_id'] = instance['uuid']
             del instance['uuid']
+        db_infos = DBInstance.find_all_by_compute_instance_ids(
+            [instance['server_id'] for instance in self.instances])
+        statuses = InstanceServiceStatus.find_all_by_instance_ids(
+            [db_info.id for db_info in db_infos.values()])
+        datastores = load_datastores(
+            [db_info.datastore_version_id for db_info in db_infos.values()])
+        for instance in self.instances:
             try:
-                db_info = DBInstance.find_by(
-                    compute_instance_id=instance['server_id'])
+                db_info = db_infos.get(instance['server_id'])
+                if db_info is None:
+                    raise exception.ModelNotFoundError(
+                        "DBInstance Not Found")
                 instance['id'] = db_info.id
                 instance['tenant_id'] = db_info.tenant_id
-                status = InstanceServiceStatus.find_by(
-                    instance_id=db_info.id)
-                instance_info = SimpleInstance(None, db_info, status)
+                status = statuses.get(db_info.id)
+                if status is None:
+                    raise exception.ModelNotFoundError(
+                        "InstanceServiceStatus Not Found")
+                ds_version, ds = datastores.get(db_info.datastore_version_id,
+                                                (None, None))
+                instance_info = SimpleInstance(None, db_info, status,
+                                               ds_version=ds_version, ds=ds)
                 instance['status'] = instance_info.status
             except exception.TroveError as re:
                 LOG.error(re)
@@ -80,19 +99,27 @@ class DetailedHost(object):
     def update_all(self, context):
         num_i = len(self.instances)
         LOG.debug("Host %s has %s instances to update" % (self.name, num_i))
-        failed_instances = []
-        for instance in self.instances:
-            client = create_guest_client(context, instance['id'])
-            try:
-                client.update_guest()
-            except exception.TroveError as re:
-                LOG.error(re)
-                LOG.error("Unable to update instance: %s" % instance['id'])
-                failed_instances.append(instance['id'])
+        pool = greenpool.GreenPool(CONF.host_update_concurrency)
+        updated = pool.imap(lambda instance: self._update_guest(context,
+                                                                instance),
+                            self.instances)
+        failed_instances = [instance['id'] for instance, ok
+                            in zip(self.instances, updated) if not ok]
         if len(failed_instances) > 0:
             msg = "Failed to update instances: %s" % failed_instances
             raise exception.UpdateGuestError(msg)
 
+    @staticmethod
+    def _update_guest(context, instance):
+        client = create_guest_client(context, instance['id'])
+        try:
+            client.update_guest()
+            return True
+        except exception.TroveError as re:
+            LOG.error(re)
+            LOG.error("Unable to update instance: %s" % instance['id'])
+            return False
+
     @staticmethod
     def load(context, name):
         client = create_nova_client(context)
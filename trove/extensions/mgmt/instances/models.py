@@ -13,9 +13,15 @@
 #    under the License.
 import datetime
 
+from eventlet import greenpool
+from novaclient import exceptions as nova_exceptions
+
 from trove.common import cfg
+from trove.common import instance as rd_instance
 from trove.common import remote
 from trove.common import utils
+from trove.datastore import models as datastore_models
+from trove.flavor.models import FLAVOR_CATALOG
 from trove.openstack.common import log as logging
 from trove.openstack.common.notifier import api as notifier
 from trove.instance import models as imodels
@@ -27,15 +33,20 @@ LOG = logging.getLogger(__name__)
 CONF = cfg.CONF
 
 
-def load_mgmt_instances(context, deleted=None, client=None):
-    if not client:
-        client = remote.create_nova_client(context)
+def _list_mgmt_servers(client):
     try:
         mgmt_servers = client.rdservers.list()
     except AttributeError:
         mgmt_servers = client.servers.list(search_opts={'all_tenants': 1})
     LOG.info("Found %d servers in Nova" %
              len(mgmt_servers if mgmt_servers else []))
+    return mgmt_servers
+
+
+def load_mgmt_instances(context, deleted=None, client=None):
+    if not client:
+        client = remote.create_nova_client(context)
+    mgmt_servers = _list_mgmt_servers(client)
     if deleted is not None:
         db_infos = instance_models.DBInstance.find_all(deleted=deleted)
     else:
@@ -45,6 +56,122 @@ def load_mgmt_instances(context, deleted=None, client=None):
     return instances
 
 
+def load_mgmt_instances_page(context, deleted=None, tenant_id=None,
+                             status=None, host=None, datastore=None,
+                             client=None):
+    """Loads one page of the instances matching the given filters.
+
+    The filters are applied in the database; only a host filter needs Nova,
+    which is asked for the servers on that host. Otherwise only the servers
+    of the instances on the page are fetched. The status filter matches the
+    API status of the service status, e.g. ACTIVE or SHUTDOWN.
+
+    Returns the instances and the marker of the next page, or None.
+    """
+    if not client:
+        client = remote.create_nova_client(context)
+    DBInstance = instance_models.DBInstance
+    query = DBInstance.query()
+    if deleted is not None:
+        query = query.filter_by(deleted=deleted)
+    if tenant_id:
+        query = query.filter_by(tenant_id=tenant_id)
+    if datastore:
+        datastore = datastore_models.Datastore.load(datastore)
+        version_ids = [version.id for version in datastore_models.
+                       DBDatastoreVersion.find_all(datastore_id=datastore.id)]
+        query = query.filter(DBInstance.datastore_version_id.in_(version_ids))
+    if status:
+        codes = [service_status.code for service_status in
+                 rd_instance.ServiceStatus.all_with_api_status(status.upper())]
+        query = query.join(
+            (InstanceServiceStatus,
+             InstanceServiceStatus.instance_id == DBInstance.id)).filter(
+                 InstanceServiceStatus.status_id.in_(codes))
+    servers = None
+    if host:
+        servers = client.servers.list(search_opts={'all_tenants': 1,
+                                                   'host': host})
+        query = query.filter(DBInstance.compute_instance_id.in_(
+            [server.id for server in servers]))
+
+    limit = int(context.limit or CONF.mgmt_instances_page_size)
+    limit = min(limit, CONF.mgmt_instances_page_size)
+    if context.marker:
+        query = query.filter(DBInstance.id > context.marker)
+    db_infos = query.order_by(DBInstance.id).limit(limit + 1).all()
+    next_marker = None
+    if len(db_infos) > limit:
+        db_infos = db_infos[:limit]
+        next_marker = db_infos[-1].id
+
+    if servers is None:
+        servers = _get_mgmt_servers(client, db_infos)
+    find_server = imodels.create_server_list_matcher(servers)
+    instances = MgmtInstances.load_status_with_matcher(context, db_infos,
+                                                       find_server)
+    return instances, next_marker
+
+
+def _get_mgmt_server(client, server_id):
+    try:
+        try:
+            return client.rdservers.get(server_id)
+        except AttributeError:
+            return client.servers.get(server_id)
+    except nova_exceptions.NotFound:
+        LOG.debug("Could not find nova server_id(%s)" % server_id)
+
+
+def _get_mgmt_servers(client, db_infos):
+    """Gets the servers of the instances, mgmt_server_get_concurrency at
+    a time, as Nova cannot list servers by id.
+    """
+    server_ids = [db_info.compute_instance_id for db_info in db_infos
+                  if db_info.compute_instance_id]
+    pool = greenpool.GreenPool(CONF.mgmt_server_get_concurrency)
+    servers = pool.imap(lambda server_id: _get_mgmt_server(client,
+                                                           server_id),
+                        server_ids)
+    return [server for server in servers if server is not None]
+
+
+def _iter_db_instance_chunks(chunk_size):
+    """Yields the live instances in lists of chunk_size, ordered by id.
+
+    Each chunk is queried with the last id of the previous one as its
+    marker, so the table is never loaded as a whole.
+    """
+    marker = None
+    while True:
+        db_infos = instance_models.DBInstance.find_all(deleted=False).limit(
+            limit=chunk_size, marker=marker)
+        if not db_infos:
+            return
+        yield db_infos
+        if len(db_infos) < chunk_size:
+            return
+        marker = db_infos[-1].id
+
+
+def iter_mgmt_instances(context, client=None):
+    """Yields the live instances, loading them a chunk at a time.
+
+    The Nova servers are listed once. The service statuses and datastores
+    are bulk loaded for each chunk of exists_notification_chunk_size
+    instances.
+    """
+    if not client:
+        client = remote.create_nova_client(context)
+    find_server = imodels.create_server_list_matcher(
+        _list_mgmt_servers(client))
+    for db_infos in _iter_db_instance_chunks(
+            CONF.exists_notification_chunk_size):
+        for instance in MgmtInstances.load_status_with_matcher(
+                context, db_infos, find_server):
+            yield instance
+
+
 def load_mgmt_instance(cls, context, id):
     try:
         instance = load_instance(cls, context, id, needs_server=True)
@@ -65,9 +192,9 @@ def load_mgmt_instance(cls, context, id):
 
 
 class SimpleMgmtInstance(imodels.BaseInstance):
-    def __init__(self, context, db_info, server, service_status):
+    def __init__(self, context, db_info, server, service_status, **kwargs):
         super(SimpleMgmtInstance, self).__init__(context, db_info, server,
-                                                 service_status)
+                                                 service_status, **kwargs)
 
     @property
     def status(self):
@@ -97,6 +224,7 @@ class DetailedMgmtInstance(SimpleMgmtInstance):
         super(DetailedMgmtInstance, self).__init__(*args, **kwargs)
         self.volume = None
         self.volume_used = None
+        self.volume_used_updated = None
         self.root_history = None
 
     @classmethod
@@ -107,7 +235,7 @@ class DetailedMgmtInstance(SimpleMgmtInstance):
             instance.volume = client.volumes.get(instance.volume_id)
         except Exception:
             instance.volume = None
-            # Populate the volume_used attribute from the guest agent.
+        # Populate the volume_used attribute from the last heartbeat.
         instance_models.load_guest_info(instance, context, id)
         instance.root_history = mysql_models.RootHistory.load(context=context,
                                                               instance_id=id)
@@ -128,12 +256,17 @@ class MgmtInstance(imodels.Instance):
 class MgmtInstances(imodels.Instances):
     @staticmethod
     def load_status_from_existing(context, db_infos, servers):
-        def load_instance(context, db, status, server=None):
-            return SimpleMgmtInstance(context, db, server, status)
+        find_server = imodels.create_server_list_matcher(servers)
+        return MgmtInstances.load_status_with_matcher(context, db_infos,
+                                                      find_server)
+
+    @staticmethod
+    def load_status_with_matcher(context, db_infos, find_server):
+        def load_instance(context, db, status, server=None, **kwargs):
+            return SimpleMgmtInstance(context, db, server, status, **kwargs)
 
         if context is None:
             raise TypeError("Argument context not defined.")
-        find_server = imodels.create_server_list_matcher(servers)
         instances = imodels.Instances._load_servers_status(load_instance,
                                                            context,
                                                            db_infos,
@@ -155,6 +288,8 @@ def _load_servers(instances, find_server):
 
 
 def publish_exist_events(transformer, admin_context):
+    # The transformer yields the notifications as the instances are
+    # loaded, so each one is sent before the next chunk is read.
     notifications = transformer()
     # clear out admin_context.auth_token so it does not get logged
     admin_context.auth_token = None
@@ -210,16 +345,27 @@ class NotificationTransformer(object):
         return payload
 
     def __call__(self):
+        """Yields an exists notification for every live instance."""
         audit_start, audit_end = NotificationTransformer._get_audit_period()
-        messages = []
-        db_infos = instance_models.DBInstance.find_all(deleted=False)
-        for db_info in db_infos:
-            service_status = InstanceServiceStatus.find_by(
-                instance_id=db_info.id)
-            instance = SimpleMgmtInstance(None, db_info, None, service_status)
-            message = self.transform_instance(instance, audit_start, audit_end)
-            messages.append(message)
-        return messages
+        for db_infos in _iter_db_instance_chunks(
+                CONF.exists_notification_chunk_size):
+            statuses = InstanceServiceStatus.find_all_by_instance_ids(
+                [db_info.id for db_info in db_infos])
+            datastores = imodels.load_datastores(
+                [db_info.datastore_version_id for db_info in db_infos])
+            for db_info in db_infos:
+                service_status = statuses.get(db_info.id)
+                if service_status is None:
+                    LOG.error("Server status could not be read for "
+                              "instance id(%s)" % db_info.id)
+                    continue
+                ds_version, ds = datastores.get(db_info.datastore_version_id,
+                                                (None, None))
+                instance = SimpleMgmtInstance(None, db_info, None,
+                                              service_status,
+                                              ds_version=ds_version, ds=ds)
+                yield self.transform_instance(instance, audit_start,
+                                              audit_end)
 
 
 class NovaNotificationTransformer(NotificationTransformer):
@@ -227,31 +373,24 @@ class NovaNotificationTransformer(NotificationTransformer):
         super(NovaNotificationTransformer, self).__init__(**kwargs)
         self.context = kwargs['context']
         self.nova_client = remote.create_admin_nova_client(self.context)
-        self._flavor_cache = {}
 
     def _lookup_flavor(self, flavor_id):
-        if flavor_id in self._flavor_cache:
-            LOG.debug("Flavor cache hit for %s" % flavor_id)
-            return self._flavor_cache[flavor_id]
-        # fetch flavor resource from nova
-        LOG.info("Flavor cache miss for %s" % flavor_id)
-        flavor = self.nova_client.flavors.get(flavor_id)
-        self._flavor_cache[flavor_id] = flavor.name if flavor else 'unknown'
-        return self._flavor_cache[flavor_id]
+        flavor = FLAVOR_CATALOG.get(self.context, flavor_id,
+                                    client=self.nova_client,
+                                    check_access=False)
+        return flavor.name if flavor else 'unknown'
 
     def __call__(self):
+        """Yields an exists notification for every running instance."""
         audit_start, audit_end = NotificationTransformer._get_audit_period()
-        instances = load_mgmt_instances(self.context, deleted=False,
-                                        client=self.nova_client)
-        messages = []
-        for instance in filter(
-                lambda inst: inst.status != 'SHUTDOWN' and inst.server,
-                instances):
+        instances = iter_mgmt_instances(self.context, client=self.nova_client)
+        for instance in instances:
+            if instance.status == 'SHUTDOWN' or not instance.server:
+                continue
             message = {
                 'instance_type': self._lookup_flavor(instance.flavor_id),
                 'user_id': instance.server.user_id}
             message.update(self.transform_instance(instance,
                                                    audit_start,
                                                    audit_end))
-            messages.append(message)
-        return messages
+            yield message
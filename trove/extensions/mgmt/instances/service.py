@@ -20,6 +20,7 @@ from novaclient import exceptions as nova_exceptions
 
 from trove.backup.models import Backup
 from trove.common import exception
+from trove.common import pagination
 from trove.common import wsgi
 from trove.common.auth import admin_context
 from trove.instance import models as instance_models
@@ -59,13 +60,20 @@ class MgmtInstanceController(InstanceController):
         elif deleted_q in ['false']:
             deleted = False
         try:
-            instances = models.load_mgmt_instances(context, deleted=deleted)
+            instances, marker = models.load_mgmt_instances_page(
+                context, deleted=deleted,
+                tenant_id=req.GET.get('tenant'),
+                status=req.GET.get('status'),
+                host=req.GET.get('host'),
+                datastore=req.GET.get('datastore'))
         except nova_exceptions.ClientException as e:
             LOG.error(e)
             return wsgi.Result(str(e), 403)
 
-        view_cls = views.MgmtInstancesView
-        return wsgi.Result(view_cls(instances, req=req).data(), 200)
+        view = views.MgmtInstancesView(instances, req=req)
+        paged = pagination.SimplePaginatedDataView(req.url, 'instances', view,
+                                                   marker)
+        return wsgi.Result(paged.data(), 200)
 
     @admin_context
     def show(self, req, tenant_id, id):
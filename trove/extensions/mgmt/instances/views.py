@@ -86,6 +86,7 @@ class MgmtInstanceDetailView(MgmtInstanceView):
                 "size": volume.size,
                 "status": volume.status,
                 "used": self.instance.volume_used or None,
+                "used_updated": self.instance.volume_used_updated,
             }
         else:
             result['instance']['volume'] = None
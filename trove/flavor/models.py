@@ -17,11 +17,178 @@
 
 """Model classes that form the core of instance flavor functionality."""
 
+import time
 
+from eventlet import greenthread
 from novaclient import exceptions as nova_exceptions
+from trove.common import cfg
 from trove.common import exception
+from trove.common.context import TroveContext
 from trove.common.models import NovaRemoteModelBase
+from trove.common.remote import create_admin_nova_client
 from trove.common.remote import create_nova_client
+from trove.openstack.common import log as logging
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+
+def _is_public(flavor):
+    # Without the flavor access extension every flavor is public.
+    return getattr(flavor, 'is_public', True) is not False
+
+
+class FlavorCatalog(object):
+    """A process-wide cache of the Nova flavors.
+
+    Flavors are cached by id, and the flavor lists per tenant. An entry is
+    fresh for ttl seconds. For stale_ttl seconds more it is still served
+    while a greenthread fetches it again, after that it is fetched before
+    being returned. A private flavor is only served from the cache to the
+    tenant it was fetched for, unless the caller does not check access.
+
+    """
+
+    def __init__(self, ttl, stale_ttl):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._refreshing = set()
+        self._purge_size = 1000
+
+    def _store(self, key, value, tenant):
+        if self.ttl <= 0:
+            return
+        self._entries[key] = (time.time(), value, tenant)
+        if len(self._entries) > self._purge_size:
+            self._purge()
+
+    def _purge(self):
+        # Lists of tenants that stopped asking for them would otherwise
+        # stay forever.
+        expired = time.time() - self.ttl - self.stale_ttl
+        for key, entry in self._entries.items():
+            if entry[0] <= expired:
+                del self._entries[key]
+        self._purge_size = max(1000, 2 * len(self._entries))
+
+    def _lookup(self, key, fetch):
+        """Returns the cached value and tenant of key, or None.
+
+        A stale entry is returned too, and refreshed in the background.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        fetched_at, value, tenant = entry
+        age = time.time() - fetched_at
+        if age >= self.ttl + self.stale_ttl:
+            self._entries.pop(key, None)
+            return None
+        if age >= self.ttl and key not in self._refreshing:
+            self._refreshing.add(key)
+            greenthread.spawn_n(self._refresh, key, fetch)
+        return value, tenant, age >= self.ttl
+
+    def _refresh(self, key, fetch):
+        try:
+            fetch()
+        except nova_exceptions.NotFound:
+            self._entries.pop(key, None)
+        except Exception:
+            LOG.exception("Error refreshing cached flavors %s." % (key,))
+        finally:
+            self._refreshing.discard(key)
+
+    def _count(self, stale):
+        if stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+
+    def get(self, context, flavor_id, client=None, check_access=True):
+        """Returns the Nova flavor flavor_id.
+
+        On a miss the flavor is fetched with client, or a Nova client of
+        context, raising what flavors.get raises.
+        """
+        key = ('flavor', str(flavor_id))
+        tenant = context.tenant if context else None
+
+        def fetch():
+            nova = client or create_nova_client(context)
+            flavor = nova.flavors.get(flavor_id)
+            if flavor is not None:
+                self._store(key, flavor, tenant)
+            return flavor
+
+        cached = self._lookup(key, fetch)
+        if cached is not None:
+            flavor, owner, stale = cached
+            if not check_access or _is_public(flavor) or owner == tenant:
+                self._count(stale)
+                return flavor
+        self.misses += 1
+        return fetch()
+
+    def list(self, context, client=None):
+        """Returns the Nova flavors the tenant of context can use."""
+        key = ('list', context.tenant)
+
+        def fetch():
+            nova = client or create_nova_client(context)
+            flavors = nova.flavors.list()
+            self._store(key, flavors, context.tenant)
+            for flavor in flavors:
+                self._store(('flavor', str(flavor.id)), flavor,
+                            context.tenant)
+            return flavors
+
+        cached = self._lookup(key, fetch)
+        if cached is not None:
+            flavors, owner, stale = cached
+            self._count(stale)
+            return flavors
+        self.misses += 1
+        return fetch()
+
+    def prefetch(self, context):
+        """Caches every flavor the trove admin can see."""
+        flavors = create_admin_nova_client(context).flavors.list()
+        for flavor in flavors:
+            self._store(('flavor', str(flavor.id)), flavor, None)
+        LOG.info("Prefetched %d flavors." % len(flavors))
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'stale_hits': self.stale_hits,
+                'misses': self.misses, 'size': len(self._entries)}
+
+
+FLAVOR_CATALOG = FlavorCatalog(CONF.flavor_cache_ttl,
+                               CONF.flavor_cache_stale_ttl)
+
+
+def prefetch_flavors(context=None):
+    """Fills the flavor catalog when a service starts.
+
+    Errors are logged, the flavors are then fetched on first use.
+    """
+    if context is None:
+        if not CONF.nova_proxy_admin_user:
+            return
+        context = TroveContext(user=CONF.nova_proxy_admin_user,
+                               auth_token=CONF.nova_proxy_admin_pass,
+                               tenant=CONF.nova_proxy_admin_tenant_name)
+    try:
+        FLAVOR_CATALOG.prefetch(context)
+    except Exception:
+        LOG.exception("Error prefetching the flavors.")
 
 
 class Flavor(object):
@@ -34,8 +201,7 @@ class Flavor(object):
             return
         if flavor_id and context:
             try:
-                client = create_nova_client(context)
-                self.flavor = client.flavors.get(flavor_id)
+                self.flavor = FLAVOR_CATALOG.get(context, flavor_id)
             except nova_exceptions.NotFound as e:
                 raise exception.NotFound(uuid=flavor_id)
             except nova_exceptions.ClientException as e:
@@ -73,7 +239,7 @@ class Flavor(object):
 class Flavors(NovaRemoteModelBase):
 
     def __init__(self, context):
-        nova_flavors = create_nova_client(context).flavors.list()
+        nova_flavors = FLAVOR_CATALOG.list(context)
         self.flavors = [Flavor(flavor=item) for item in nova_flavors]
 
     def __iter__(self):
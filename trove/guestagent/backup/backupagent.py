@@ -35,6 +35,12 @@ RUNNER = get_backup_strategy(CONF.backup_strategy,
                              CONF.backup_namespace)
 EXTRA_OPTS = CONF.backup_runner_options.get(CONF.backup_strategy, '')
 
+INCREMENTAL = CONF.backup_incremental_strategy.get(CONF.backup_strategy)
+INCREMENTAL_RUNNER = None
+if INCREMENTAL:
+    INCREMENTAL_RUNNER = get_backup_strategy(INCREMENTAL,
+                                             CONF.backup_namespace)
+
 
 class BackupAgent(object):
 
@@ -47,7 +53,8 @@ class BackupAgent(object):
         return runner
 
     def execute_backup(self, context, backup_info,
-                       runner=RUNNER, extra_opts=EXTRA_OPTS):
+                       runner=RUNNER, extra_opts=EXTRA_OPTS,
+                       incremental_runner=INCREMENTAL_RUNNER):
         backup_id = backup_info['id']
         ctxt = trove_context.TroveContext(
             user=CONF.nova_proxy_admin_user,
@@ -71,8 +78,28 @@ class BackupAgent(object):
         conductor.update_backup(CONF.guest_id, **backup)
 
         try:
+            parent_metadata = {}
+            parent = backup_info.get('parent')
+            if parent and incremental_runner is None:
+                LOG.warn("Backup strategy %s has no incremental runner, "
+                         "running a full backup for %s.",
+                         CONF.backup_strategy, backup_id)
+            elif parent:
+                runner = incremental_runner
+                LOG.info("Running incremental backup %s on top of %s",
+                         backup_id, parent['location'])
+                parent_metadata = storage.load_metadata(parent['location'],
+                                                        parent['checksum'])
+                # The parent may be an incremental too, so its own parent is
+                # replaced by the location and checksum of the parent itself.
+                parent_metadata.update({
+                    'parent_location': parent['location'],
+                    'parent_checksum': parent['checksum'],
+                })
+
             with runner(filename=backup_id, extra_opts=extra_opts,
-                        user=user, password=password) as bkup:
+                        user=user, password=password,
+                        **parent_metadata) as bkup:
                 try:
                     LOG.info("Starting Backup %s", backup_id)
                     success, note, checksum, location = storage.save(
@@ -102,6 +129,10 @@ class BackupAgent(object):
                     conductor.update_backup(CONF.guest_id, **backup)
                     raise
 
+            # The runner has checked its process on exit, so the metadata
+            # it reports is complete.
+            storage.save_metadata(location, bkup.metadata())
+
         except Exception:
             LOG.exception("Error running backup: %s", backup_id)
             backup.update({'state': BackupState.FAILED})
@@ -129,8 +160,12 @@ class BackupAgent(object):
                                                     restore_runner.is_zipped,
                                                     backup_info['checksum'])
 
-            with restore_runner(restore_stream=download_stream,
-                                restore_location=restore_location) as runner:
+            runner = restore_runner(restore_stream=download_stream,
+                                    restore_location=restore_location,
+                                    backup_location=backup_info['location'],
+                                    backup_checksum=backup_info['checksum'],
+                                    storage=storage_strategy)
+            with runner:
                 LOG.debug("Restoring instance from backup %s to %s",
                           backup_info['id'], restore_location)
                 content_size = runner.restore()
@@ -55,7 +55,7 @@ class Manager(periodic_task.PeriodicTasks):
         return MySqlAdmin().create_database(databases)
 
     def create_user(self, context, users):
-        MySqlAdmin().create_user(users)
+        return MySqlAdmin().create_user(users)
 
     def delete_database(self, context, database):
         return MySqlAdmin().delete_database(database)
@@ -142,11 +142,16 @@ class Manager(periodic_task.PeriodicTasks):
 
         app.complete_install_or_restart()
 
+        failures = []
         if databases:
-            self.create_database(context, databases)
+            failures.extend(self.create_database(context, databases) or [])
 
         if users:
-            self.create_user(context, users)
+            failures.extend(self.create_user(context, users) or [])
+
+        if failures:
+            LOG.error(_("Could not create %s during prepare.") %
+                      ", ".join(failure['name'] for failure in failures))
 
         LOG.info('"prepare" call has finished.')
 
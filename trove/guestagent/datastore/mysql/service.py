@@ -16,11 +16,17 @@
 #    under the License.
 #
 
+import MySQLdb
 import os
 import passlib.utils
 import re
+import socket
+import time
 import uuid
 from datetime import date
+from eventlet import greenthread
+from eventlet import Timeout
+from eventlet import tpool
 import sqlalchemy
 from sqlalchemy import exc
 from sqlalchemy import interfaces
@@ -42,6 +48,8 @@ from trove.extensions.mysql.models import RootHistory
 ADMIN_USER_NAME = "os_admin"
 LOG = logging.getLogger(__name__)
 FLUSH = text(sql_query.FLUSH)
+PING = "SELECT 1"
+PING_TIMEOUT = 2
 ENGINE = None
 PREPARING = False
 UUID = False
@@ -58,6 +66,8 @@ INCLUDE_MARKER_OPERATORS = {
 MYSQL_CONFIG = "/etc/mysql/my.cnf"
 MYSQL_SERVICE_CANDIDATES = ["mysql", "mysqld", "mysql-server"]
 MYSQL_BIN_CANDIDATES = ["/usr/sbin/mysqld", "/usr/libexec/mysqld"]
+MYSQL_SOCKET = "/var/run/mysqld/mysqld.sock"
+MYSQL_PID_FILE = "/var/run/mysqld/mysqld.pid"
 
 
 # Create a package impl
@@ -97,7 +107,63 @@ def clear_expired_password():
         LOG.debug("Expired password removed.")
 
 
+class MySqlConfigCache(object):
+    """Values read out of my.cnf, kept until the file changes.
+
+    Reading my.cnf or the mysqld defaults means forking a sudo command, so
+    the values are kept in memory and only read again once a stat of the
+    file shows it was replaced or modified. Nothing is cached while the
+    file does not exist.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._signature = None
+        self._values = {}
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime)
+
+    def get(self, key, loader):
+        """Return the cached value of key, calling loader on a miss.
+
+        A loader returning None is not cached.
+        """
+        signature = self._stat()
+        if signature != self._signature:
+            self._values = {}
+            self._signature = signature
+        if key in self._values:
+            return self._values[key]
+        value = loader()
+        if signature is not None and value is not None:
+            self._values[key] = value
+        return value
+
+    def reset(self, **values):
+        """Forget everything read before the file was rewritten and keep
+        the values the writer already knows.
+        """
+        self._signature = self._stat()
+        self._values = values if self._signature is not None else {}
+
+    def clear(self):
+        self._signature = None
+        self._values = {}
+
+
+CONFIG_CACHE = MySqlConfigCache(MYSQL_CONFIG)
+
+
 def get_auth_password():
+    return CONFIG_CACHE.get('password', _read_auth_password)
+
+
+def _read_auth_password():
     pwd, err = utils.execute_with_timeout(
         "sudo",
         "awk",
@@ -109,6 +175,37 @@ def get_auth_password():
     return pwd.strip()
 
 
+def get_backup_staging_dir():
+    """Directory backups are staged in, outside the MySQL datadir."""
+    staging_dir = CONF.backup_staging_dir
+    if not staging_dir:
+        raise RuntimeError("backup_staging_dir is not set.")
+    datadir = os.path.normpath(CONF.mount_point)
+    if (os.path.normpath(staging_dir) + os.sep).startswith(datadir + os.sep):
+        raise RuntimeError("backup_staging_dir %s is inside the datadir %s."
+                           % (staging_dir, datadir))
+    return staging_dir
+
+
+def _run_ping(password):
+    """Run PING as the admin user, or return None if that fails.
+
+    MySQLdb blocks in C, so this is run in a native thread.
+    """
+    try:
+        conn = MySQLdb.connect(host='localhost', port=3306,
+                               user=ADMIN_USER_NAME, passwd=password,
+                               connect_timeout=PING_TIMEOUT)
+        try:
+            conn.query(PING)
+            conn.store_result()
+        finally:
+            conn.close()
+        return True
+    except Exception:
+        return None
+
+
 def get_engine():
     """Create the default engine with the updated admin user."""
     #TODO(rnirmal):Based on permissions issues being resolved we may revert
@@ -127,13 +224,17 @@ def get_engine():
 
 
 def load_mysqld_options():
+    return CONFIG_CACHE.get('mysqld_options', _read_mysqld_options) or {}
+
+
+def _read_mysqld_options():
     #find mysqld bin
     for bin in MYSQL_BIN_CANDIDATES:
         if os.path.isfile(bin):
             mysqld_bin = bin
             break
     else:
-        return {}
+        return None
     try:
         out, err = utils.execute(mysqld_bin, "--print-defaults",
                                  run_as_root=True, root_helper="sudo")
@@ -147,10 +248,24 @@ def load_mysqld_options():
                 args[item.lstrip("--")] = None
         return args
     except exception.ProcessExecutionError:
-        return {}
+        return None
 
 
 class MySqlAppStatus(service.BaseDbStatus):
+    """Reports the status of mysqld.
+
+    The status is probed in process first: a query as the admin user in a
+    native thread or a read of the server greeting on the local socket,
+    followed by the pid file and /proc. Only when those can not tell the
+    state apart does it fall back to forking mysqladmin and ps. The
+    duration of every probe is kept in probe_timings.
+    """
+
+    def __init__(self):
+        super(MySqlAppStatus, self).__init__()
+        self.probe_timings = {}
+        self._admin_ping = None
+
     @classmethod
     def get(cls):
         if not cls._instance:
@@ -158,11 +273,100 @@ class MySqlAppStatus(service.BaseDbStatus):
         return cls._instance
 
     def _get_actual_db_status(self):
+        status = self._timed('in_process', self._probe_in_process)
+        if status is None:
+            status = self._timed('subprocess', self._probe_with_processes)
+        LOG.info("Service Status is %s." % status.description)
+        return status
+
+    def _timed(self, name, probe, *args):
+        start = time.time()
+        try:
+            return probe(*args)
+        finally:
+            elapsed = time.time() - start
+            timing = self.probe_timings.setdefault(
+                name, {'count': 0, 'total': 0.0, 'last': 0.0})
+            timing['count'] += 1
+            timing['total'] += elapsed
+            timing['last'] = elapsed
+            LOG.debug("Status probe %(name)s took %(ms).1f ms." %
+                      {'name': name, 'ms': elapsed * 1000})
+
+    def _get_mysqld_option(self, name, default):
+        options = load_mysqld_options()
+        return (options.get(name) or
+                options.get(name.replace('_', '-')) or default)
+
+    def _probe_in_process(self):
+        """Return the status without forking, or None if it is unclear."""
+        if ENGINE is not None and self._timed('admin', self._ping_admin):
+            return rd_instance.ServiceStatuses.RUNNING
+        socket_file = self._get_mysqld_option('socket', MYSQL_SOCKET)
+        if self._timed('socket', self._ping_socket, socket_file):
+            return rd_instance.ServiceStatuses.RUNNING
+        pid_file = self._get_mysqld_option('pid_file', MYSQL_PID_FILE)
+        return self._timed('pid', self._check_pid_file, pid_file)
+
+    def _ping_admin(self):
+        """True if the admin user can run a query, None if it is unclear.
+
+        The query is given up on after PING_TIMEOUT seconds, so a mysqld
+        that accepts connections but hangs can not stall the agent. No new
+        query is started while one given up on is still running.
+        """
+        if self._admin_ping is not None and not self._admin_ping.dead:
+            return None
+        try:
+            self._admin_ping = greenthread.spawn(tpool.execute, _run_ping,
+                                                 get_auth_password())
+            with Timeout(PING_TIMEOUT, False):
+                return self._admin_ping.wait()
+            LOG.debug("Admin ping timed out.")
+        except Exception:
+            LOG.exception("Admin ping failed.")
+        return None
+
+    def _ping_socket(self, socket_file):
+        """True if mysqld sends its greeting on the socket.
+
+        The greeting comes before authentication, so no credentials are
+        needed and an error packet still means the server is up.
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(PING_TIMEOUT)
+        try:
+            sock.connect(socket_file)
+            return bool(sock.recv(5))
+        except socket.error:
+            return False
+        finally:
+            sock.close()
+
+    def _check_pid_file(self, pid_file):
+        try:
+            with open(pid_file) as f:
+                pid = int(f.read().strip())
+        except (IOError, ValueError):
+            # Missing or unreadable, which ps has to sort out.
+            return None
+        try:
+            with open('/proc/%d/cmdline' % pid) as f:
+                cmdline = f.read()
+        except IOError:
+            return rd_instance.ServiceStatuses.CRASHED
+        if 'mysqld' not in cmdline:
+            return rd_instance.ServiceStatuses.CRASHED
+        # TODO(rnirmal): Need to create new statuses for instances
+        # where the mysql service is up, but unresponsive
+        LOG.info('MySQL pid: %(pid)s' % {'pid': pid})
+        return rd_instance.ServiceStatuses.BLOCKED
+
+    def _probe_with_processes(self):
         try:
             out, err = utils.execute_with_timeout(
                 "/usr/bin/mysqladmin",
                 "ping", run_as_root=True, root_helper="sudo")
-            LOG.info("Service Status is RUNNING.")
             return rd_instance.ServiceStatuses.RUNNING
         except exception.ProcessExecutionError:
             LOG.error("Process execution ")
@@ -170,20 +374,14 @@ class MySqlAppStatus(service.BaseDbStatus):
                 out, err = utils.execute_with_timeout("/bin/ps", "-C",
                                                       "mysqld", "h")
                 pid = out.split()[0]
-                # TODO(rnirmal): Need to create new statuses for instances
-                # where the mysql service is up, but unresponsive
                 LOG.info('MySQL pid: %(pid)s' % {'pid': pid})
-                LOG.info("Service Status is BLOCKED.")
                 return rd_instance.ServiceStatuses.BLOCKED
             except exception.ProcessExecutionError:
                 mysql_args = load_mysqld_options()
-                pid_file = mysql_args.get('pid_file',
-                                          '/var/run/mysqld/mysqld.pid')
+                pid_file = mysql_args.get('pid_file', MYSQL_PID_FILE)
                 if os.path.exists(pid_file):
-                    LOG.info("Service Status is CRASHED.")
                     return rd_instance.ServiceStatuses.CRASHED
                 else:
-                    LOG.info("Service Status is SHUTDOWN.")
                     return rd_instance.ServiceStatuses.SHUTDOWN
 
 
@@ -221,23 +419,34 @@ class LocalSqlClient(object):
 class MySqlAdmin(object):
     """Handles administrative tasks on the MySQL database."""
 
-    def _associate_dbs(self, user):
-        """Internal. Given a MySQLUser, populate its databases attribute."""
-        LOG.debug("Associating dbs to user %s at %s" % (user.name, user.host))
-        with LocalSqlClient(get_engine()) as client:
-            q = sql_query.Query()
-            q.columns = ["grantee", "table_schema"]
-            q.tables = ["information_schema.SCHEMA_PRIVILEGES"]
-            q.group = ["grantee", "table_schema"]
-            q.where = ["privilege_type != 'USAGE'"]
-            t = text(str(q))
-            db_result = client.execute(t)
-            for db in db_result:
-                LOG.debug("\t db: %s" % db)
-                if db['grantee'] == "'%s'@'%s'" % (user.name, user.host):
-                    mysql_db = models.MySQLDatabase()
-                    mysql_db.name = db['table_schema']
-                    user.databases.append(mysql_db.serialize())
+    def _associate_users_dbs(self, client, users):
+        """Internal. Populate the databases attribute of several MySQLUsers.
+
+        The schema privileges of all the users are read with one query
+        restricted to their grantees, and handed out in a single pass.
+        """
+        if not users:
+            return
+        grantees = dict(("'%s'@'%s'" % (user.name, user.host), user)
+                        for user in users)
+        params = dict(('grantee%d' % i, grantee)
+                      for i, grantee in enumerate(grantees))
+        q = sql_query.Query()
+        q.columns = ["grantee", "table_schema"]
+        q.tables = ["information_schema.SCHEMA_PRIVILEGES"]
+        q.group = ["grantee", "table_schema"]
+        q.where = ["privilege_type != 'USAGE'",
+                   "grantee IN (%s)" % ", ".join(":%s" % name
+                                                 for name in sorted(params))]
+        t = text(str(q))
+        db_result = client.execute(t, **params)
+        for db in db_result:
+            LOG.debug("\t db: %s" % db)
+            user = grantees.get(db['grantee'])
+            if user is not None:
+                mysql_db = models.MySQLDatabase()
+                mysql_db.name = db['table_schema']
+                user.databases.append(mysql_db.serialize())
 
     def change_passwords(self, users):
         """Change the passwords of one or more existing users."""
@@ -290,40 +499,66 @@ class MySqlAdmin(object):
             if find_user not in grantee:
                 self.grant_access(uname, host, db_access)
 
-    def create_database(self, databases):
-        """Create the list of specified databases."""
+    def _execute_bulk(self, items):
+        """Internal. Run the statements of many items on one connection.
+
+        items is a list of (name, statements) pairs. The statements of an
+        item stop at its first failure, but the other items still run, and
+        privileges are flushed once when the connection is released.
+        Returns the failed items as dicts with their name and error.
+        """
+        failures = []
         with LocalSqlClient(get_engine()) as client:
-            for item in databases:
-                mydb = models.ValidatedMySQLDatabase()
-                mydb.deserialize(item)
-                cd = sql_query.CreateDatabase(mydb.name,
-                                              mydb.character_set,
-                                              mydb.collate)
-                t = text(str(cd))
-                client.execute(t)
+            for name, statements in items:
+                try:
+                    for statement in statements:
+                        client.execute(text(str(statement)))
+                except Exception as e:
+                    LOG.error(_("Error creating %(name)s: %(error)s") %
+                              {'name': name, 'error': e})
+                    failures.append({'name': name, 'error': str(e)})
+        return failures
+
+    def create_database(self, databases):
+        """Create the list of specified databases.
+
+        Returns the databases which could not be created.
+        """
+        items = []
+        for item in databases:
+            mydb = models.ValidatedMySQLDatabase()
+            mydb.deserialize(item)
+            cd = sql_query.CreateDatabase(mydb.name,
+                                          mydb.character_set,
+                                          mydb.collate)
+            items.append((mydb.name, [cd]))
+        return self._execute_bulk(items)
 
     def create_user(self, users):
         """Create users and grant them privileges for the
            specified databases.
+
+           Returns the users which could not be created or granted all
+           their databases.
         """
-        with LocalSqlClient(get_engine()) as client:
-            for item in users:
-                user = models.MySQLUser()
-                user.deserialize(item)
-                # TODO(cp16net):Should users be allowed to create users
-                # 'os_admin' or 'debian-sys-maint'
-                g = sql_query.Grant(user=user.name, host=user.host,
-                                    clear=user.password)
-                t = text(str(g))
-                client.execute(t)
-                for database in user.databases:
-                    mydb = models.ValidatedMySQLDatabase()
-                    mydb.deserialize(database)
-                    g = sql_query.Grant(permissions='ALL', database=mydb.name,
-                                        user=user.name, host=user.host,
-                                        clear=user.password)
-                    t = text(str(g))
-                    client.execute(t)
+        items = []
+        for item in users:
+            user = models.MySQLUser()
+            user.deserialize(item)
+            # TODO(cp16net):Should users be allowed to create users
+            # 'os_admin' or 'debian-sys-maint'
+            statements = [sql_query.Grant(user=user.name, host=user.host,
+                                          clear=user.password)]
+            for database in user.databases:
+                mydb = models.ValidatedMySQLDatabase()
+                mydb.deserialize(database)
+                statements.append(sql_query.Grant(permissions='ALL',
+                                                  database=mydb.name,
+                                                  user=user.name,
+                                                  host=user.host,
+                                                  clear=user.password))
+            items.append(('%s@%s' % (user.name, user.host), statements))
+        return self._execute_bulk(items)
 
     def delete_database(self, database):
         """Delete the specified database."""
@@ -373,7 +608,7 @@ class MySqlAdmin(object):
             found_user = result[0]
             user.password = found_user['Password']
             user.host = found_user['Host']
-            self._associate_dbs(user)
+            self._associate_users_dbs(client, [user])
             return user
 
     def grant_access(self, username, hostname, databases):
@@ -499,9 +734,10 @@ class MySqlAdmin(object):
                 mysql_user = models.MySQLUser()
                 mysql_user.name = row['User']
                 mysql_user.host = row['Host']
-                self._associate_dbs(mysql_user)
                 next_marker = row['Marker']
-                users.append(mysql_user.serialize())
+                users.append(mysql_user)
+            self._associate_users_dbs(client, users)
+            users = [user.serialize() for user in users]
         if result.rowcount <= limit:
             next_marker = None
         LOG.debug("users = " + str(users))
@@ -760,6 +996,7 @@ class MySqlApp(object):
                                                   admin_password)
         utils.execute_with_timeout("sudo", "mv", TMP_MYCNF,
                                    MYSQL_CONFIG)
+        CONFIG_CACHE.reset(password=admin_password)
 
         self.wipe_ib_logfiles()
 
@@ -21,12 +21,15 @@ import time
 from trove.common import cfg
 from trove.common import context
 from trove.common import instance as rd_instance
+from trove.common import utils
 from trove.conductor import api as conductor_api
+from trove.guestagent import dbaas
 from trove.instance import models as rd_models
 from trove.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 CONF = cfg.CONF
+STATUS_MAX_WAIT_TIME = 5  # seconds.
 
 
 class BaseDbStatus(object):
@@ -61,6 +64,7 @@ class BaseDbStatus(object):
             instance_id=CONF.guest_id,
             status=rd_instance.ServiceStatuses.NEW)
         self.restart_mode = False
+        self.last_heartbeat = 0
 
     def begin_install(self):
         """Called right before DB is prepared."""
@@ -114,9 +118,35 @@ class BaseDbStatus(object):
         heartbeat = {
             'service_status': status.description,
         }
+        volume_used = self._get_volume_used()
+        if volume_used is not None:
+            heartbeat['volume_used'] = volume_used
         conductor_api.API(ctxt).heartbeat(CONF.guest_id, heartbeat)
         LOG.debug("Successfully cast set_status.")
         self.status = status
+        self.last_heartbeat = time.time()
+
+    def _get_volume_used(self):
+        """The space used on the data volume in GB, None if unknown.
+
+        Sent with every heartbeat so that showing an instance does not
+        have to ask the guest.
+        """
+        try:
+            return dbaas.get_filesystem_volume_stats(CONF.mount_point)['used']
+        except Exception:
+            LOG.debug("Could not read the usage of %s." % CONF.mount_point)
+            return None
+
+    def _heartbeat_is_due(self, status):
+        """
+        True if the status changed or no heartbeat has been sent for
+        guest_status_keepalive_interval seconds.
+        """
+        keepalive = CONF.guest_status_keepalive_interval
+        if keepalive <= 0 or not status == self.status:
+            return True
+        return time.time() - self.last_heartbeat >= keepalive
 
     def update(self):
         """Find and report status of DB on this machine.
@@ -125,7 +155,10 @@ class BaseDbStatus(object):
         if self.is_installed and not self._is_restarting:
             LOG.info("Determining status of DB server...")
             status = self._get_actual_db_status()
-            self.set_status(status)
+            if self._heartbeat_is_due(status):
+                self.set_status(status)
+            else:
+                LOG.debug("DB status is unchanged, skipping heartbeat.")
         else:
             LOG.info("DB server is not installed or is in restart mode, so "
                      "for now we'll skip determining the status of DB on this "
@@ -138,18 +171,28 @@ class BaseDbStatus(object):
         specified. Does not update the publicly viewable status Unless
         "update_db" is True.
         """
-        WAIT_TIME = 3
+        # The first checks come quickly since the datastore often settles
+        # within a second, later ones back off.
+        intervals = utils.Backoff(1, STATUS_MAX_WAIT_TIME,
+                                  multiplier=CONF.poll_backoff,
+                                  jitter=CONF.poll_jitter)
         waited_time = 0
-        while waited_time < max_time:
-            time.sleep(WAIT_TIME)
-            waited_time += WAIT_TIME
-            LOG.info("Waiting for DB status to change to %s..." % status)
-            actual_status = self._get_actual_db_status()
-            LOG.info("DB status was %s after %d seconds."
-                     % (actual_status, waited_time))
-            if actual_status == status:
-                if update_db:
-                    self.set_status(actual_status)
-                return True
-        LOG.error("Time out while waiting for DB status to change!")
-        return False
+        polls = 0
+        try:
+            while waited_time < max_time:
+                wait_time = min(intervals.next(), max_time - waited_time)
+                time.sleep(wait_time)
+                waited_time += wait_time
+                polls += 1
+                LOG.info("Waiting for DB status to change to %s..." % status)
+                actual_status = self._get_actual_db_status()
+                LOG.info("DB status was %s after %d seconds."
+                         % (actual_status, waited_time))
+                if actual_status == status:
+                    if update_db:
+                        self.set_status(actual_status)
+                    return True
+            LOG.error("Time out while waiting for DB status to change!")
+            return False
+        finally:
+            utils.record_polls('db_status_change', polls)
@@ -14,6 +14,7 @@
 #    under the License.
 #
 
+from trove.guestagent.strategies import codec
 from trove.guestagent.strategy import Strategy
 from trove.openstack.common import log as logging
 from trove.common import cfg, utils
@@ -42,6 +43,7 @@ class BackupRunner(Strategy):
     # The actual system call to run the backup
     cmd = None
     is_zipped = CONF.backup_use_gzip_compression
+    compression = CONF.backup_compression
     is_encrypted = CONF.backup_use_openssl_encryption
     encrypt_key = CONF.backup_aes_cbc_key
 
@@ -49,6 +51,7 @@ class BackupRunner(Strategy):
         self.base_filename = filename
         self.process = None
         self.pid = None
+        self.codec = codec.get_codec(self.compression)
         kwargs.update({'filename': filename})
         self.command = self.cmd % kwargs
         super(BackupRunner, self).__init__()
@@ -61,7 +64,8 @@ class BackupRunner(Strategy):
         self.process = subprocess.Popen(self.command, shell=True,
                                         stdout=subprocess.PIPE,
                                         stderr=subprocess.PIPE,
-                                        preexec_fn=os.setsid)
+                                        preexec_fn=os.setsid,
+                                        env=self.process_env)
         self.pid = self.process.pid
 
     def __enter__(self):
@@ -104,24 +108,35 @@ class BackupRunner(Strategy):
 
     @property
     def zip_cmd(self):
-        return ' | gzip' if self.is_zipped else ''
+        return (' | %s' % self.codec.compress()) if self.is_zipped else ''
 
     @property
     def zip_manifest(self):
-        return '.gz' if self.is_zipped else ''
+        return self.codec.extension if self.is_zipped else ''
 
     @property
     def encrypt_cmd(self):
-        return (' | openssl enc -aes-256-cbc -salt -pass pass:%s' %
-                self.encrypt_key) if self.is_encrypted else ''
+        return (' | openssl enc -aes-256-cbc -salt -pass env:%s' %
+                codec.ENCRYPT_KEY_ENV) if self.is_encrypted else ''
 
     @property
     def encrypt_manifest(self):
-        return '.enc' if self.is_encrypted else ''
+        return codec.ENCRYPT_MANIFEST if self.is_encrypted else ''
+
+    @property
+    def process_env(self):
+        """Environment for the backup command, carrying the key if needed."""
+        if self.is_encrypted:
+            return codec.encryption_env(self.encrypt_key)
+        return None
 
     def check_process(self):
         """Hook for subclasses to check process for errors."""
         return True
 
+    def metadata(self):
+        """Hook for subclasses to store metadata with the backup."""
+        return {}
+
     def read(self, chunk_size):
         return self.process.stdout.read(chunk_size)
@@ -14,13 +14,20 @@
 #    under the License.
 #
 
+import os
 import re
 
+from trove.common import cfg
+from trove.guestagent.datastore.mysql import service as dbaas
 from trove.guestagent.strategies.backup import base
 from trove.openstack.common import log as logging
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
+LSN_REGEX = re.compile(
+    r"The latest check point \(for incremental\): '(\d+)'")
+
 
 class MySQLDump(base.BackupRunner):
     """Implementation of Backup Strategy for MySQLDump """
@@ -38,6 +45,58 @@ class MySQLDump(base.BackupRunner):
         return cmd + self.zip_cmd + self.encrypt_cmd
 
 
+class MyDumper(base.BackupRunner):
+    """Implementation of Backup Strategy for MyDumper
+
+    mydumper dumps tables in parallel threads from one consistent snapshot,
+    one set of compressed chunk files per table. The files are staged in
+    backup_staging_dir and streamed as a tar archive.
+    """
+    __strategy_name__ = 'mydumper'
+
+    def __init__(self, filename, **kwargs):
+        kwargs.update({
+            'dump_dir': os.path.join(dbaas.get_backup_staging_dir(),
+                                     'mydumper-%s' % filename),
+            'threads': CONF.backup_logical_threads,
+            'rows': CONF.backup_logical_rows,
+        })
+        super(MyDumper, self).__init__(filename, **kwargs)
+
+    @property
+    def cmd(self):
+        cmd = ('(mkdir -p %(dump_dir)s &&'
+               ' mydumper'
+               ' --threads=%(threads)d'
+               ' --rows=%(rows)d'
+               ' --compress'
+               ' %(extra_opts)s'
+               ' --password=%(password)s'
+               ' -u %(user)s'
+               ' --outputdir=%(dump_dir)s'
+               ' 2>/tmp/mydumper.log &&'
+               ' tar -C %(dump_dir)s -cf - .;'
+               ' rm -rf %(dump_dir)s)')
+        return cmd + self.zip_cmd + self.encrypt_cmd
+
+    def check_process(self):
+        """Check the output from mydumper for errors."""
+        LOG.debug('Checking mydumper process output')
+        with open('/tmp/mydumper.log', 'r') as backup_log:
+            output = backup_log.read()
+            if output:
+                LOG.info(output)
+            if 'CRITICAL' in output:
+                LOG.error("Mydumper did not complete successfully")
+                return False
+
+        return True
+
+    @property
+    def filename(self):
+        return '%s.tar' % self.base_filename
+
+
 class InnoBackupEx(base.BackupRunner):
     """Implementation of Backup Strategy for InnoBackupEx """
     __strategy_name__ = 'innobackupex'
@@ -67,6 +126,53 @@ class InnoBackupEx(base.BackupRunner):
 
         return True
 
+    def metadata(self):
+        """Record the last checkpoint so an incremental can follow it."""
+        LOG.debug('Getting metadata from innobackupex output')
+        meta = {}
+        with open('/tmp/innobackupex.log', 'r') as backup_log:
+            match = LSN_REGEX.search(backup_log.read())
+            if match:
+                meta['lsn'] = match.group(1)
+        LOG.info("Metadata for backup: %s", meta)
+        return meta
+
     @property
     def filename(self):
         return '%s.xbstream' % self.base_filename
+
+
+class InnoBackupExIncremental(InnoBackupEx):
+    """InnoBackupEx backup holding only the pages changed since a parent.
+
+    The parent is given by the lsn, parent_location and parent_checksum
+    keyword arguments, the lsn being the last checkpoint recorded in the
+    metadata of the parent.
+    """
+    __strategy_name__ = 'innobackupexincremental'
+
+    def __init__(self, *args, **kwargs):
+        if not kwargs.get('lsn'):
+            raise AttributeError('lsn attribute missing, bad parent?')
+        super(InnoBackupExIncremental, self).__init__(*args, **kwargs)
+        self.parent_location = kwargs.get('parent_location')
+        self.parent_checksum = kwargs.get('parent_checksum')
+
+    @property
+    def cmd(self):
+        cmd = ('sudo innobackupex'
+               ' --stream=xbstream'
+               ' --incremental'
+               ' --incremental-lsn=%(lsn)s'
+               ' %(extra_opts)s'
+               ' /var/lib/mysql 2>/tmp/innobackupex.log'
+               )
+        return cmd + self.zip_cmd + self.encrypt_cmd
+
+    def metadata(self):
+        meta = super(InnoBackupExIncremental, self).metadata()
+        meta.update({
+            'parent_location': self.parent_location,
+            'parent_checksum': self.parent_checksum,
+        })
+        return meta
@@ -0,0 +1,140 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import multiprocessing
+import os
+from distutils import spawn
+
+from trove.common import cfg
+from trove.openstack.common import log as logging
+
+CONF = cfg.CONF
+
+LOG = logging.getLogger(__name__)
+
+# The encryption key is handed to openssl through the environment of the
+# pipeline so that it never shows up in the process list.
+ENCRYPT_KEY_ENV = 'TROVE_BACKUP_KEY'
+ENCRYPT_MANIFEST = '.enc'
+
+
+class Codec(object):
+    """A streaming compressor used in backup and restore pipelines.
+
+    The extension of a codec is appended to the backup manifest, which is
+    how a restore picks the matching decoder.
+    """
+    name = None
+    binary = None
+    extension = None
+    compress_cmd = None
+    decompress_cmd = None
+
+    def is_available(self):
+        return spawn.find_executable(self.binary) is not None
+
+    def compress(self, threads=None):
+        return self.compress_cmd % {'threads': threads or cpu_count()}
+
+    def decompress(self, threads=None):
+        return self.decompress_cmd % {'threads': threads or cpu_count()}
+
+
+class Gzip(Codec):
+    name = 'gzip'
+    binary = 'gzip'
+    extension = '.gz'
+    compress_cmd = 'gzip'
+    decompress_cmd = 'gzip -d -c'
+
+
+class Pigz(Gzip):
+    """Parallel deflate, writing and reading plain gzip streams."""
+    name = 'pigz'
+    binary = 'pigz'
+    compress_cmd = 'pigz -p %(threads)d'
+    decompress_cmd = 'pigz -d -c'
+
+
+class Lz4(Codec):
+    name = 'lz4'
+    binary = 'lz4'
+    extension = '.lz4'
+    compress_cmd = 'lz4 -c'
+    decompress_cmd = 'lz4 -d -c'
+
+
+class Zstd(Codec):
+    name = 'zstd'
+    binary = 'zstd'
+    extension = '.zst'
+    compress_cmd = 'zstd -q -c -T%(threads)d'
+    decompress_cmd = 'zstd -q -d -c'
+
+
+CODECS = dict((codec.name, codec()) for codec in (Gzip, Pigz, Lz4, Zstd))
+DEFAULT_CODEC = 'gzip'
+
+
+def cpu_count():
+    threads = CONF.backup_compression_threads
+    if threads > 0:
+        return threads
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def get_codec(name):
+    """Return the codec called name, or gzip if it can not be used here."""
+    codec = CODECS.get(name)
+    if codec is None:
+        LOG.warn("Unknown backup compression codec %s, using %s.",
+                 name, DEFAULT_CODEC)
+        return CODECS[DEFAULT_CODEC]
+    if codec.name != DEFAULT_CODEC and not codec.is_available():
+        LOG.warn("Backup compression codec %s is not installed, using %s.",
+                 name, DEFAULT_CODEC)
+        return CODECS[DEFAULT_CODEC]
+    return codec
+
+
+def get_codec_for_manifest(manifest):
+    """Return the codec a backup with this manifest was compressed with.
+
+    Returns None if the backup was not compressed. Gzip streams are read
+    back with pigz when it is installed.
+    """
+    if is_encrypted_manifest(manifest):
+        manifest = manifest[:-len(ENCRYPT_MANIFEST)]
+    if manifest.endswith(Gzip.extension):
+        return get_codec(Pigz.name)
+    for codec in CODECS.values():
+        if manifest.endswith(codec.extension):
+            return codec
+    return None
+
+
+def is_encrypted_manifest(manifest):
+    return manifest.endswith(ENCRYPT_MANIFEST)
+
+
+def encryption_env(key):
+    """Return the environment to run an encrypting pipeline with."""
+    env = os.environ.copy()
+    env[ENCRYPT_KEY_ENV] = key
+    return env
@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 #
+from trove.guestagent.strategies import codec
 from trove.guestagent.strategy import Strategy
 from trove.common import cfg
 from trove.common import exception
@@ -24,6 +25,7 @@ LOG = logging.getLogger(__name__)
 CONF = cfg.CONF
 CHUNK_SIZE = CONF.backup_chunk_size
 BACKUP_USE_GZIP = CONF.backup_use_gzip_compression
+BACKUP_COMPRESSION = CONF.backup_compression
 BACKUP_USE_OPENSSL = CONF.backup_use_openssl_encryption
 BACKUP_DECRYPT_KEY = CONF.backup_aes_cbc_key
 
@@ -56,6 +58,7 @@ class RestoreRunner(Strategy):
 
     # Decryption Parameters
     is_zipped = BACKUP_USE_GZIP
+    compression = BACKUP_COMPRESSION
     is_encrypted = BACKUP_USE_OPENSSL
     decrypt_key = BACKUP_DECRYPT_KEY
 
@@ -63,6 +66,7 @@ class RestoreRunner(Strategy):
         self.restore_stream = restore_stream
         self.restore_location = kwargs.get('restore_location',
                                            '/var/lib/mysql')
+        self.codec = self._get_codec(kwargs.get('backup_location'))
         self.restore_cmd = (self.decrypt_cmd +
                             self.unzip_cmd +
                             (self.base_restore_cmd % kwargs))
@@ -102,10 +106,15 @@ class RestoreRunner(Strategy):
         return content_length
 
     def _run_restore(self):
-        with self.restore_stream as stream:
-            self.process = subprocess.Popen(self.restore_cmd, shell=True,
+        return self._unpack(self.restore_stream, self.restore_cmd)
+
+    def _unpack(self, restore_stream, restore_cmd):
+        """Feed a downloaded backup stream to the restore command."""
+        with restore_stream as stream:
+            self.process = subprocess.Popen(restore_cmd, shell=True,
                                             stdin=subprocess.PIPE,
-                                            stderr=subprocess.PIPE)
+                                            stderr=subprocess.PIPE,
+                                            env=self.process_env)
             self.pid = self.process.pid
             content_length = 0
             chunk = stream.read(CHUNK_SIZE)
@@ -119,14 +128,34 @@ class RestoreRunner(Strategy):
 
         return content_length
 
+    def _get_codec(self, backup_location):
+        """Pick the decoder from the manifest the backup was saved under.
+
+        Without a location the configured codec is used, as before backups
+        recorded their codec.
+        """
+        if backup_location is None:
+            return codec.get_codec(self.compression)
+        self.is_encrypted = codec.is_encrypted_manifest(backup_location)
+        backup_codec = codec.get_codec_for_manifest(backup_location)
+        self.is_zipped = backup_codec is not None
+        return backup_codec
+
     @property
     def decrypt_cmd(self):
         if self.is_encrypted:
-            return ('openssl enc -d -aes-256-cbc -salt -pass pass:%s | '
-                    % self.decrypt_key)
+            return ('openssl enc -d -aes-256-cbc -salt -pass env:%s | '
+                    % codec.ENCRYPT_KEY_ENV)
         else:
             return ''
 
     @property
     def unzip_cmd(self):
-        return 'gzip -d -c | ' if self.is_zipped else ''
+        return ('%s | ' % self.codec.decompress()) if self.is_zipped else ''
+
+    @property
+    def process_env(self):
+        """Environment for the restore command, carrying the key if needed."""
+        if self.is_encrypted:
+            return codec.encryption_env(self.decrypt_key)
+        return None
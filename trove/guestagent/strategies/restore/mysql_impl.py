@@ -21,10 +21,12 @@ import tempfile
 
 from trove.guestagent.strategies.restore import base
 from trove.openstack.common import log as logging
+from trove.common import cfg
 from trove.common import exception
 from trove.common import utils
 import trove.guestagent.datastore.mysql.service as dbaas
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
 
@@ -101,6 +103,39 @@ class MySQLDump(base.RestoreRunner, MySQLRestoreMixin):
     base_restore_cmd = 'sudo mysql'
 
 
+class MyDumper(base.RestoreRunner, MySQLRestoreMixin):
+    """Implementation of Restore Strategy for MyDumper
+
+    The archive is unpacked first, then myloader loads the tables in
+    parallel threads. Restores run during prepare, before the admin user
+    exists, so myloader connects as root like the mysql client does.
+    """
+    __strategy_name__ = 'mydumper'
+    base_restore_cmd = ('(sudo mkdir -p %(dump_dir)s &&'
+                        ' sudo tar -x -C %(dump_dir)s &&'
+                        ' sudo myloader'
+                        ' -u root'
+                        ' --threads=%(threads)d'
+                        ' --overwrite-tables'
+                        ' --directory=%(dump_dir)s;'
+                        ' sudo rm -rf %(dump_dir)s)')
+
+    def __init__(self, *args, **kwargs):
+        kwargs.update({
+            'dump_dir': os.path.join(dbaas.get_backup_staging_dir(),
+                                     'myloader'),
+            'threads': CONF.backup_logical_threads,
+        })
+        super(MyDumper, self).__init__(*args, **kwargs)
+
+    def _run_restore(self):
+        content_length = super(MyDumper, self)._run_restore()
+        # Tables are only loaded once the whole archive is unpacked, so
+        # wait for myloader before the restore is reported as done.
+        utils.raise_if_process_errored(self.process, base.RestoreError)
+        return content_length
+
+
 class InnoBackupEx(base.RestoreRunner, MySQLRestoreMixin):
     """Implementation of Restore Strategy for InnoBackupEx"""
     __strategy_name__ = 'innobackupex'
@@ -140,3 +175,72 @@ class InnoBackupEx(base.RestoreRunner, MySQLRestoreMixin):
         files = glob.glob(os.path.join(self.restore_location, "ib_logfile*"))
         for f in files:
             os.unlink(f)
+
+
+class InnoBackupExIncremental(InnoBackupEx):
+    """Restore an incremental InnoBackupEx backup along with its parents.
+
+    The chain is read from the metadata saved with each backup. The full
+    backup is unpacked into the restore location and every incremental on
+    top of it into a directory of its own, each being prepared with
+    --redo-only in order. The final prepare is the one of InnoBackupEx.
+    """
+    __strategy_name__ = 'innobackupexincremental'
+    incremental_prepare_cmd = ('sudo innobackupex --apply-log --redo-only'
+                               ' %(restore_location)s'
+                               ' --defaults-file='
+                               '%(restore_location)s/backup-my.cnf'
+                               ' --ibbackup xtrabackup'
+                               ' %(incremental_args)s'
+                               ' 2>/tmp/innoprepare.log')
+
+    def __init__(self, *args, **kwargs):
+        super(InnoBackupExIncremental, self).__init__(*args, **kwargs)
+        self.storage = kwargs.get('storage')
+        self.backup_location = kwargs.get('backup_location')
+        self.backup_checksum = kwargs.get('backup_checksum')
+        self.content_length = 0
+
+    def _run_restore(self):
+        self._restore_chain(self.backup_location, self.backup_checksum,
+                            self.restore_stream)
+        return self.content_length
+
+    def _restore_chain(self, location, checksum, restore_stream=None):
+        metadata = self.storage.load_metadata(location, checksum)
+        incremental_dir = None
+        if metadata.get('parent_location'):
+            LOG.info("Restoring parent backup %s first.",
+                     metadata['parent_location'])
+            self._restore_chain(metadata['parent_location'],
+                                metadata['parent_checksum'])
+            incremental_dir = os.path.join(self.restore_location, checksum)
+            utils.execute_with_timeout("sudo", "mkdir", "-p",
+                                       incremental_dir)
+
+        # Every backup of the chain records its own codec in its manifest.
+        self.codec = self._get_codec(location)
+        restore_cmd = (self.decrypt_cmd + self.unzip_cmd +
+                       self.base_restore_cmd % {
+                           'restore_location': (incremental_dir or
+                                                self.restore_location)})
+        if restore_stream is None:
+            restore_stream = self.storage.load(self.storage.context,
+                                               location, self.is_zipped,
+                                               checksum)
+        self.content_length += self._unpack(restore_stream, restore_cmd)
+        utils.raise_if_process_errored(self.process, base.RestoreError)
+
+        self._run_incremental_prepare(incremental_dir)
+        if incremental_dir:
+            utils.execute_with_timeout("sudo", "rm", "-rf", incremental_dir)
+
+    def _run_incremental_prepare(self, incremental_dir):
+        incremental_args = ''
+        if incremental_dir:
+            incremental_args = '--incremental-dir=%s' % incremental_dir
+        prepare_cmd = self.incremental_prepare_cmd % {
+            'restore_location': self.restore_location,
+            'incremental_args': incremental_args}
+        LOG.info("Running innobackupex incremental prepare: %s", prepare_cmd)
+        utils.execute(prepare_cmd, shell=True)
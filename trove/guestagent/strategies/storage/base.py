@@ -34,3 +34,11 @@ class Storage(Strategy):
     @abc.abstractmethod
     def load(self, context, location, is_zipped, backup_checksum):
         """Load a stream from a persisted storage location  """
+
+    @abc.abstractmethod
+    def load_metadata(self, location, backup_checksum):
+        """Load the metadata saved with a persisted storage location """
+
+    @abc.abstractmethod
+    def save_metadata(self, location, metadata=None):
+        """Save metadata with a persisted storage location """
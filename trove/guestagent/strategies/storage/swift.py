@@ -14,19 +14,24 @@
 #    under the License.
 #
 
+import collections
 import hashlib
+import sys
+import tempfile
 
 from trove.guestagent.strategies.storage import base
 from trove.openstack.common import log as logging
 from trove.common.remote import create_swift_client
 from trove.common import cfg
 from trove.common import utils
+from eventlet import greenpool
 from eventlet.green import subprocess
 
 LOG = logging.getLogger(__name__)
 CONF = cfg.CONF
 
 CHUNK_SIZE = CONF.backup_chunk_size
+METADATA_HEADER_PREFIX = 'x-object-meta-'
 MAX_FILE_SIZE = CONF.backup_segment_max_size
 BACKUP_CONTAINER = CONF.backup_swift_container
 
@@ -119,21 +124,17 @@ class SwiftStorage(base.Storage):
         location = "%s/%s/%s" % (url, BACKUP_CONTAINER, filename)
 
         # Read from the stream and write to the container in swift
-        while not stream_reader.end_of_file:
-            etag = self.connection.put_object(BACKUP_CONTAINER,
-                                              stream_reader.segment,
-                                              stream_reader)
-
-            segment_checksum = stream_reader.segment_checksum.hexdigest()
-
-            # Check each segment MD5 hash against swift etag
-            # Raise an error and mark backup as failed
-            if etag != segment_checksum:
-                LOG.error("Error saving data segment to swift. "
-                          "ETAG: %s Segment MD5: %s",
-                          etag, segment_checksum)
-                return False, "Error saving data to Swift!", None, location
+        if CONF.backup_upload_concurrency > 1 and CONF.backup_staging_dir:
+            segment_checksums = self._upload_segments_parallel(stream_reader)
+        else:
+            if CONF.backup_upload_concurrency > 1:
+                LOG.warn("backup_staging_dir is not set, uploading one "
+                         "segment at a time.")
+            segment_checksums = self._upload_segments(stream_reader)
+        if segment_checksums is None:
+            return False, "Error saving data to Swift!", None, location
 
+        for segment_checksum in segment_checksums:
             swift_checksum.update(segment_checksum)
 
         # Create the manifest file
@@ -167,6 +168,99 @@ class SwiftStorage(base.Storage):
         return (True, "Successfully saved data to Swift!",
                 final_swift_checksum, location)
 
+    def _check_segment_etag(self, etag, segment_checksum):
+        # Check each segment MD5 hash against swift etag
+        if etag != segment_checksum:
+            LOG.error("Error saving data segment to swift. "
+                      "ETAG: %s Segment MD5: %s",
+                      etag, segment_checksum)
+            return False
+        return True
+
+    def _upload_segments(self, stream_reader):
+        """Upload the segments one after another, streaming each of them.
+
+        Returns the list of segment checksums, or None if swift reported a
+        different etag for any of the segments.
+        """
+        segment_checksums = []
+        while not stream_reader.end_of_file:
+            etag = self.connection.put_object(BACKUP_CONTAINER,
+                                              stream_reader.segment,
+                                              stream_reader)
+
+            segment_checksum = stream_reader.segment_checksum.hexdigest()
+            if not self._check_segment_etag(etag, segment_checksum):
+                return None
+            segment_checksums.append(segment_checksum)
+        return segment_checksums
+
+    def _upload_segments_parallel(self, stream_reader):
+        """Upload up to backup_upload_concurrency segments at a time.
+
+        Each segment is buffered while it is read from the stream, in memory
+        up to backup_upload_buffer_size bytes and in backup_staging_dir
+        beyond that, so segments do not fill the root disk. The next segment
+        is read while the previous ones are uploading, and reading blocks
+        once all upload slots are busy, so at most concurrency + 1 segments
+        are buffered at any time.
+        """
+        pool = greenpool.GreenPool(CONF.backup_upload_concurrency)
+        uploads = []
+        failure = None
+        try:
+            while not stream_reader.end_of_file:
+                segment = stream_reader.segment
+                buf = tempfile.SpooledTemporaryFile(
+                    max_size=CONF.backup_upload_buffer_size,
+                    dir=CONF.backup_staging_dir)
+                try:
+                    chunk = stream_reader.read()
+                    while chunk:
+                        buf.write(chunk)
+                        chunk = stream_reader.read()
+                except Exception:
+                    buf.close()
+                    raise
+                segment_checksum = stream_reader.segment_checksum.hexdigest()
+                length = buf.tell()
+                buf.seek(0)
+                LOG.debug("Queueing upload of segment %s (%d bytes)." %
+                          (segment, length))
+                uploads.append((segment_checksum,
+                                pool.spawn(self._upload_segment, segment,
+                                           buf, length, segment_checksum)))
+        except Exception:
+            failure = sys.exc_info()
+
+        # Wait for every upload, even after a failure, so no buffer is
+        # left open and no greenthread keeps running. The first failure
+        # is raised once they are all done.
+        uploaded = []
+        for checksum, upload in uploads:
+            try:
+                uploaded.append(upload.wait())
+            except Exception:
+                if failure is None:
+                    failure = sys.exc_info()
+                else:
+                    LOG.exception("Upload of a segment failed.")
+        if failure is not None:
+            raise failure[0], failure[1], failure[2]
+        if not all(uploaded):
+            return None
+        return [checksum for checksum, upload in uploads]
+
+    def _upload_segment(self, segment, buf, length, segment_checksum):
+        try:
+            # Swift connections are not safe to share between greenthreads.
+            connection = create_swift_client(self.context)
+            etag = connection.put_object(BACKUP_CONTAINER, segment, buf,
+                                         content_length=length)
+        finally:
+            buf.close()
+        return self._check_segment_etag(etag, segment_checksum)
+
     def _explodeLocation(self, location):
         storage_url = "/".join(location.split('/')[:-2])
         container = location.split('/')[-2]
@@ -178,6 +272,15 @@ class SwiftStorage(base.Storage):
 
         storage_url, container, filename = self._explodeLocation(location)
 
+        if CONF.backup_download_concurrency > 1 and CONF.backup_staging_dir:
+            return SwiftParallelDownloadStream(context,
+                                               container=container,
+                                               filename=filename,
+                                               backup_checksum=backup_checksum)
+        if CONF.backup_download_concurrency > 1:
+            LOG.warn("backup_staging_dir is not set, downloading with the "
+                     "swift command line client.")
+
         return SwiftDownloadStream(context,
                                    auth_token=context.auth_token,
                                    storage_url=storage_url,
@@ -186,6 +289,39 @@ class SwiftStorage(base.Storage):
                                    is_zipped=is_zipped,
                                    backup_checksum=backup_checksum)
 
+    def load_metadata(self, location, backup_checksum):
+        """Load the metadata saved with a backup as swift object headers."""
+        storage_url, container, filename = self._explodeLocation(location)
+        headers = self.connection.head_object(container, filename)
+        if (CONF.verify_swift_checksum_on_restore and backup_checksum and
+                headers.get('etag', '').strip('"') != backup_checksum):
+            raise SwiftDownloadIntegrityError("Original backup checksum "
+                                              "does not match current "
+                                              "checksum.")
+        metadata = {}
+        for key, value in headers.iteritems():
+            if key.startswith(METADATA_HEADER_PREFIX):
+                key = key[len(METADATA_HEADER_PREFIX):].replace('-', '_')
+                metadata[key] = value
+        return metadata
+
+    def save_metadata(self, location, metadata=None):
+        """Save metadata with a backup as swift object headers.
+
+        A POST replaces all the metadata of an object, so the manifest
+        header of a segmented backup is sent again with it.
+        """
+        storage_url, container, filename = self._explodeLocation(location)
+        headers = {}
+        manifest = self.connection.head_object(
+            container, filename).get('x-object-manifest')
+        if manifest:
+            headers['X-Object-Manifest'] = manifest
+        for key, value in (metadata or {}).iteritems():
+            headers['X-Object-Meta-%s' % key.replace('_', '-')] = value
+        LOG.info("Writing metadata for %s: %s", location, headers)
+        self.connection.post_object(container, filename, headers=headers)
+
 
 class SwiftDownloadStream(object):
     """Class to do the actual swift download  using the swiftclient """
@@ -244,3 +380,124 @@ class SwiftDownloadStream(object):
                                         stdout=subprocess.PIPE,
                                         stderr=subprocess.PIPE)
         self.pid = self.process.pid
+
+
+class SwiftParallelDownloadStream(object):
+    """Download the segments of a backup in parallel and read them in order.
+
+    Up to backup_download_concurrency segments are fetched ahead of the
+    reader, each into a buffer that spills to backup_staging_dir beyond
+    backup_download_buffer_size bytes. Segments are checksummed while they
+    download and compared with the etags of the container listing; the
+    checksum of the whole backup is compared with the original backup
+    checksum once the last segment has been read.
+    """
+
+    def __init__(self, context, **kwargs):
+        self.context = context
+        self.container = kwargs.get('container')
+        self.filename = kwargs.get('filename')
+        self.original_backup_checksum = kwargs.get('backup_checksum', None)
+        self.swift_client = create_swift_client(context)
+        self.segment_container = self.container
+        self.segments = []
+        self.is_manifest = False
+        self._next_segment = 0
+        self._pool = None
+        self._downloads = collections.deque()
+        self._current = None
+        self._finished = False
+        self._swift_checksum = hashlib.md5()
+        self._last_segment_checksum = None
+
+    def __enter__(self):
+        self.run()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stop the downloads still in progress."""
+        for download in self._downloads:
+            download.kill()
+        self._downloads.clear()
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+    def run(self):
+        headers = self.swift_client.head_object(self.container, self.filename)
+        manifest = headers.get('x-object-manifest')
+        if manifest:
+            self.is_manifest = True
+            self.segment_container, prefix = manifest.split('/', 1)
+            headers, objects = self.swift_client.get_container(
+                self.segment_container, prefix=prefix, full_listing=True)
+            self.segments = sorted((obj['name'], obj['hash'])
+                                   for obj in objects)
+        else:
+            self.segments = [(self.filename, headers['etag'].strip('"'))]
+        LOG.info("Downloading %d segments of %s." %
+                 (len(self.segments), self.filename))
+        self._pool = greenpool.GreenPool(CONF.backup_download_concurrency)
+        self._read_ahead()
+
+    def _read_ahead(self):
+        while (len(self._downloads) < CONF.backup_download_concurrency and
+               self._next_segment < len(self.segments)):
+            name, etag = self.segments[self._next_segment]
+            self._downloads.append(self._pool.spawn(self._download_segment,
+                                                    name, etag))
+            self._next_segment += 1
+
+    def _download_segment(self, name, etag):
+        # Swift connections are not safe to share between greenthreads.
+        connection = create_swift_client(self.context)
+        headers, body = connection.get_object(self.segment_container, name,
+                                              resp_chunk_size=CHUNK_SIZE)
+        checksum = hashlib.md5()
+        buf = tempfile.SpooledTemporaryFile(
+            max_size=CONF.backup_download_buffer_size,
+            dir=CONF.backup_staging_dir)
+        try:
+            for chunk in body:
+                checksum.update(chunk)
+                buf.write(chunk)
+            if checksum.hexdigest() != etag:
+                raise SwiftDownloadIntegrityError(
+                    "Checksum of segment %s does not match its etag." % name)
+        except Exception:
+            buf.close()
+            raise
+        buf.seek(0)
+        return buf, checksum.hexdigest()
+
+    def read(self, chunk_size=CHUNK_SIZE):
+        while True:
+            if self._current is None:
+                if not self._downloads:
+                    self._finish()
+                    return ''
+                self._current, checksum = self._downloads.popleft().wait()
+                self._swift_checksum.update(checksum)
+                self._last_segment_checksum = checksum
+                self._read_ahead()
+            chunk = self._current.read(chunk_size)
+            if chunk:
+                return chunk
+            self._current.close()
+            self._current = None
+
+    def _finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        if not (CONF.verify_swift_checksum_on_restore and
+                self.original_backup_checksum):
+            return
+        if self.is_manifest:
+            checksum = self._swift_checksum.hexdigest()
+        else:
+            checksum = self._last_segment_checksum
+        if checksum != self.original_backup_checksum:
+            raise SwiftDownloadIntegrityError("Original backup checksum "
+                                              "does not match the checksum "
+                                              "of the downloaded data.")
@@ -19,6 +19,7 @@
 
 from datetime import datetime
 from novaclient import exceptions as nova_exceptions
+from sqlalchemy import case
 from trove.common import cfg
 from trove.common import exception
 import trove.common.instance as rd_instance
@@ -32,6 +33,7 @@ from trove.db import get_db_api
 from trove.db import models as dbmodels
 from trove.datastore import models as datastore_models
 from trove.backup.models import Backup
+from trove.flavor.models import FLAVOR_CATALOG
 from trove.quota.quota import run_with_quotas
 from trove.instance.tasks import InstanceTask
 from trove.instance.tasks import InstanceTasks
@@ -105,8 +107,8 @@ SERVER_INVALID_ACTION_STATUSES = ["BUILD", "REBOOT", "REBUILD", "RESIZE"]
 # Statuses in which an instance can have an action performed.
 VALID_ACTION_STATUSES = ["ACTIVE"]
 
-# Invalid states to contact the agent
-AGENT_INVALID_STATUSES = ["BUILD", "REBOOT", "RESIZE"]
+# Maximum number of ids to put in a single "IN (...)" clause.
+BULK_QUERY_SIZE = 500
 
 
 class SimpleInstance(object):
@@ -117,15 +119,21 @@ class SimpleInstance(object):
 
     """
 
-    def __init__(self, context, db_info, service_status, root_password=None):
+    def __init__(self, context, db_info, service_status, root_password=None,
+                 ds_version=None, ds=None):
         self.context = context
         self.db_info = db_info
         self.service_status = service_status
         self.root_pass = root_password
-        self.ds_version = (datastore_models.DatastoreVersion.
-                           load(self.db_info.datastore_version_id))
-        self.ds = (datastore_models.Datastore.
-                   load(self.ds_version.datastore_id))
+        # The datastore version and datastore may be handed in when they have
+        # already been bulk loaded (see Instances._load_servers_status).
+        if ds_version is None:
+            ds_version = (datastore_models.DatastoreVersion.
+                          load(self.db_info.datastore_version_id))
+        if ds is None:
+            ds = datastore_models.Datastore.load(ds_version.datastore_id)
+        self.ds_version = ds_version
+        self.ds = ds
 
     @property
     def addresses(self):
@@ -259,6 +267,7 @@ class DetailInstance(SimpleInstance):
     def __init__(self, context, db_info, service_status):
         super(DetailInstance, self).__init__(context, db_info, service_status)
         self._volume_used = None
+        self.volume_used_updated = None
 
     @property
     def volume_used(self):
@@ -327,21 +336,19 @@ def load_instance_with_guest(cls, context, id):
 
 
 def load_guest_info(instance, context, id):
-    if instance.status not in AGENT_INVALID_STATUSES:
-        guest = create_guest_client(context, id)
-        try:
-            volume_info = guest.get_volume_info()
-            instance.volume_used = volume_info['used']
-        except Exception as e:
-            LOG.error(e)
+    """Sets the volume usage the guest last sent with its heartbeat."""
+    instance.volume_used = instance.service_status.volume_used
+    instance.volume_used_updated = (instance.service_status.
+                                    volume_used_updated)
     return instance
 
 
 class BaseInstance(SimpleInstance):
     """Represents an instance."""
 
-    def __init__(self, context, db_info, server, service_status):
-        super(BaseInstance, self).__init__(context, db_info, service_status)
+    def __init__(self, context, db_info, server, service_status, **kwargs):
+        super(BaseInstance, self).__init__(context, db_info, service_status,
+                                           **kwargs)
         self.server = server
         self._guest = None
         self._nova_client = None
@@ -444,9 +451,8 @@ class Instance(BuiltInstance):
                datastore, datastore_version, volume_size, backup_id,
                availability_zone=None):
 
-        client = create_nova_client(context)
         try:
-            flavor = client.flavors.get(flavor_id)
+            flavor = FLAVOR_CATALOG.get(context, flavor_id)
         except nova_exceptions.NotFound:
             raise exception.FlavorNotFound(uuid=flavor_id)
 
@@ -519,12 +525,13 @@ class Instance(BuiltInstance):
                   % (self.id, new_flavor_id))
         # Validate that the flavor can be found and that it isn't the same size
         # as the current one.
-        client = create_nova_client(self.context)
         try:
-            new_flavor = client.flavors.get(new_flavor_id)
+            new_flavor = FLAVOR_CATALOG.get(self.context, new_flavor_id)
         except nova_exceptions.NotFound:
             raise exception.FlavorNotFound(uuid=new_flavor_id)
-        old_flavor = client.flavors.get(self.flavor_id)
+        # The instance runs with its flavor, whoever can still access it.
+        old_flavor = FLAVOR_CATALOG.get(self.context, self.flavor_id,
+                                        check_access=False)
         new_flavor_size = new_flavor.ram
         old_flavor_size = old_flavor.ram
         if CONF.trove_volume_support:
@@ -618,8 +625,13 @@ class Instance(BuiltInstance):
 
 def create_server_list_matcher(server_list):
     # Returns a method which finds a server from the given list.
+    # The servers are indexed by id up front so each lookup is O(1).
+    servers_by_id = {}
+    for server in server_list:
+        servers_by_id.setdefault(server.id, []).append(server)
+
     def find_server(instance_id, server_id):
-        matches = [server for server in server_list if server.id == server_id]
+        matches = servers_by_id.get(server_id, [])
         if len(matches) == 1:
             return matches[0]
         elif len(matches) < 1:
@@ -638,20 +650,52 @@ def create_server_list_matcher(server_list):
     return find_server
 
 
+# Per-tenant server lists, used when instances_server_lookup is 'cache'.
+SERVER_LIST_CACHE = utils.TTLCache(CONF.server_list_cache_ttl,
+                                   max_size=CONF.server_list_cache_size)
+
+
+def load_tenant_servers(context, client, db_infos):
+    """Loads the Nova servers needed to show the given instances.
+
+    The strategy is picked by the instances_server_lookup option: 'list'
+    fetches every server of the tenant, 'page' fetches only the servers
+    backing db_infos and 'cache' shares the tenant server list between
+    requests for a few seconds.
+    """
+    lookup = CONF.instances_server_lookup
+    if lookup == 'page':
+        servers = []
+        for db_info in db_infos:
+            if (InstanceTasks.BUILDING == db_info.task_status or
+                    not db_info.compute_instance_id):
+                continue
+            try:
+                servers.append(client.servers.get(db_info.compute_instance_id))
+            except nova_exceptions.NotFound:
+                LOG.debug("Could not find nova server_id(%s)" %
+                          db_info.compute_instance_id)
+        return servers
+    elif lookup == 'cache':
+        servers = SERVER_LIST_CACHE.get(context.tenant)
+        if servers is None:
+            servers = client.servers.list()
+            SERVER_LIST_CACHE.set(context.tenant, servers)
+        return servers
+    return client.servers.list()
+
+
 class Instances(object):
     DEFAULT_LIMIT = CONF.instances_page_size
 
     @staticmethod
     def load(context):
 
-        def load_simple_instance(context, db, status, **kwargs):
-            return SimpleInstance(context, db, status)
+        def load_simple_instance(context, db, status, server=None, **kwargs):
+            return SimpleInstance(context, db, status, **kwargs)
 
         if context is None:
             raise TypeError("Argument context not defined.")
-        client = create_nova_client(context)
-        servers = client.servers.list()
-
         db_infos = DBInstance.find_all(tenant_id=context.tenant, deleted=False)
         limit = int(context.limit or Instances.DEFAULT_LIMIT)
         if limit > Instances.DEFAULT_LIMIT:
@@ -661,10 +705,9 @@ class Instances(object):
                                                   marker=context.marker)
         next_marker = data_view.next_page_marker
 
+        client = create_nova_client(context)
+        servers = load_tenant_servers(context, client, data_view.collection)
         find_server = create_server_list_matcher(servers)
-        for db in db_infos:
-            LOG.debug("checking for db [id=%s, compute_instance_id=%s]" %
-                      (db.id, db.compute_instance_id))
         ret = Instances._load_servers_status(load_simple_instance, context,
                                              data_view.collection,
                                              find_server)
@@ -673,6 +716,11 @@ class Instances(object):
     @staticmethod
     def _load_servers_status(load_instance, context, db_items, find_server):
         ret = []
+        db_items = list(db_items)
+        statuses = InstanceServiceStatus.find_all_by_instance_ids(
+            [db.id for db in db_items])
+        datastores = load_datastores(
+            [db.datastore_version_id for db in db_items])
         for db in db_items:
             server = None
             try:
@@ -688,9 +736,10 @@ class Instances(object):
                 #TODO(tim.simpson): End of hack.
 
                 #volumes = find_volumes(server.id)
-                status = InstanceServiceStatus.find_by(instance_id=db.id)
-                LOG.info(_("Server api_status(%s)") %
-                         status.status.api_status)
+                status = statuses.get(db.id)
+                if status is None:
+                    raise exception.ModelNotFoundError(
+                        _("InstanceServiceStatus Not Found"))
                 if not status.status:  # This should never happen.
                     LOG.error(_("Server status could not be read for "
                                 "instance id(%s)") % db.id)
@@ -699,10 +748,26 @@ class Instances(object):
                 LOG.error(_("Server status could not be read for "
                             "instance id(%s)") % db.id)
                 continue
-            ret.append(load_instance(context, db, status, server=server))
+            ds_version, ds = datastores.get(db.datastore_version_id,
+                                            (None, None))
+            ret.append(load_instance(context, db, status, server=server,
+                                     ds_version=ds_version, ds=ds))
         return ret
 
 
+def load_datastores(version_ids):
+    """Loads the datastore versions and datastores for many instances.
+
+    Returns a dict of datastore version id to a (DatastoreVersion, Datastore)
+    tuple, using one query per table instead of two queries per instance.
+    """
+    versions = datastore_models.DatastoreVersion.load_by_ids(version_ids)
+    datastores = datastore_models.Datastore.load_by_ids(
+        [version.datastore_id for version in versions.values()])
+    return dict((version_id, (version, datastores.get(version.datastore_id)))
+                for version_id, version in versions.iteritems())
+
+
 class DBInstance(dbmodels.DatabaseModelBase):
     """Defines the task being executed plus the start time."""
 
@@ -735,10 +800,25 @@ class DBInstance(dbmodels.DatabaseModelBase):
 
     task_status = property(get_task_status, set_task_status)
 
+    @classmethod
+    def find_all_by_compute_instance_ids(cls, compute_instance_ids):
+        """Loads the instances of several Nova servers, keyed by server id.
+
+        The ids are queried in batches of BULK_QUERY_SIZE.
+        """
+        compute_instance_ids = list(set(compute_instance_ids))
+        db_infos = {}
+        for start in range(0, len(compute_instance_ids), BULK_QUERY_SIZE):
+            batch = compute_instance_ids[start:start + BULK_QUERY_SIZE]
+            query = cls.query().filter(cls.compute_instance_id.in_(batch))
+            for db_info in query.all():
+                db_infos.setdefault(db_info.compute_instance_id, db_info)
+        return db_infos
+
 
 class InstanceServiceStatus(dbmodels.DatabaseModelBase):
     _data_fields = ['instance_id', 'status_id', 'status_description',
-                    'updated_at']
+                    'updated_at', 'volume_used', 'volume_used_updated']
 
     def __init__(self, status, **kwargs):
         kwargs["status_id"] = status.code
@@ -765,6 +845,50 @@ class InstanceServiceStatus(dbmodels.DatabaseModelBase):
 
     status = property(get_status, set_status)
 
+    @classmethod
+    def find_all_by_instance_ids(cls, instance_ids):
+        """Loads the statuses of several instances, keyed by instance id.
+
+        The ids are queried in batches of BULK_QUERY_SIZE so that very large
+        lists do not exceed the bind parameter limits of the database.
+        """
+        instance_ids = list(set(instance_ids))
+        statuses = {}
+        for start in range(0, len(instance_ids), BULK_QUERY_SIZE):
+            batch = instance_ids[start:start + BULK_QUERY_SIZE]
+            query = cls.query().filter(cls.instance_id.in_(batch))
+            for status in query.all():
+                statuses[status.instance_id] = status
+        return statuses
+
+    @classmethod
+    def update_all_by_instance_ids(cls, instance_ids, **values):
+        """Updates the statuses of several instances in bulk UPDATEs."""
+        instance_ids = list(instance_ids)
+        values.setdefault('updated_at', utils.utcnow())
+        for start in range(0, len(instance_ids), BULK_QUERY_SIZE):
+            batch = instance_ids[start:start + BULK_QUERY_SIZE]
+            query = cls.query().filter(cls.instance_id.in_(batch))
+            query.update(values, synchronize_session=False)
+
+    @classmethod
+    def update_volume_used(cls, volume_used):
+        """Stores the volume usage the guests of several instances sent.
+
+        volume_used maps instance ids to the used space in GB. Every batch
+        of instances is written with one UPDATE.
+        """
+        now = utils.utcnow()
+        instance_ids = list(volume_used)
+        for start in range(0, len(instance_ids), BULK_QUERY_SIZE):
+            batch = instance_ids[start:start + BULK_QUERY_SIZE]
+            used = case(dict((instance_id, volume_used[instance_id])
+                             for instance_id in batch),
+                        value=cls.instance_id)
+            query = cls.query().filter(cls.instance_id.in_(batch))
+            query.update({'volume_used': used, 'volume_used_updated': now},
+                         synchronize_session=False)
+
 
 def persisted_models():
     return {
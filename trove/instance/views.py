@@ -108,11 +108,15 @@ class InstanceDetailView(InstanceView):
         if (isinstance(self.instance, models.DetailInstance) and
                 self.instance.volume_used):
             used = self.instance.volume_used
+            # When the guest last reported the usage with its heartbeat.
+            used_updated = self.instance.volume_used_updated
             if CONF.trove_volume_support:
                 result['instance']['volume']['used'] = used
+                result['instance']['volume']['used_updated'] = used_updated
             else:
                 # either ephemeral or root partition
-                result['instance']['local_storage'] = {'used': used}
+                result['instance']['local_storage'] = {
+                    'used': used, 'used_updated': used_updated}
 
         if self.instance.root_password:
             result['instance']['password'] = self.instance.root_password
@@ -17,10 +17,14 @@
 
 """Quotas for DB instances and resources."""
 
+from sqlalchemy import case
+
 from trove.openstack.common import log as logging
 from trove.openstack.common.gettextutils import _
 from oslo.config import cfg
 from trove.common import exception
+from trove.common import utils
+from trove.db import get_db_api
 from trove.openstack.common import importutils
 from trove.quota.models import Quota
 from trove.quota.models import QuotaUsage
@@ -138,11 +142,7 @@ class DbQuotaDriver(object):
         :param deltas: A dictionary of the proposed delta changes.
         """
 
-        unregistered_resources = [delta for delta in deltas
-                                  if delta not in resources]
-        if unregistered_resources:
-            raise exception.QuotaResourceUnknown(unknown=
-                                                 unregistered_resources)
+        self._verify_resources(resources, deltas)
 
         quotas = self.get_all_quotas_by_tenant(tenant_id, deltas.keys())
         quota_usages = self.get_all_quota_usages_by_tenant(tenant_id,
@@ -171,6 +171,13 @@ class DbQuotaDriver(object):
 
         return reservations
 
+    def _verify_resources(self, resources, deltas):
+        unregistered_resources = [delta for delta in deltas
+                                  if delta not in resources]
+        if unregistered_resources:
+            raise exception.QuotaResourceUnknown(unknown=
+                                                 unregistered_resources)
+
     def commit(self, reservations):
         """Commit reservations.
 
@@ -203,6 +210,133 @@ class DbQuotaDriver(object):
             reservation.save()
 
 
+class AtomicDbQuotaDriver(DbQuotaDriver):
+    """
+    Driver which checks and reserves quotas in a single transaction.
+
+    Usages are changed with conditional UPDATE statements rather than read
+    and saved back, so concurrent requests of one tenant can neither
+    overshoot a hard limit nor lose each other's updates. A set of
+    reservations is committed or rolled back with one statement per usage
+    and one for all of the reservations.
+    """
+
+    def reserve(self, tenant_id, resources, deltas):
+        """Check quotas and reserve resources for a tenant.
+
+        Raises QuotaExceeded with the sorted list of the resources which
+        are too high, in which case nothing is reserved. Otherwise returns
+        the list of reservations which were created.
+
+        :param tenant_id: The ID of the tenant reserving the resources.
+        :param resources: A dictionary of the registered resources.
+        :param deltas: A dictionary of the proposed delta changes.
+        """
+
+        self._verify_resources(resources, deltas)
+
+        quotas = self.get_all_quotas_by_tenant(tenant_id, deltas.keys())
+        try:
+            usages = self.get_all_quota_usages_by_tenant(tenant_id,
+                                                         deltas.keys())
+        except exception.DBConstraintError:
+            # A concurrent request created the missing usages first.
+            usages = self.get_all_quota_usages_by_tenant(tenant_id,
+                                                         deltas.keys())
+
+        now = utils.utcnow()
+        overs = []
+        reservations = []
+        with get_db_api().transaction() as db_session:
+            for resource, delta in deltas.items():
+                delta = int(delta)
+                query = db_session.query(QuotaUsage).filter_by(
+                    id=usages[resource].id)
+                if delta > 0:
+                    query = query.filter(
+                        QuotaUsage.in_use + QuotaUsage.reserved + delta <=
+                        quotas[resource].hard_limit)
+                updated = query.update(
+                    {'reserved': QuotaUsage.reserved + delta,
+                     'updated': now},
+                    synchronize_session=False)
+                if not updated:
+                    overs.append(resource)
+                    continue
+                reservations.append(
+                    Reservation(id=utils.generate_uuid(),
+                                created=now,
+                                updated=now,
+                                usage_id=usages[resource].id,
+                                delta=delta,
+                                status=Reservation.Statuses.RESERVED))
+
+            if overs:
+                raise exception.QuotaExceeded(overs=sorted(overs))
+            db_session.add_all(reservations)
+
+        return reservations
+
+    def commit(self, reservations):
+        """Commit reservations.
+
+        :param reservations: A list of the reservation UUIDs, as
+                             returned by the reserve() method.
+        """
+
+        self._settle(reservations, Reservation.Statuses.COMMITTED)
+
+    def rollback(self, reservations):
+        """Roll back reservations.
+
+        :param reservations: A list of the reservation UUIDs, as
+                             returned by the reserve() method.
+        """
+
+        self._settle(reservations, Reservation.Statuses.ROLLEDBACK)
+
+    def _settle(self, reservations, status):
+        """Move the reserved deltas to in_use, or drop them on rollback.
+
+        Reservations which were already settled are left alone, so a set
+        can not be applied twice.
+        """
+        ids = [reservation.id for reservation in reservations]
+        if not ids:
+            return
+
+        now = utils.utcnow()
+        with get_db_api().transaction() as db_session:
+            pending = (db_session.query(Reservation).
+                       filter(Reservation.id.in_(ids)).
+                       filter_by(status=Reservation.Statuses.RESERVED).
+                       with_lockmode('update').all())
+            usage_deltas = {}
+            for reservation in pending:
+                usage_deltas[reservation.usage_id] = (
+                    usage_deltas.get(reservation.usage_id, 0) +
+                    reservation.delta)
+
+            for usage_id, delta in usage_deltas.items():
+                values = {'reserved': QuotaUsage.reserved - delta,
+                          'updated': now}
+                if status == Reservation.Statuses.COMMITTED:
+                    in_use = QuotaUsage.in_use + delta
+                    values['in_use'] = case([(in_use < 0, 0)], else_=in_use)
+                db_session.query(QuotaUsage).filter_by(id=usage_id).update(
+                    values, synchronize_session=False)
+
+            if pending:
+                db_session.query(Reservation).filter(
+                    Reservation.id.in_([reservation.id
+                                        for reservation in pending])).update(
+                    {'status': status, 'updated': now},
+                    synchronize_session=False)
+
+        for reservation in reservations:
+            reservation.status = status
+
+
 class QuotaEngine(object):
     """Represent the set of recognized quotas."""
 
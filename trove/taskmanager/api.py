@@ -117,3 +117,12 @@ class API(proxy.RpcProxy):
                                 backup_id=backup_id,
                                 availability_zone=availability_zone,
                                 root_password=root_password))
+
+    def service_status_changed(self, instance_ids):
+        LOG.debug("Broadcasting service status changes of instances: %s" %
+                  instance_ids)
+        # Every taskmanager gets the message, since any of them may be
+        # waiting on these instances.
+        self.fanout_cast(self.context,
+                         self.make_msg("service_status_changed",
+                                       instance_ids=instance_ids))
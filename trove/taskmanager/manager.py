@@ -19,10 +19,12 @@ from trove.common.context import TroveContext
 import trove.extensions.mgmt.instances.models as mgmtmodels
 import trove.common.cfg as cfg
 from trove.common import exception
+from trove.flavor import models as flavor_models
 from trove.openstack.common import log as logging
 from trove.openstack.common import importutils
 from trove.openstack.common import periodic_task
 from trove.taskmanager import models
+from trove.taskmanager import waiters
 from trove.taskmanager.models import FreshInstanceTasks
 
 LOG = logging.getLogger(__name__)
@@ -43,6 +45,28 @@ class Manager(periodic_task.PeriodicTasks):
                 CONF.exists_notification_transformer,
                 context=self.admin_context)
 
+    def initialize_service_hook(self, service):
+        flavor_models.prefetch_flavors(self.admin_context)
+        if CONF.task_wait_notifications and CONF.nova_notification_topic:
+            # A pool of its own per host, so that every taskmanager sees
+            # every notification.
+            service.conn.join_consumer_pool(
+                self._process_nova_notification,
+                'trove-taskmanager.%s' % service.host,
+                CONF.nova_notification_topic,
+                exchange_name=CONF.nova_notification_exchange)
+
+    def _process_nova_notification(self, message):
+        if not message.get('event_type', '').startswith('compute.instance.'):
+            return
+        server_id = message.get('payload', {}).get('instance_id')
+        if server_id:
+            waiters.REGISTRY.notify(waiters.server_key(server_id))
+
+    def service_status_changed(self, context, instance_ids):
+        for instance_id in instance_ids:
+            waiters.REGISTRY.notify(waiters.service_key(instance_id))
+
     def resize_volume(self, context, instance_id, new_size):
         instance_tasks = models.BuiltInstanceTasks.load(context, instance_id)
         instance_tasks.resize_volume(new_size)
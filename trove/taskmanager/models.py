@@ -34,6 +34,7 @@ from trove.common.remote import create_heat_client
 from trove.common.remote import create_cinder_client
 from trove.extensions.security_group.models import SecurityGroup
 from trove.extensions.security_group.models import SecurityGroupRule
+from trove.flavor.models import FLAVOR_CATALOG
 from swiftclient.client import ClientException
 from trove.instance import models as inst_models
 from trove.instance.models import BuiltInstance
@@ -47,6 +48,7 @@ from trove.openstack.common import log as logging
 from trove.openstack.common.gettextutils import _
 from trove.openstack.common.notifier import api as notifier
 from trove.openstack.common import timeutils
+from trove.taskmanager import waiters
 import trove.common.remote as remote
 
 LOG = logging.getLogger(__name__)
@@ -84,7 +86,9 @@ class NotifyMixin(object):
 
         # Grab the instance size from the kwargs or from the nova client
         instance_size = kwargs.pop('instance_size', None)
-        flavor = self.nova_client.flavors.get(self.flavor_id)
+        flavor = FLAVOR_CATALOG.get(self.context, self.flavor_id,
+                                    client=self.nova_client,
+                                    check_access=False)
         server = kwargs.pop('server', None)
         if server is None:
             server = self.nova_client.servers.get(self.server_id)
@@ -225,9 +229,13 @@ class FreshInstanceTasks(FreshInstance, NotifyMixin, ConfigurationMixin):
         # record to avoid over billing a customer for an instance that
         # fails to build properly.
         try:
-            utils.poll_until(self._service_is_active,
-                             sleep_time=USAGE_SLEEP_TIME,
-                             time_out=USAGE_TIMEOUT)
+            c_id = self.db_info.compute_instance_id
+            waiters.wait_until([waiters.service_key(self.id),
+                                waiters.server_key(c_id)],
+                               self._service_is_active,
+                               sleep_time=USAGE_SLEEP_TIME,
+                               time_out=USAGE_TIMEOUT,
+                               name='instance_create_active')
             self.send_usage_event('create', instance_size=flavor['ram'])
         except PollTimeOut:
             LOG.error(_("Timeout for service changing to active. "
@@ -269,7 +277,7 @@ class FreshInstanceTasks(FreshInstance, NotifyMixin, ConfigurationMixin):
         """
         Check that the database guest is active.
 
-        This function is meant to be called with poll_until to check that
+        This function is meant to be called with wait_until to check that
         the guest is alive before sending a 'create' message. This prevents
         over billing a customer for a instance that they can never use.
 
@@ -370,7 +378,8 @@ class FreshInstanceTasks(FreshInstance, NotifyMixin, ConfigurationMixin):
             lambda stack: stack.stack_status in ['CREATE_COMPLETE',
                                                  'CREATE_FAILED'],
             sleep_time=2,
-            time_out=HEAT_TIME_OUT)
+            time_out=HEAT_TIME_OUT,
+            name='heat_stack_create')
 
         resource = client.resources.get(stack.id, 'BaseInstance')
         server = novaclient.servers.get(resource.physical_resource_id)
@@ -457,7 +466,8 @@ class FreshInstanceTasks(FreshInstance, NotifyMixin, ConfigurationMixin):
             lambda: volume_client.volumes.get(volume_ref.id),
             lambda v_ref: v_ref.status in ['available', 'error'],
             sleep_time=2,
-            time_out=VOLUME_TIME_OUT)
+            time_out=VOLUME_TIME_OUT,
+            name='volume_create')
 
         v_ref = volume_client.volumes.get(volume_ref.id)
         if v_ref.status in ['error']:
@@ -558,8 +568,11 @@ class FreshInstanceTasks(FreshInstance, NotifyMixin, ConfigurationMixin):
                               {'instance': self.id, 'status': server.status})
                     raise TroveError(status=server.status)
 
-            utils.poll_until(get_server, ip_is_available,
-                             sleep_time=1, time_out=DNS_TIME_OUT)
+            waiters.wait_until(
+                [waiters.server_key(self.db_info.compute_instance_id)],
+                get_server, ip_is_available,
+                sleep_time=1, time_out=DNS_TIME_OUT,
+                name='dns_ip_available')
             server = self.nova_client.servers.get(
                 self.db_info.compute_instance_id)
             LOG.info(_("Creating dns entry..."))
@@ -635,8 +648,10 @@ class BuiltInstanceTasks(BuiltInstance, NotifyMixin, ConfigurationMixin):
                 return True
 
         try:
-            utils.poll_until(server_is_finished, sleep_time=2,
-                             time_out=CONF.server_delete_time_out)
+            waiters.wait_until([waiters.server_key(server_id)],
+                               server_is_finished, sleep_time=2,
+                               time_out=CONF.server_delete_time_out,
+                               name='server_delete')
         except PollTimeOut:
             LOG.exception(_("Timout during nova server delete of server: %s") %
                           server_id)
@@ -658,7 +673,8 @@ class BuiltInstanceTasks(BuiltInstance, NotifyMixin, ConfigurationMixin):
                 lambda: self.volume_client.volumes.get(self.volume_id),
                 lambda volume: volume.status == 'available',
                 sleep_time=2,
-                time_out=CONF.volume_time_out)
+                time_out=CONF.volume_time_out,
+                name='volume_detach')
 
             LOG.debug(_("Successfully detach volume %s") % self.volume_id)
         except Exception as e:
@@ -696,7 +712,8 @@ class BuiltInstanceTasks(BuiltInstance, NotifyMixin, ConfigurationMixin):
                 lambda: self.volume_client.volumes.get(self.volume_id),
                 lambda volume: volume.size == int(new_size),
                 sleep_time=2,
-                time_out=CONF.volume_time_out)
+                time_out=CONF.volume_time_out,
+                name='volume_extend')
             self.update_db(volume_size=new_size)
         except PollTimeOut:
             LOG.error(_("Timeout trying to rescan or resize the attached "
@@ -762,10 +779,12 @@ class BuiltInstanceTasks(BuiltInstance, NotifyMixin, ConfigurationMixin):
                 self._refresh_compute_server_info()
                 return self.server.status == 'ACTIVE'
 
-            utils.poll_until(
+            waiters.wait_until(
+                [waiters.server_key(self.server.id)],
                 update_server_info,
                 sleep_time=2,
-                time_out=reboot_time_out)
+                time_out=reboot_time_out,
+                name='server_reboot')
 
             # Set the status to PAUSED. The guest agent will reset the status
             # when the reboot completes and MySQL is running.
@@ -846,8 +865,19 @@ class BackupTasks(object):
 
     @classmethod
     def delete_backup(cls, context, backup_id):
-        #delete backup from swift
+        """Delete a backup along with the incremental backups on top of it.
+
+        The last incremental goes first, so a failure never leaves behind an
+        incremental backup whose parent is gone.
+        """
         backup = bkup_models.Backup.get_by_id(context, backup_id)
+        for child in reversed(bkup_models.Backup.children(backup_id)):
+            cls._delete_backup(context, child)
+        cls._delete_backup(context, backup)
+
+    @classmethod
+    def _delete_backup(cls, context, backup):
+        #delete backup from swift
         try:
             filename = backup.filename
             if filename:
@@ -879,10 +909,12 @@ class ResizeActionBase(ConfigurationMixin):
         self.instance._set_service_status_to_paused()
         # Now we wait until it sets it to anything at all,
         # so we know it's alive.
-        utils.poll_until(
+        waiters.wait_until(
+            [waiters.service_key(self.instance.id)],
             self._guest_is_awake,
             sleep_time=2,
-            time_out=RESIZE_TIME_OUT)
+            time_out=RESIZE_TIME_OUT,
+            name='resize_guest_awake')
 
     def _assert_nova_status_is_ok(self):
         # Make sure Nova thinks things went well.
@@ -983,10 +1015,12 @@ class ResizeActionBase(ConfigurationMixin):
             self.instance._refresh_compute_server_info()
             return self.instance.server.status != 'RESIZE'
 
-        utils.poll_until(
+        waiters.wait_until(
+            [waiters.server_key(self.instance.server.id)],
             update_server_info,
             sleep_time=2,
-            time_out=RESIZE_TIME_OUT)
+            time_out=RESIZE_TIME_OUT,
+            name='server_resize')
 
     def _wait_for_revert_nova_action(self):
         # Wait for the server to return to ACTIVE after revert.
@@ -994,10 +1028,12 @@ class ResizeActionBase(ConfigurationMixin):
             self.instance._refresh_compute_server_info()
             return self.instance.server.status == 'ACTIVE'
 
-        utils.poll_until(
+        waiters.wait_until(
+            [waiters.server_key(self.instance.server.id)],
             update_server_info,
             sleep_time=2,
-            time_out=REVERT_TIME_OUT)
+            time_out=REVERT_TIME_OUT,
+            name='server_resize_revert')
 
 
 class ResizeAction(ResizeActionBase):
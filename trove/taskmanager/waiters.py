@@ -0,0 +1,150 @@
+#    Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Wakes up tasks waiting for an instance to change state.
+
+A task waiting for a guest or a compute server subscribes to the keys of
+what it waits for, checks once, and sleeps until one of the keys is
+notified: by the conductor when a heartbeat changes the service status of
+an instance, or by a Nova notification about a server. The task still
+polls when nothing wakes it, in case a notification was lost, but the
+interval of this fallback doubles every time it finds nothing new.
+"""
+
+import time
+
+import eventlet
+from eventlet import event
+
+from trove.common import cfg
+from trove.common import exception
+from trove.common import utils
+from trove.openstack.common import log as logging
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+
+def service_key(instance_id):
+    """Key notified when the service status of an instance changes."""
+    return ('service', instance_id)
+
+
+def server_key(server_id):
+    """Key notified when Nova reports a change of a compute server."""
+    return ('server', server_id)
+
+
+class WaitRegistry(object):
+
+    def __init__(self):
+        self._waiters = {}
+
+    def notify(self, key):
+        """Wakes up every task waiting on key."""
+        for waiter in self._waiters.pop(key, ()):
+            if not waiter.ready():
+                waiter.send()
+
+    def waiting(self, key):
+        return len(self._waiters.get(key, ()))
+
+    def _subscribe(self, keys):
+        waiter = event.Event()
+        for key in keys:
+            self._waiters.setdefault(key, set()).add(waiter)
+        return waiter
+
+    def _unsubscribe(self, keys, waiter):
+        for key in keys:
+            waiters = self._waiters.get(key)
+            if waiters is None:
+                continue
+            waiters.discard(waiter)
+            if not waiters:
+                del self._waiters[key]
+
+    def wait_until(self, keys, retriever, condition=lambda value: value,
+                   sleep_time=1, time_out=None, name=None):
+        """Retrieves object until it passes condition, then returns it.
+
+        Like utils.poll_until, but the object is only retrieved again when
+        one of keys is notified, or when the fallback interval, starting
+        at sleep_time, is over. PollTimeOut is raised once time_out is
+        eclipsed.
+        """
+        intervals = utils.Backoff(sleep_time,
+                                  CONF.task_wait_max_fallback_interval,
+                                  multiplier=2, jitter=CONF.poll_jitter)
+        interval = intervals.next()
+        start_time = time.time()
+        polls = 0
+        try:
+            while True:
+                # Subscribe before retrieving so a notification sent while
+                # the retriever is blocked on I/O is not lost.
+                waiter = self._subscribe(keys)
+                try:
+                    polls += 1
+                    obj = retriever()
+                    if condition(obj):
+                        return obj
+                    timeout = interval
+                    if time_out is not None:
+                        remaining = start_time + time_out - time.time()
+                        if remaining <= 0:
+                            raise exception.PollTimeOut
+                        timeout = min(timeout, remaining)
+                    with eventlet.Timeout(timeout, False):
+                        waiter.wait()
+                    notified = waiter.ready()
+                finally:
+                    self._unsubscribe(keys, waiter)
+                if not notified:
+                    interval = intervals.next()
+                    LOG.debug("No notification for %(keys)s, polling again "
+                              "within %(interval).1f seconds." %
+                              {'keys': keys, 'interval': interval})
+        finally:
+            utils.record_polls(
+                name or getattr(retriever, '__name__', 'wait'), polls)
+
+
+REGISTRY = WaitRegistry()
+
+
+def _notified(key):
+    """Tells whether anything notifies key."""
+    if key[0] == 'server':
+        # Only sent when the taskmanager consumes Nova notifications.
+        return bool(CONF.nova_notification_topic)
+    return True
+
+
+def wait_until(keys, retriever, condition=lambda value: value,
+               sleep_time=1, time_out=None, name=None):
+    """Waits on the registry, or polls with utils.poll_until.
+
+    The task polls at sleep_time when the registry is disabled or when
+    nothing notifies any of keys, such as the keys of the servers when no
+    Nova notification topic is set.
+    """
+    if (not CONF.task_wait_notifications or
+            not any(_notified(key) for key in keys)):
+        return utils.poll_until(retriever, condition, sleep_time=sleep_time,
+                                time_out=time_out, name=name)
+    sleep_time = max(sleep_time, CONF.task_wait_fallback_interval)
+    return REGISTRY.wait_until(keys, retriever, condition,
+                               sleep_time=sleep_time, time_out=time_out,
+                               name=name)
@@ -22,6 +22,7 @@ import re
 import eventlet
 from trove.common import exception as rd_exception
 from trove.common import instance as rd_instance
+from trove.common import utils
 from trove.tests.util import unquote_user_host
 
 DB = {}
@@ -225,6 +226,7 @@ class FakeGuest(object):
                 status.status = rd_instance.ServiceStatuses.FAILED
             else:
                 status.status = rd_instance.ServiceStatuses.RUNNING
+            self._set_volume_used(status)
             status.save()
             AgentHeartBeat.create(instance_id=self.id)
         eventlet.spawn_after(1.0, update_db)
@@ -237,8 +239,14 @@ class FakeGuest(object):
                   }
         status = InstanceServiceStatus.find_by(instance_id=self.id)
         status.status = states[new_status]
+        self._set_volume_used(status)
         status.save()
 
+    def _set_volume_used(self, status):
+        # Real guests send the usage with their heartbeats.
+        status.volume_used = self.get_volume_info()['used']
+        status.volume_used_updated = utils.utcnow()
+
     def restart(self):
         # All this does is restart, and shut off the status updates while it
         # does so. So there's actually nothing to do to fake this out except
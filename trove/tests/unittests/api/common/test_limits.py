@@ -18,12 +18,15 @@ Tests dealing with HTTP rate-limiting.
 """
 
 import httplib
+import socket
 import StringIO
 from xml.dom import minidom
 from trove.quota.models import Quota
 import testtools
 import webob
 
+from mock import Mock
+from mock import patch
 from mockito import when, mock, any
 from trove.common import limits
 from trove.common.limits import Limit
@@ -492,6 +495,108 @@ class LimiterTest(BaseLimitTestSuite):
         self.assertEqual(expected, results)
 
 
+class CompiledLimiterTest(BaseLimitTestSuite):
+    """
+    Tests for the in-memory `limits.CompiledLimiter` class.
+    """
+
+    def update_limits(self, delay):
+        when(self.limiter)._get_time().thenReturn(delay)
+
+    def setUp(self):
+        """Run before each test."""
+        super(CompiledLimiterTest, self).setUp()
+        userlimits = {'user:user3': ''}
+        self.limiter = limits.CompiledLimiter(TEST_LIMITS, max_tenants=3,
+                                              **userlimits)
+        self.update_limits(0.0)
+
+    def _check(self, num, verb, url, username=None):
+        """Check and yield results from checks."""
+        for x in xrange(num):
+            yield self.limiter.check_for_delay(verb, url, username)[0]
+
+    def test_no_delay_GET(self):
+        delay = self.limiter.check_for_delay("GET", "/anything")
+        self.assertEqual(delay, (None, None))
+        self.assertEqual(self.limiter.levels, {})
+
+    def test_delay_GET(self):
+        expected = [None, 60.0]
+        results = list(self._check(2, "GET", "/delayed/1"))
+        self.assertEqual(expected, results)
+
+    def test_delay_PUT_wait(self):
+        expected = [None] * 10 + [6.0]
+        results = list(self._check(11, "PUT", "/anything"))
+        self.assertEqual(expected, results)
+
+        self.update_limits(6.0)
+
+        expected = [None, 6.0]
+        results = list(self._check(2, "PUT", "/anything"))
+        self.assertEqual(expected, results)
+
+    def test_delay_POST(self):
+        expected = [None] * 7
+        results = list(self._check(7, "POST", "/anything"))
+        self.assertEqual(expected, results)
+
+        delay, error = self.limiter.check_for_delay("POST", "/anything")
+        self.assertAlmostEqual(60.0 / 7.0, delay, 8)
+        self.assertEqual(TEST_LIMITS[1].error_message, error)
+
+    def test_user_limit(self):
+        expected = [None] * 20
+        results = list(self._check(20, "PUT", "/anything", "user3"))
+        self.assertEqual(expected, results)
+        self.assertEqual(self.limiter.get_limits('user3'), [])
+
+    def test_multiple_users(self):
+        expected = [None] * 10 + [6.0] * 10
+        results = list(self._check(20, "PUT", "/anything", "user1"))
+        self.assertEqual(expected, results)
+
+        expected = [None] * 10 + [6.0] * 5
+        results = list(self._check(15, "PUT", "/anything", "user2"))
+        self.assertEqual(expected, results)
+
+    def test_regex_with_groups(self):
+        limiter = limits.CompiledLimiter(
+            [Limit("GET", "*", ".*", 10, limits.PER_MINUTE),
+             Limit("GET", "/a", "/(a|b)/\\1", 1, limits.PER_MINUTE)])
+        when(limiter)._get_time().thenReturn(0.0)
+        self.assertEqual((None, None), limiter.check_for_delay("GET", "/a/a"))
+        self.assertEqual(60.0, limiter.check_for_delay("GET", "/a/a")[0])
+        self.assertEqual((None, None), limiter.check_for_delay("GET", "/a/b"))
+
+    def test_get_limits(self):
+        self.update_limits(30.0)
+        self.assertEqual(10, self.limiter.get_limits()[2]['remaining'])
+        self.assertEqual(30, self.limiter.get_limits()[2]['resetTime'])
+        list(self._check(5, "PUT", "/anything"))
+        limit = self.limiter.get_limits()[2]
+        self.assertEqual(5, limit['remaining'])
+        self.assertEqual('PUT', limit['verb'])
+        self.assertEqual('MINUTE', limit['unit'])
+
+    def test_idle_users_evicted(self):
+        for username in ['user1', 'user2', 'user4']:
+            self.limiter.check_for_delay("PUT", "/anything", username)
+        self.update_limits(61.0)
+        self.limiter.check_for_delay("PUT", "/anything", "user5")
+        self.assertEqual(['user5'], self.limiter.levels.keys())
+
+    def test_least_recently_seen_evicted(self):
+        for i, username in enumerate(['user1', 'user2', 'user4']):
+            self.update_limits(float(i))
+            self.limiter.check_for_delay("PUT", "/anything", username)
+        self.limiter.check_for_delay("PUT", "/anything", "user1")
+        self.limiter.check_for_delay("PUT", "/anything", "user5")
+        self.assertEqual(['user1', 'user4', 'user5'],
+                         sorted(self.limiter.levels.keys()))
+
+
 class WsgiLimiterTest(BaseLimitTestSuite):
     """
     Tests for `limits.WsgiLimiter` class.
@@ -561,6 +666,26 @@ class WsgiLimiterTest(BaseLimitTestSuite):
         delay = self._request("GET", "/delayed", "user2")
         self.assertAlmostEqual(float(delay), 60, 1)
 
+    def _admit(self, verb, url, count):
+        request = webob.Request.blank("/")
+        request.method = "POST"
+        request.body = jsonutils.dumps({"verb": verb, "path": url,
+                                        "count": count})
+        return request.get_response(self.app)
+
+    def test_admit_count(self):
+        response = self._admit("PUT", "/anything", 4)
+        self.assertEqual(response.status_int, 204)
+        self.assertEqual(response.headers["X-Admitted"], "4")
+
+        response = self._admit("PUT", "/anything", 10)
+        self.assertEqual(response.headers["X-Admitted"], "6")
+
+        response = self._admit("PUT", "/anything", 1)
+        self.assertEqual(response.status_int, 403)
+        self.assertAlmostEqual(float(response.headers["X-Wait-Seconds"]),
+                               6, 1)
+
 
 class FakeHttplibSocket(object):
     """
@@ -613,6 +738,9 @@ class FakeHttplibConnection(object):
         """Return our generated response from the request."""
         return self.http_response
 
+    def close(self):
+        pass
+
 
 def wire_HTTPConnection_to_WSGI(host, app):
     """Monkeypatches HTTPConnection so that if you try to connect to host, you
@@ -686,12 +814,129 @@ class WsgiLimiterProxyTest(BaseLimitTestSuite):
         self.assertEqual(error, "403 Forbidden\n\nOnly 1 GET request(s) can be"
                                 " made to /delayed every minute.")
 
+    def test_admit(self):
+        self.assertEqual((7, None, None),
+                         self.proxy.admit("POST", "/anything", count=10))
+        admitted, delay, error = self.proxy.admit("POST", "/anything")
+        self.assertEqual(0, admitted)
+        self.assertAlmostEqual(float(delay), 60.0 / 7.0, 1)
+
     def tearDown(self):
         # restore original HTTPConnection object
         httplib.HTTPConnection = self.oldHTTPConnection
         super(WsgiLimiterProxyTest, self).tearDown()
 
 
+class ConnectionPoolTest(testtools.TestCase):
+    """
+    Tests for the `limits._ConnectionPool` class.
+    """
+
+    def setUp(self):
+        super(ConnectionPoolTest, self).setUp()
+        self.pool = limits._ConnectionPool("169.254.0.1:80", 1, 0.5)
+        self.conn = Mock()
+        self.conn.getresponse.return_value.will_close = False
+        self.conn.getresponse.return_value.read.return_value = 'body'
+
+    @patch.object(limits.httplib, 'HTTPConnection')
+    def test_connection_reused(self, connection):
+        connection.return_value = self.conn
+        self.pool.request("POST", "/")
+        resp, body = self.pool.request("POST", "/")
+        self.assertEqual('body', body)
+        self.assertEqual(1, connection.call_count)
+        self.assertEqual(2, self.conn.request.call_count)
+        connection.assert_called_once_with("169.254.0.1:80", timeout=0.5)
+
+    @patch.object(limits.httplib, 'HTTPConnection')
+    def test_closed_connection_replaced(self, connection):
+        connection.return_value = self.conn
+        self.pool.request("POST", "/")
+        resp = self.conn.getresponse.return_value
+        self.conn.getresponse.side_effect = [httplib.BadStatusLine(''), resp]
+        self.pool.request("POST", "/")
+        self.assertEqual(2, connection.call_count)
+        self.assertTrue(self.conn.close.called)
+
+    @patch.object(limits.httplib, 'HTTPConnection')
+    def test_new_connection_error_raised(self, connection):
+        connection.return_value = self.conn
+        self.conn.request.side_effect = socket.error()
+        self.assertRaises(socket.error, self.pool.request, "POST", "/")
+        self.assertEqual(1, connection.call_count)
+
+
+class SharedLimiterTest(BaseLimitTestSuite):
+    """
+    Tests for the `limits.SharedLimiter` class.
+    """
+
+    def setUp(self):
+        super(SharedLimiterTest, self).setUp()
+        self.app = limits.WsgiLimiter(TEST_LIMITS)
+        self.oldHTTPConnection = (
+            wire_HTTPConnection_to_WSGI("169.254.0.1:80", self.app))
+        self.limiter = limits.SharedLimiter(TEST_LIMITS,
+                                            limiter_address="169.254.0.1:80",
+                                            batch_size=4, lease_time=1.0)
+        self.admit = Mock(wraps=self.limiter._proxy.admit)
+        self.limiter._proxy.admit = self.admit
+        when(self.limiter)._get_time().thenReturn(0.0)
+
+    def tearDown(self):
+        httplib.HTTPConnection = self.oldHTTPConnection
+        super(SharedLimiterTest, self).tearDown()
+
+    def _check(self, num, verb, url, username=None):
+        return [self.limiter.check_for_delay(verb, url, username)[0]
+                for x in xrange(num)]
+
+    def test_batches_admitted(self):
+        self.assertEqual([None] * 10, self._check(10, "PUT", "/anything"))
+        # Batches of 1, 2, 4 and 4 requests, of which 3 were admitted.
+        self.assertEqual(4, self.admit.call_count)
+        self.assertEqual(4, self.admit.call_args[0][3])
+
+    def test_denial_kept(self):
+        self._check(10, "PUT", "/anything")
+        delay = self.limiter.check_for_delay("PUT", "/anything")[0]
+        self.assertAlmostEqual(delay, 6, 1)
+        when(self.limiter)._get_time().thenReturn(0.5)
+        delay, error = self.limiter.check_for_delay("PUT", "/anything")
+        self.assertAlmostEqual(delay, 5.5, 1)
+        self.assertTrue("Only 10 PUT request(s)" in error)
+        self.assertEqual(5, self.admit.call_count)
+
+    def test_unused_lease_shrinks_batch(self):
+        self._check(4, "PUT", "/anything")
+        when(self.limiter)._get_time().thenReturn(2.0)
+        self._check(1, "PUT", "/anything")
+        self.assertEqual(2, self.admit.call_args[0][3])
+
+    def test_unlimited_request_not_sent(self):
+        self.assertEqual([None] * 5, self._check(5, "GET", "/anything"))
+        self.assertFalse(self.admit.called)
+
+    def test_users_limited_apart(self):
+        self._check(10, "PUT", "/anything", "user1")
+        self.assertEqual([None], self._check(1, "PUT", "/anything", "user2"))
+
+    def test_unreachable_limiter_admits(self):
+        self.limiter._proxy.admit = Mock(side_effect=socket.error())
+        self.assertEqual([None] * 2, self._check(2, "PUT", "/anything"))
+
+    @patch.object(limits.httplib, 'HTTPConnection')
+    def test_limiter_timeout_admits(self, connection):
+        limiter = limits.SharedLimiter(TEST_LIMITS,
+                                       limiter_address="169.254.0.2:80",
+                                       timeout=0.1)
+        connection.return_value.getresponse.side_effect = socket.timeout()
+        self.assertEqual((None, None),
+                         limiter.check_for_delay("PUT", "/anything"))
+        connection.assert_called_once_with("169.254.0.2:80", timeout=0.1)
+
+
 class LimitsViewTest(testtools.TestCase):
     def setUp(self):
         super(LimitsViewTest, self).setUp()
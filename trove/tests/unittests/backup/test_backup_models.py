@@ -78,6 +78,63 @@ class BackupCreateTest(testtools.TestCase):
         self.assertEqual(self.instance_id, db_record['instance_id'])
         self.assertEqual(models.BackupState.NEW, db_record['state'])
 
+    def _create_parent(self, instance_id, state=models.BackupState.COMPLETED,
+                       backup_type='InnoBackupEx'):
+        return models.DBBackup.create(tenant_id=self.context.tenant,
+                                      name=BACKUP_NAME_2,
+                                      state=state,
+                                      instance_id=instance_id,
+                                      deleted=False,
+                                      location=BACKUP_LOCATION,
+                                      checksum='md5',
+                                      backup_type=backup_type)
+
+    def _stub_instance(self):
+        instance = mock(instance_models.Instance)
+        when(instance_models.BuiltInstance).load(any(), any()).thenReturn(
+            instance)
+        when(instance).validate_can_perform_action().thenReturn(None)
+        when(models.Backup).verify_swift_auth_token(any()).thenReturn(
+            None)
+        when(api.API).create_backup(any()).thenReturn(None)
+
+    def test_create_incremental(self):
+        self._stub_instance()
+        parent = self._create_parent(self.instance_id)
+        bu = models.Backup.create(self.context, self.instance_id,
+                                  BACKUP_NAME, BACKUP_DESC,
+                                  parent_id=parent.id)
+        db_record = models.DBBackup.find_by(id=bu.id)
+        self.assertEqual(parent.id, db_record['parent_id'])
+        bu.delete()
+        parent.delete()
+
+    def test_create_incremental_parent_from_other_instance(self):
+        self._stub_instance()
+        parent = self._create_parent('other-instance')
+        self.assertRaises(exception.UnprocessableEntity, models.Backup.create,
+                          self.context, self.instance_id, BACKUP_NAME,
+                          BACKUP_DESC, parent_id=parent.id)
+        parent.delete()
+
+    def test_create_incremental_parent_not_completed(self):
+        self._stub_instance()
+        parent = self._create_parent(self.instance_id,
+                                     state=models.BackupState.BUILDING)
+        self.assertRaises(exception.UnprocessableEntity, models.Backup.create,
+                          self.context, self.instance_id, BACKUP_NAME,
+                          BACKUP_DESC, parent_id=parent.id)
+        parent.delete()
+
+    def test_create_incremental_parent_not_incremental(self):
+        self._stub_instance()
+        parent = self._create_parent(self.instance_id,
+                                     backup_type='MySQLDump')
+        self.assertRaises(exception.UnprocessableEntity, models.Backup.create,
+                          self.context, self.instance_id, BACKUP_NAME,
+                          BACKUP_DESC, parent_id=parent.id)
+        parent.delete()
+
     def test_create_instance_not_found(self):
         self.assertRaises(exception.NotFound, models.Backup.create,
                           self.context, self.instance_id,
@@ -126,6 +183,17 @@ class BackupDeleteTest(testtools.TestCase):
         self.assertRaises(exception.UnprocessableEntity,
                           models.Backup.delete, self.context, 'backup_id')
 
+    def test_delete_backup_child_is_running(self):
+        backup = mock()
+        backup.is_running = False
+        child = mock()
+        child.id = 'child_id'
+        child.is_running = True
+        when(models.Backup).get_by_id(any(), any()).thenReturn(backup)
+        when(models.Backup).children('backup_id').thenReturn([child])
+        self.assertRaises(exception.UnprocessableEntity,
+                          models.Backup.delete, self.context, 'backup_id')
+
     def test_delete_backup_swift_token_invalid(self):
         backup = mock()
         backup.is_running = False
@@ -227,6 +295,41 @@ class BackupORMTest(testtools.TestCase):
         self.assertEqual(BACKUP_FILENAME, self.backup.filename)
 
 
+class BackupChainTest(testtools.TestCase):
+    def setUp(self):
+        super(BackupChainTest, self).setUp()
+        util.init_db()
+        self.context, self.instance_id = _prep_conf(utils.utcnow())
+        self.backups = []
+        parent_id = None
+        for name in ('full', 'incremental', 'incremental-2'):
+            backup = models.DBBackup.create(tenant_id=self.context.tenant,
+                                            name=name,
+                                            state=models.BackupState.COMPLETED,
+                                            instance_id=self.instance_id,
+                                            parent_id=parent_id,
+                                            deleted=False)
+            self.backups.append(backup)
+            parent_id = backup.id
+
+    def tearDown(self):
+        super(BackupChainTest, self).tearDown()
+        for backup in self.backups:
+            backup.delete()
+
+    def test_children(self):
+        children = models.Backup.children(self.backups[0].id)
+        self.assertEqual([b.id for b in self.backups[1:]],
+                         [b.id for b in children])
+
+    def test_children_of_last(self):
+        self.assertEqual([], models.Backup.children(self.backups[-1].id))
+
+    def test_children_skip_deleted(self):
+        self.backups[1].delete()
+        self.assertEqual([], models.Backup.children(self.backups[0].id))
+
+
 class PaginationTests(testtools.TestCase):
 
     def setUp(self):
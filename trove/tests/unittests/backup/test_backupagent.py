@@ -61,6 +61,18 @@ class MockCheckProcessBackup(MockBackup):
         return False
 
 
+class MockIncrementalBackup(MockBackup):
+    """Remember the parent metadata the runner was created with."""
+
+    parent_metadata = None
+
+    def __init__(self, *args, **kwargs):
+        MockIncrementalBackup.parent_metadata = dict(
+            (key, kwargs.get(key))
+            for key in ('lsn', 'parent_location', 'parent_checksum'))
+        super(MockIncrementalBackup, self).__init__(*args, **kwargs)
+
+
 class MockLossyBackup(MockBackup):
     """Fake Incomplete writes to swift"""
 
@@ -106,6 +118,12 @@ class MockSwift(object):
     def load(self, context, storage_url, container, filename, backup_checksum):
         pass
 
+    def load_metadata(self, location, checksum):
+        return {}
+
+    def save_metadata(self, location, metadata=None):
+        pass
+
 
 class MockStorage(Storage):
 
@@ -115,6 +133,12 @@ class MockStorage(Storage):
     def load(self, context, location, is_zipped, backup_checksum):
         pass
 
+    def load_metadata(self, location, backup_checksum):
+        pass
+
+    def save_metadata(self, location, metadata=None):
+        pass
+
     def save(self, filename, stream):
         pass
 
@@ -123,7 +147,7 @@ class MockStorage(Storage):
 
 
 class MockRestoreRunner(RestoreRunner):
-    def __init__(self, restore_stream, restore_location):
+    def __init__(self, restore_stream, restore_location, **kwargs):
         pass
 
     def __enter__(self):
@@ -175,7 +199,7 @@ class BackupAgentTest(testtools.TestCase):
                               ' 2>/tmp/mysqldump.log'
                               ' | gzip |'
                               ' openssl enc -aes-256-cbc -salt '
-                              '-pass pass:default_aes_cbc_key')
+                              '-pass env:TROVE_BACKUP_KEY')
         self.assertEqual(mysql_dump.cmd, str_mysql_dump_cmd)
         self.assertIsNotNone(mysql_dump.manifest)
         self.assertEqual(mysql_dump.manifest, 'abc.gz.enc')
@@ -192,7 +216,7 @@ class BackupAgentTest(testtools.TestCase):
                               ' /var/lib/mysql 2>/tmp/innobackupex.log'
                               ' | gzip |'
                               ' openssl enc -aes-256-cbc -salt '
-                              '-pass pass:default_aes_cbc_key')
+                              '-pass env:TROVE_BACKUP_KEY')
         self.assertEqual(inno_backup_ex.cmd, str_innobackup_cmd)
         self.assertIsNotNone(inno_backup_ex.manifest)
         str_innobackup_manifest = 'innobackupex.xbstream.gz.enc'
@@ -254,6 +278,28 @@ class BackupAgentTest(testtools.TestCase):
                 backup_type=backup_info['type'],
                 state=BackupState.COMPLETED))
 
+    def test_execute_incremental_backup(self):
+        when(MockSwift).load_metadata('parent-location',
+                                      'parent-checksum').thenReturn(
+                                          {'lsn': '1234',
+                                           'parent_location': 'grandparent',
+                                           'parent_checksum': 'old'})
+        agent = backupagent.BackupAgent()
+        backup_info = {'id': '123',
+                       'location': 'fake-location',
+                       'type': 'InnoBackupEx',
+                       'checksum': 'fake-checksum',
+                       'parent': {'location': 'parent-location',
+                                  'checksum': 'parent-checksum'},
+                       }
+        agent.execute_backup(context=None, backup_info=backup_info,
+                             runner=MockBackup,
+                             incremental_runner=MockIncrementalBackup)
+        self.assertEqual({'lsn': '1234',
+                          'parent_location': 'parent-location',
+                          'parent_checksum': 'parent-checksum'},
+                         MockIncrementalBackup.parent_metadata)
+
     def test_execute_bad_process_backup(self):
         agent = backupagent.BackupAgent()
         backup_info = {'id': '123',
@@ -13,8 +13,15 @@
 #limitations under the License.
 
 import testtools
-from mockito import when, unstub, mock, any
+from mock import patch
+from mockito import when, unstub, mock, any, verify
+from oslo.config.cfg import ConfigOpts
 import hashlib
+import os
+import shutil
+import StringIO
+import tempfile
+from swiftclient import ClientException
 
 from trove.common.context import TroveContext
 from trove.tests.fakes.swift import FakeSwiftConnection
@@ -139,6 +146,109 @@ class SwiftStorageSaveChecksumTests(testtools.TestCase):
                          "Incorrect swift location was returned.")
 
 
+class SwiftStorageParallelSaveTests(testtools.TestCase):
+    """SwiftStorage.save can upload several segments at the same time"""
+
+    def setUp(self):
+        super(SwiftStorageParallelSaveTests, self).setUp()
+        self.context = TroveContext()
+        self.swift_client = FakeSwiftConnectionWithRealEtag()
+        when(swift).create_swift_client(self.context).thenReturn(
+            self.swift_client)
+        self.staging_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.staging_dir)
+        when(ConfigOpts)._get('backup_upload_concurrency').thenReturn(3)
+        when(ConfigOpts)._get('backup_upload_buffer_size').thenReturn(1024)
+        when(ConfigOpts)._get('backup_staging_dir').thenReturn(
+            self.staging_dir)
+        self.data = ''.join(chr(i % 256) for i in range(300000))
+
+    def tearDown(self):
+        super(SwiftStorageParallelSaveTests, self).tearDown()
+        unstub()
+
+    def _stream_reader(self, filename='123.gz.enc'):
+        # Segments of two chunks, so the data is split into three segments.
+        return StreamReader(StringIO.StringIO(self.data), filename,
+                            max_file_size=2 * swift.CHUNK_SIZE)
+
+    def test_parallel_upload_matches_serial_upload(self):
+        storage_strategy = SwiftStorage(self.context)
+        checksums = storage_strategy._upload_segments_parallel(
+            self._stream_reader())
+        serial_checksums = storage_strategy._upload_segments(
+            self._stream_reader())
+        self.assertTrue(len(checksums) > 1)
+        self.assertEqual(serial_checksums, checksums)
+        self.assertEqual(self.data, ''.join(
+            self.swift_client.container_objects[name] for name in
+            sorted(self.swift_client.container_objects)))
+
+    def test_parallel_upload_spills_to_staging_dir(self):
+        spilled = []
+        spooled_file = swift.tempfile.SpooledTemporaryFile
+
+        def spooled_temporary_file(**kwargs):
+            spilled.append(kwargs['dir'])
+            return spooled_file(**kwargs)
+
+        storage_strategy = SwiftStorage(self.context)
+        with patch.object(swift.tempfile, 'SpooledTemporaryFile',
+                          spooled_temporary_file):
+            storage_strategy._upload_segments_parallel(self._stream_reader())
+        self.assertEqual(3, len(spilled))
+        self.assertEqual(set([self.staging_dir]), set(spilled))
+        self.assertEqual([], os.listdir(self.staging_dir))
+
+    def test_save_without_staging_dir_uploads_serially(self):
+        when(ConfigOpts)._get('backup_staging_dir').thenReturn(None)
+        storage_strategy = SwiftStorage(self.context)
+        with patch.object(storage_strategy, '_upload_segments_parallel') \
+                as upload_segments_parallel:
+            with MockBackupRunner(filename='123',
+                                  user='user',
+                                  password='password') as runner:
+                success = storage_strategy.save(runner.manifest, runner)[0]
+        self.assertTrue(success, "The backup should have been successful.")
+        self.assertFalse(upload_segments_parallel.called)
+
+    def test_parallel_upload_etag_mismatch(self):
+        storage_strategy = SwiftStorage(self.context)
+        checksums = storage_strategy._upload_segments_parallel(
+            self._stream_reader('bad_segment_etag_123.gz.enc'))
+        self.assertIsNone(checksums)
+
+    def test_parallel_upload_waits_after_failure(self):
+        storage_strategy = SwiftStorage(self.context)
+        uploaded = []
+        put_object = self.swift_client.put_object
+
+        def failing_put_object(container, name, contents, **kwargs):
+            if name.endswith('00000000'):
+                raise ClientException('segment upload failed')
+            etag = put_object(container, name, contents, **kwargs)
+            uploaded.append(name)
+            return etag
+
+        self.swift_client.put_object = failing_put_object
+        self.assertRaises(ClientException,
+                          storage_strategy._upload_segments_parallel,
+                          self._stream_reader())
+        self.assertEqual(2, len(uploaded))
+
+    def test_parallel_save(self):
+        storage_strategy = SwiftStorage(self.context)
+        with MockBackupRunner(filename='123',
+                              user='user',
+                              password='password') as runner:
+            (success,
+             note,
+             checksum,
+             location) = storage_strategy.save(runner.manifest, runner)
+        self.assertTrue(success, "The backup should have been successful.")
+        self.assertIsNotNone(checksum)
+
+
 class SwiftStorageLoad(testtools.TestCase):
     """SwiftStorage.load is used to return SwiftDownloadStream which is used
         to download a backup object from Swift
@@ -219,6 +329,163 @@ class SwiftStorageLoad(testtools.TestCase):
                           "to run.")
 
 
+class FakeSegmentedSwiftConnection(object):
+    """Fake swift client serving a backup split into segments"""
+
+    def __init__(self, segments, manifest_etag=None):
+        self.segments = segments
+        checksum = hashlib.md5()
+        for name in sorted(segments):
+            checksum.update(hashlib.md5(segments[name]).hexdigest())
+        self.manifest_etag = manifest_etag or checksum.hexdigest()
+
+    def head_object(self, container, name):
+        return {'etag': '"%s"' % self.manifest_etag,
+                'x-object-manifest': 'database_backups/123_'}
+
+    def get_container(self, container, prefix=None, full_listing=False):
+        return {}, [{'name': name, 'hash': hashlib.md5(data).hexdigest()}
+                    for name, data in self.segments.items()]
+
+    def get_object(self, container, name, resp_chunk_size=None):
+        data = self.segments[name]
+        return {}, (data[i:i + 10] for i in range(0, len(data), 10))
+
+
+class SwiftParallelDownloadTests(testtools.TestCase):
+    """SwiftStorage.load can download the segments of a backup in parallel"""
+
+    def setUp(self):
+        super(SwiftParallelDownloadTests, self).setUp()
+        self.context = TroveContext()
+        self.segments = {'123_00000000': 'a' * 25,
+                         '123_00000001': 'b' * 25,
+                         '123_00000002': 'c' * 7}
+        self.staging_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.staging_dir)
+        when(ConfigOpts)._get('backup_download_concurrency').thenReturn(2)
+        when(ConfigOpts)._get('backup_download_buffer_size').thenReturn(16)
+        when(ConfigOpts)._get('backup_staging_dir').thenReturn(
+            self.staging_dir)
+
+    def tearDown(self):
+        super(SwiftParallelDownloadTests, self).tearDown()
+        unstub()
+
+    def _load(self, swift_client, backup_checksum):
+        when(swift).create_swift_client(self.context).thenReturn(swift_client)
+        storage_strategy = SwiftStorage(self.context)
+        return storage_strategy.load(self.context,
+                                     "http://mockswift/v1/database_backups/"
+                                     "123.xbstream.gz.enc",
+                                     False, backup_checksum)
+
+    def _read_all(self, download_stream):
+        data = []
+        with download_stream as stream:
+            chunk = stream.read(8)
+            while chunk:
+                data.append(chunk)
+                chunk = stream.read(8)
+        return ''.join(data)
+
+    def test_segments_are_read_in_order(self):
+        swift_client = FakeSegmentedSwiftConnection(self.segments)
+        download_stream = self._load(swift_client, swift_client.manifest_etag)
+        self.assertIsInstance(download_stream,
+                              swift.SwiftParallelDownloadStream)
+        self.assertEqual('a' * 25 + 'b' * 25 + 'c' * 7,
+                         self._read_all(download_stream))
+
+    def test_segments_spill_to_staging_dir(self):
+        spilled = []
+        spooled_file = swift.tempfile.SpooledTemporaryFile
+
+        def spooled_temporary_file(**kwargs):
+            spilled.append(kwargs['dir'])
+            return spooled_file(**kwargs)
+
+        swift_client = FakeSegmentedSwiftConnection(self.segments)
+        download_stream = self._load(swift_client, swift_client.manifest_etag)
+        with patch.object(swift.tempfile, 'SpooledTemporaryFile',
+                          spooled_temporary_file):
+            self._read_all(download_stream)
+        self.assertEqual([self.staging_dir] * 3, spilled)
+
+    def test_load_without_staging_dir_streams(self):
+        when(ConfigOpts)._get('backup_staging_dir').thenReturn(None)
+        swift_client = FakeSegmentedSwiftConnection(self.segments)
+        download_stream = self._load(swift_client, swift_client.manifest_etag)
+        self.assertIsInstance(download_stream, swift.SwiftDownloadStream)
+
+    def test_backup_checksum_mismatch(self):
+        swift_client = FakeSegmentedSwiftConnection(self.segments)
+        download_stream = self._load(swift_client, 'not_the_checksum')
+        self.assertRaises(SwiftDownloadIntegrityError,
+                          self._read_all, download_stream)
+
+    def test_segment_checksum_mismatch(self):
+        swift_client = FakeSegmentedSwiftConnection(self.segments)
+        swift_client.get_container = lambda *args, **kwargs: (
+            {}, [{'name': '123_00000000', 'hash': 'bad_hash'}])
+        download_stream = self._load(swift_client, swift_client.manifest_etag)
+        self.assertRaises(SwiftDownloadIntegrityError,
+                          self._read_all, download_stream)
+
+
+class SwiftMetadataTests(testtools.TestCase):
+    """SwiftStorage keeps backup metadata in swift object headers"""
+
+    LOCATION = "http://mockswift/v1/database_backups/123.xbstream.gz"
+
+    def setUp(self):
+        super(SwiftMetadataTests, self).setUp()
+        self.context = TroveContext()
+        self.swift_client = mock()
+        when(swift).create_swift_client(self.context).thenReturn(
+            self.swift_client)
+        self.storage = SwiftStorage(self.context)
+
+    def tearDown(self):
+        super(SwiftMetadataTests, self).tearDown()
+        unstub()
+
+    def test_load_metadata(self):
+        when(self.swift_client).head_object(
+            'database_backups', '123.xbstream.gz').thenReturn(
+                {'etag': '"md5"',
+                 'x-object-manifest': 'database_backups/123_',
+                 'x-object-meta-lsn': '1234',
+                 'x-object-meta-parent-location': 'parent'})
+        self.assertEqual({'lsn': '1234', 'parent_location': 'parent'},
+                         self.storage.load_metadata(self.LOCATION, 'md5'))
+
+    def test_load_metadata_checksum_mismatch(self):
+        when(self.swift_client).head_object(any(), any()).thenReturn(
+            {'etag': '"md5"'})
+        self.assertRaises(SwiftDownloadIntegrityError,
+                          self.storage.load_metadata, self.LOCATION,
+                          'other-md5')
+
+    def test_save_metadata_keeps_manifest(self):
+        when(self.swift_client).head_object(any(), any()).thenReturn(
+            {'x-object-manifest': 'database_backups/123_'})
+        when(self.swift_client).post_object(
+            'database_backups', '123.xbstream.gz',
+            headers={'X-Object-Manifest': 'database_backups/123_',
+                     'X-Object-Meta-lsn': '1234',
+                     'X-Object-Meta-parent-location': 'parent'}).thenReturn(
+                         None)
+        self.storage.save_metadata(self.LOCATION,
+                                   {'lsn': '1234',
+                                    'parent_location': 'parent'})
+        verify(self.swift_client).post_object(
+            'database_backups', '123.xbstream.gz',
+            headers={'X-Object-Manifest': 'database_backups/123_',
+                     'X-Object-Meta-lsn': '1234',
+                     'X-Object-Meta-parent-location': 'parent'})
+
+
 class MockBackupStream(MockBackupRunner):
 
     def read(self, chunk_size):
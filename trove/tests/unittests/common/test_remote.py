@@ -230,3 +230,32 @@ class TestRemote(testtools.TestCase):
         self.assertThat(obj_resp[1], Is('updated-object-contents'))
         # ensure object count has not increased
         self.assertThat(len(conn.get_container('new-container')[1]), Is(1))
+
+
+class CachedClientTest(testtools.TestCase):
+    def setUp(self):
+        super(CachedClientTest, self).setUp()
+        remote.clear_client_cache()
+        self.create_client = remote.cached_client('test', lambda ctx: object())
+        self.context = TroveContext(tenant='123', auth_token='token')
+
+    def tearDown(self):
+        super(CachedClientTest, self).tearDown()
+        remote.clear_client_cache()
+
+    def test_client_is_reused_for_token(self):
+        self.assertIs(self.create_client(self.context),
+                      self.create_client(TroveContext(tenant='123',
+                                                      auth_token='token')))
+
+    def test_new_token_gets_new_client(self):
+        self.assertIsNot(self.create_client(self.context),
+                         self.create_client(TroveContext(tenant='123',
+                                                         auth_token='new')))
+
+    def test_no_context_is_not_cached(self):
+        self.assertIsNot(self.create_client(None), self.create_client(None))
+
+    def test_swift_client_is_not_cached(self):
+        self.assertIsNot(remote.create_swift_client(self.context),
+                         remote.create_swift_client(self.context))
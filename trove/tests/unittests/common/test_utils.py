@@ -0,0 +1,122 @@
+#    Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import time
+
+from mock import Mock
+from mock import patch
+from mockito import when, unstub
+from testtools import TestCase
+from testtools.matchers import Equals, Is
+
+from trove.common import exception
+from trove.common import utils
+
+
+class TTLCacheTest(TestCase):
+
+    def tearDown(self):
+        super(TTLCacheTest, self).tearDown()
+        unstub()
+
+    def test_get_counts_hits_and_misses(self):
+        cache = utils.TTLCache(60)
+        self.assertThat(cache.get('key'), Is(None))
+        cache.set('key', 'value')
+        self.assertThat(cache.get('key'), Equals('value'))
+        self.assertThat(cache.stats(),
+                        Equals({'hits': 1, 'misses': 1, 'size': 1}))
+
+    def test_entries_expire(self):
+        cache = utils.TTLCache(60)
+        when(time).time().thenReturn(100)
+        cache.set('key', 'value')
+        when(time).time().thenReturn(161)
+        self.assertThat(cache.get('key', 'default'), Equals('default'))
+        self.assertThat(len(cache), Equals(0))
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = utils.TTLCache(0)
+        cache.set('key', 'value')
+        self.assertThat(cache.get('key'), Is(None))
+
+    def test_max_size_evicts_oldest(self):
+        cache = utils.TTLCache(60, max_size=2)
+        when(time).time().thenReturn(100)
+        cache.set('a', 1)
+        when(time).time().thenReturn(101)
+        cache.set('b', 2)
+        cache.set('c', 3)
+        self.assertThat(cache.get('a'), Is(None))
+        self.assertThat(cache.get('b'), Equals(2))
+        self.assertThat(cache.get('c'), Equals(3))
+
+    def test_invalidate(self):
+        cache = utils.TTLCache(60)
+        cache.set('key', 'value')
+        cache.invalidate('key')
+        self.assertThat(cache.get('key'), Is(None))
+
+
+class BackoffTest(TestCase):
+
+    def test_intervals_grow_to_maximum(self):
+        intervals = utils.Backoff(1, maximum=5, multiplier=2)
+        self.assertThat([intervals.next() for i in range(5)],
+                        Equals([1, 2, 4, 5, 5]))
+
+    def test_jitter_spreads_intervals(self):
+        intervals = utils.Backoff(10, jitter=0.5)
+        for i in range(20):
+            interval = intervals.next()
+            self.assertTrue(5 <= interval <= 15)
+
+
+class PollUntilTest(TestCase):
+
+    def setUp(self):
+        super(PollUntilTest, self).setUp()
+        utils.POLL_STATS.pop('test_poll', None)
+
+    def tearDown(self):
+        super(PollUntilTest, self).tearDown()
+        unstub()
+
+    @patch.object(utils.greenthread, 'sleep')
+    def test_poll_backs_off(self, sleep):
+        retriever = Mock(side_effect=[False, False, False, True])
+        self.assertTrue(utils.poll_until(retriever, sleep_time=1,
+                                         max_sleep_time=3, backoff=2,
+                                         jitter=0, name='test_poll'))
+        self.assertThat([call[0][0] for call in sleep.call_args_list],
+                        Equals([1, 2, 3]))
+        self.assertThat(utils.POLL_STATS['test_poll']['last'], Equals(4))
+
+    @patch.object(utils.greenthread, 'sleep')
+    def test_poll_budget(self, sleep):
+        retriever = Mock(return_value=False)
+        self.assertRaises(exception.PollTimeOut, utils.poll_until,
+                          retriever, max_polls=3, name='test_poll')
+        self.assertThat(retriever.call_count, Equals(3))
+        self.assertThat(utils.POLL_STATS['test_poll'],
+                        Equals({'count': 1, 'polls': 3, 'last': 3,
+                                'max': 3}))
+
+    @patch.object(utils.greenthread, 'sleep')
+    def test_poll_time_out(self, sleep):
+        when(time).time().thenReturn(100).thenReturn(100).thenReturn(111)
+        retriever = Mock(return_value=False)
+        self.assertRaises(exception.PollTimeOut, utils.poll_until,
+                          retriever, sleep_time=5, time_out=10, jitter=0,
+                          name='test_poll')
+        self.assertThat(retriever.call_count, Equals(2))
@@ -14,11 +14,16 @@
 #    under the License.
 #
 import trove.common.wsgi as wsgi
+import jsonschema
 import webob
 
 import testtools
+from mock import patch
 from testtools.matchers import Equals, Is, Not
 
+from trove.common import apischema
+from trove.common import exception
+
 
 class TestWsgi(testtools.TestCase):
     def test_process_request(self):
@@ -39,3 +44,44 @@ class TestWsgi(testtools.TestCase):
         self.assertThat(ctx, Not(Is(None)))
         self.assertThat(ctx.user, Equals(user_id))
         self.assertThat(ctx.auth_token, Equals(token))
+
+
+class SchemaController(wsgi.Controller):
+    schemas = apischema.dbschema
+
+
+class TestValidatorRegistry(testtools.TestCase):
+
+    def setUp(self):
+        super(TestValidatorRegistry, self).setUp()
+        self.registry = wsgi.ValidatorRegistry()
+
+    def test_validator_built_once(self):
+        schema = apischema.dbschema['create']
+        validator = self.registry.get(schema)
+        self.assertThat(self.registry.get(schema), Is(validator))
+        self.assertThat(self.registry.get(dict(schema)), Not(Is(validator)))
+
+    @patch.object(wsgi.jsonschema, 'Draft4Validator',
+                  wraps=jsonschema.Draft4Validator)
+    def test_compile_nested_schemas(self, validator_class):
+        self.registry.compile(apischema.instance)
+        count = validator_class.call_count
+        self.registry.get(apischema.instance['create'])
+        self.registry.get(apischema.instance['action']['restart'])
+        self.registry.get(apischema.instance['action']['resize']['volume'])
+        self.assertThat(validator_class.call_count, Equals(count))
+
+    def test_validate(self):
+        schema = apischema.dbschema['create']
+        body = {'databases': [{'name': 'db1'}]}
+        self.assertThat(self.registry.validate(schema, body), Equals([]))
+        errors = self.registry.validate(schema, {'databases': [{}]})
+        self.assertThat(len(errors), Equals(1))
+
+    def test_validate_request(self):
+        controller = SchemaController()
+        controller.validate_request('create', {'body': {
+            'databases': [{'name': 'db1'}]}})
+        self.assertRaises(exception.BadRequest, controller.validate_request,
+                          'create', {'body': {'databases': [{}]}})
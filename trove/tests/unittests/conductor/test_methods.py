@@ -13,6 +13,7 @@
 #    under the License.
 
 import testtools
+from mock import Mock
 from mockito import unstub
 from trove.backup import models as bkup_models
 from trove.common import exception as t_exception
@@ -41,6 +42,7 @@ class ConductorMethodTests(testtools.TestCase):
         super(ConductorMethodTests, self).setUp()
         util.init_db()
         self.cond_mgr = conductor_manager.Manager()
+        self.cond_mgr._notify_status_changed = Mock()
         self.instance_id = generate_uuid()
 
     def tearDown(self):
@@ -110,6 +112,70 @@ class ConductorMethodTests(testtools.TestCase):
         self.cond_mgr.heartbeat(None, self.instance_id, payload)
         iss = self._get_iss(iss_id)
         self.assertEqual(t_instance.ServiceStatuses.BUILDING, iss.status)
+        self.cond_mgr._notify_status_changed.assert_called_once_with(
+            [self.instance_id])
+
+    def test_heartbeat_stores_volume_used(self):
+        iss_id = self._create_iss()
+        self.cond_mgr.heartbeat(None, self.instance_id, {'volume_used': 1.5})
+        iss = self._get_iss(iss_id)
+        self.assertEqual(1.5, iss.volume_used)
+        self.assertIsNotNone(iss.volume_used_updated)
+
+    def test_heartbeat_unchanged_status_not_notified(self):
+        self._create_iss()
+        payload = {'service_status': 'new'}
+        self.cond_mgr.heartbeat(None, self.instance_id, payload)
+        self.assertFalse(self.cond_mgr._notify_status_changed.called)
+
+    # --- Tests for buffered heartbeats ---
+
+    def test_buffered_heartbeat_written_on_flush(self):
+        iss_id = self._create_iss()
+        self.cond_mgr.heartbeats = conductor_manager.HeartbeatBuffer()
+        payload = {'service_status': 'building'}
+        self.cond_mgr.heartbeat(None, self.instance_id, payload)
+        self.assertEqual(t_instance.ServiceStatuses.NEW,
+                         self._get_iss(iss_id).status)
+        self.cond_mgr._flush_heartbeats()
+        self.assertEqual(t_instance.ServiceStatuses.BUILDING,
+                         self._get_iss(iss_id).status)
+        self.assertEqual(0, len(self.cond_mgr.heartbeats))
+        self.cond_mgr._notify_status_changed.assert_called_once_with(
+            [self.instance_id])
+
+    def test_buffered_heartbeats_are_coalesced(self):
+        iss_id = self._create_iss()
+        self.cond_mgr.heartbeats = conductor_manager.HeartbeatBuffer()
+        self.cond_mgr.heartbeat(None, self.instance_id,
+                                {'service_status': 'building'})
+        self.cond_mgr.heartbeat(None, self.instance_id,
+                                {'service_status': 'running'})
+        self.cond_mgr.heartbeat(None, self.instance_id, {})
+        self.assertEqual(1, len(self.cond_mgr.heartbeats))
+        self.cond_mgr.heartbeats.flush()
+        self.assertEqual(t_instance.ServiceStatuses.RUNNING,
+                         self._get_iss(iss_id).status)
+
+    def test_buffered_volume_used_written_on_flush(self):
+        iss_id = self._create_iss()
+        self.cond_mgr.heartbeats = conductor_manager.HeartbeatBuffer()
+        self.cond_mgr.heartbeat(None, self.instance_id,
+                                {'service_status': 'building',
+                                 'volume_used': 0.5})
+        self.cond_mgr.heartbeat(None, self.instance_id, {'volume_used': 0.75})
+        self.cond_mgr.heartbeats.flush()
+        iss = self._get_iss(iss_id)
+        self.assertEqual(t_instance.ServiceStatuses.BUILDING, iss.status)
+        self.assertEqual(0.75, iss.volume_used)
+        self.assertIsNotNone(iss.volume_used_updated)
+
+    def test_buffered_heartbeat_instance_not_found(self):
+        self.cond_mgr.heartbeats = conductor_manager.HeartbeatBuffer()
+        self.cond_mgr.heartbeat(None, generate_uuid(),
+                                {'service_status': 'building'})
+        self.cond_mgr.heartbeats.flush()
+        self.assertEqual(0, len(self.cond_mgr.heartbeats))
 
     # --- Tests for update_backup ---
 
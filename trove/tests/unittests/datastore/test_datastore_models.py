@@ -0,0 +1,69 @@
+#    Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from mockito import mock, when, unstub, verify
+from testtools import TestCase
+from testtools.matchers import Equals, Is
+
+from trove.common import exception
+from trove.datastore import models
+
+
+class DatastoreCacheTest(TestCase):
+
+    def setUp(self):
+        super(DatastoreCacheTest, self).setUp()
+        models.invalidate_cache()
+        self.db_info = mock()
+        self.db_info.id = 'ds_id'
+        self.db_info.name = 'mysql'
+
+    def tearDown(self):
+        super(DatastoreCacheTest, self).tearDown()
+        models.invalidate_cache()
+        unstub()
+
+    def test_load_by_id_is_cached(self):
+        when(models.DBDatastore).find_by(id='ds_id').thenReturn(self.db_info)
+        models.Datastore.load('ds_id')
+        datastore = models.Datastore.load('ds_id')
+        self.assertThat(datastore.db_info, Is(self.db_info))
+        verify(models.DBDatastore, times=1).find_by(id='ds_id')
+        self.assertThat(models.get_cache_stats()['datastore']['hits'],
+                        Equals(1))
+
+    def test_load_by_name_is_cached_under_id_and_name(self):
+        when(models.DBDatastore).find_by(id='mysql').thenRaise(
+            exception.ModelNotFoundError())
+        when(models.DBDatastore).find_by(name='mysql').thenReturn(
+            self.db_info)
+        models.Datastore.load('mysql')
+        models.Datastore.load('mysql')
+        models.Datastore.load('ds_id')
+        verify(models.DBDatastore, times=1).find_by(name='mysql')
+
+    def test_load_not_found(self):
+        when(models.DBDatastore).find_by(id='nope').thenRaise(
+            exception.ModelNotFoundError())
+        when(models.DBDatastore).find_by(name='nope').thenRaise(
+            exception.ModelNotFoundError())
+        self.assertRaises(exception.DatastoreNotFound,
+                          models.Datastore.load, 'nope')
+
+    def test_invalidate_cache(self):
+        when(models.DBDatastoreVersion).find_by(id='v_id').thenReturn(
+            self.db_info)
+        models.DatastoreVersion.load('v_id')
+        models.invalidate_cache()
+        models.DatastoreVersion.load('v_id')
+        verify(models.DBDatastoreVersion, times=2).find_by(id='v_id')
@@ -0,0 +1,115 @@
+#    Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import time
+
+from mock import Mock
+from mock import patch
+from mockito import when, unstub
+from novaclient import exceptions as nova_exceptions
+from testtools import TestCase
+from testtools.matchers import Equals, Is
+
+from trove.flavor import models
+
+
+class FakeFlavor(object):
+
+    def __init__(self, id, is_public=True):
+        self.id = id
+        self.is_public = is_public
+
+
+class FlavorCatalogTest(TestCase):
+
+    def setUp(self):
+        super(FlavorCatalogTest, self).setUp()
+        self.catalog = models.FlavorCatalog(60, 600)
+        self.context = Mock()
+        self.context.tenant = 'tenant_1'
+        self.client = Mock()
+        self.client.flavors.get.side_effect = FakeFlavor
+        self.client.flavors.list.return_value = [FakeFlavor('1'),
+                                                 FakeFlavor('2')]
+
+    def tearDown(self):
+        super(FlavorCatalogTest, self).tearDown()
+        unstub()
+
+    def test_get_is_cached(self):
+        flavor = self.catalog.get(self.context, '1', client=self.client)
+        self.assertThat(self.catalog.get(self.context, '1',
+                                         client=self.client), Is(flavor))
+        self.assertThat(self.client.flavors.get.call_count, Equals(1))
+        self.assertThat(self.catalog.stats(),
+                        Equals({'hits': 1, 'stale_hits': 0, 'misses': 1,
+                                'size': 1}))
+
+    def test_list_fills_flavors(self):
+        flavors = self.catalog.list(self.context, client=self.client)
+        self.assertThat(self.catalog.list(self.context, client=self.client),
+                        Is(flavors))
+        self.catalog.get(self.context, '2', client=self.client)
+        self.assertThat(self.client.flavors.list.call_count, Equals(1))
+        self.assertFalse(self.client.flavors.get.called)
+
+    def test_private_flavor_not_shared(self):
+        self.client.flavors.get.side_effect = None
+        self.client.flavors.get.return_value = FakeFlavor('1', False)
+        self.catalog.get(self.context, '1', client=self.client)
+        other = Mock()
+        other.tenant = 'tenant_2'
+        self.catalog.get(other, '1', client=self.client)
+        self.assertThat(self.client.flavors.get.call_count, Equals(2))
+        self.catalog.get(other, '1', client=self.client, check_access=False)
+        self.assertThat(self.client.flavors.get.call_count, Equals(2))
+
+    @patch.object(models.greenthread, 'spawn_n')
+    def test_stale_flavor_served_while_refreshed(self, spawn_n):
+        when(time).time().thenReturn(100)
+        flavor = self.catalog.get(self.context, '1', client=self.client)
+        when(time).time().thenReturn(200)
+        self.assertThat(self.catalog.get(self.context, '1',
+                                         client=self.client), Is(flavor))
+        self.assertThat(spawn_n.call_count, Equals(1))
+        # The refresh runs once, however many requests see the stale entry.
+        self.catalog.get(self.context, '1', client=self.client)
+        self.assertThat(spawn_n.call_count, Equals(1))
+        refresh, key, fetch = spawn_n.call_args[0]
+        refresh(key, fetch)
+        self.assertThat(self.catalog.stats()['stale_hits'], Equals(2))
+        self.assertThat(self.client.flavors.get.call_count, Equals(2))
+
+    def test_expired_flavor_is_fetched(self):
+        when(time).time().thenReturn(100)
+        self.catalog.get(self.context, '1', client=self.client)
+        when(time).time().thenReturn(761)
+        self.catalog.get(self.context, '1', client=self.client)
+        self.assertThat(self.client.flavors.get.call_count, Equals(2))
+
+    @patch.object(models.greenthread, 'spawn_n')
+    def test_deleted_flavor_dropped_on_refresh(self, spawn_n):
+        when(time).time().thenReturn(100)
+        self.catalog.get(self.context, '1', client=self.client)
+        when(time).time().thenReturn(200)
+        self.catalog.get(self.context, '1', client=self.client)
+        self.client.flavors.get.side_effect = nova_exceptions.NotFound(404)
+        refresh, key, fetch = spawn_n.call_args[0]
+        refresh(key, fetch)
+        self.assertThat(len(self.catalog._entries), Equals(0))
+
+    def test_disabled_catalog(self):
+        catalog = models.FlavorCatalog(0, 0)
+        catalog.get(self.context, '1', client=self.client)
+        catalog.get(self.context, '1', client=self.client)
+        self.assertThat(self.client.flavors.get.call_count, Equals(2))
@@ -15,7 +15,12 @@
 import trove.guestagent.strategies.backup.base as backupBase
 import trove.guestagent.strategies.restore.base as restoreBase
 import testtools
+from mock import Mock
+from mockito import when, unstub, any, verify, never
 from trove.common import utils
+from trove.guestagent.datastore.mysql import service as dbaas
+from trove.guestagent.strategies import codec
+from trove.guestagent.strategies.backup import mysql_impl
 
 BACKUP_XTRA_CLS = ("trove.guestagent.strategies.backup."
                    "mysql_impl.InnoBackupEx")
@@ -25,21 +30,45 @@ BACKUP_SQLDUMP_CLS = ("trove.guestagent.strategies.backup."
                       "mysql_impl.MySQLDump")
 RESTORE_SQLDUMP_CLS = ("trove.guestagent.strategies.restore."
                        "mysql_impl.MySQLDump")
+BACKUP_MYDUMPER_CLS = ("trove.guestagent.strategies.backup."
+                       "mysql_impl.MyDumper")
+RESTORE_MYDUMPER_CLS = ("trove.guestagent.strategies.restore."
+                        "mysql_impl.MyDumper")
+BACKUP_XTRA_INCR_CLS = ("trove.guestagent.strategies.backup."
+                        "mysql_impl.InnoBackupExIncremental")
+RESTORE_XTRA_INCR_CLS = ("trove.guestagent.strategies.restore."
+                         "mysql_impl.InnoBackupExIncremental")
 PIPE = " | "
 ZIP = "gzip"
 UNZIP = "gzip -d -c"
-ENCRYPT = "openssl enc -aes-256-cbc -salt -pass pass:default_aes_cbc_key"
-DECRYPT = "openssl enc -d -aes-256-cbc -salt -pass pass:default_aes_cbc_key"
+ENCRYPT = "openssl enc -aes-256-cbc -salt -pass env:TROVE_BACKUP_KEY"
+DECRYPT = "openssl enc -d -aes-256-cbc -salt -pass env:TROVE_BACKUP_KEY"
 XTRA_BACKUP_RAW = ("sudo innobackupex --stream=xbstream %(extra_opts)s"
                    " /var/lib/mysql 2>/tmp/innobackupex.log")
 XTRA_BACKUP = XTRA_BACKUP_RAW % {'extra_opts': ''}
 XTRA_BACKUP_EXTRA_OPTS = XTRA_BACKUP_RAW % {'extra_opts': '--no-lock'}
+XTRA_BACKUP_INCR = ("sudo innobackupex --stream=xbstream --incremental"
+                    " --incremental-lsn=1234  /var/lib/mysql"
+                    " 2>/tmp/innobackupex.log")
 SQLDUMP_BACKUP_RAW = ("mysqldump --all-databases %(extra_opts)s "
                       "--opt --password=password -u user"
                       " 2>/tmp/mysqldump.log")
 SQLDUMP_BACKUP = SQLDUMP_BACKUP_RAW % {'extra_opts': ''}
 SQLDUMP_BACKUP_EXTRA_OPTS = (SQLDUMP_BACKUP_RAW %
                              {'extra_opts': '--events --routines --triggers'})
+STAGING_DIR = "/var/lib/trove-staging"
+MYDUMPER_DIR = STAGING_DIR + "/mydumper-12345"
+MYDUMPER_BACKUP = ("(mkdir -p %(dir)s && mydumper --threads=4"
+                   " --rows=500000 --compress  --password=password -u user"
+                   " --outputdir=%(dir)s 2>/tmp/mydumper.log &&"
+                   " tar -C %(dir)s -cf - .;"
+                   " rm -rf %(dir)s)" % {'dir': MYDUMPER_DIR})
+MYLOADER_DIR = STAGING_DIR + "/myloader"
+MYDUMPER_RESTORE = ("(sudo mkdir -p %(dir)s &&"
+                    " sudo tar -x -C %(dir)s &&"
+                    " sudo myloader -u root --threads=4 --overwrite-tables"
+                    " --directory=%(dir)s; sudo rm -rf %(dir)s)" %
+                    {'dir': MYLOADER_DIR})
 XTRA_RESTORE = "sudo xbstream -x -C /var/lib/mysql"
 SQLDUMP_RESTORE = "sudo mysql"
 PREPARE = ("sudo innobackupex --apply-log /var/lib/mysql "
@@ -49,6 +78,12 @@ CRYPTO_KEY = "default_aes_cbc_key"
 
 
 class GuestAgentBackupTest(testtools.TestCase):
+
+    def tearDown(self):
+        super(GuestAgentBackupTest, self).tearDown()
+        backupBase.BackupRunner.compression = 'gzip'
+        unstub()
+
     def test_backup_decrypted_xtrabackup_command(self):
         backupBase.BackupRunner.is_zipped = True
         backupBase.BackupRunner.is_encrypted = False
@@ -143,3 +178,144 @@ class GuestAgentBackupTest(testtools.TestCase):
                             user="user", password="password")
         self.assertEqual(restr.restore_cmd,
                          DECRYPT + PIPE + UNZIP + PIPE + SQLDUMP_RESTORE)
+
+    def test_backup_zstd_xtrabackup_command(self):
+        when(codec.CODECS['zstd']).is_available().thenReturn(True)
+        backupBase.BackupRunner.is_zipped = True
+        backupBase.BackupRunner.is_encrypted = True
+        backupBase.BackupRunner.compression = 'zstd'
+        backupBase.BackupRunner.encrypt_key = CRYPTO_KEY
+        when(codec).cpu_count().thenReturn(4)
+        RunnerClass = utils.import_class(BACKUP_XTRA_CLS)
+        bkup = RunnerClass(12345, extra_opts="")
+        self.assertEqual(bkup.command,
+                         XTRA_BACKUP + PIPE + "zstd -q -c -T4" +
+                         PIPE + ENCRYPT)
+        self.assertEqual(bkup.manifest, "12345.xbstream.zst.enc")
+        self.assertEqual(bkup.process_env[codec.ENCRYPT_KEY_ENV],
+                         CRYPTO_KEY)
+
+    def test_backup_codec_falls_back_to_gzip(self):
+        when(codec.CODECS['lz4']).is_available().thenReturn(False)
+        backupBase.BackupRunner.is_zipped = True
+        backupBase.BackupRunner.is_encrypted = False
+        backupBase.BackupRunner.compression = 'lz4'
+        RunnerClass = utils.import_class(BACKUP_XTRA_CLS)
+        bkup = RunnerClass(12345, extra_opts="")
+        self.assertEqual(bkup.command, XTRA_BACKUP + PIPE + ZIP)
+        self.assertEqual(bkup.manifest, "12345.xbstream.gz")
+        self.assertIsNone(bkup.process_env)
+
+    def test_restore_codec_from_backup_location(self):
+        restoreBase.RestoreRunner.is_zipped = True
+        restoreBase.RestoreRunner.is_encrypted = False
+        RunnerClass = utils.import_class(RESTORE_XTRA_CLS)
+        location = "http://swift/c/1.xbstream.lz4.enc"
+        restr = RunnerClass(None, restore_location="/var/lib/mysql",
+                            backup_location=location)
+        self.assertEqual(restr.restore_cmd,
+                         DECRYPT + PIPE + "lz4 -d -c" + PIPE + XTRA_RESTORE)
+
+    def test_restore_uncompressed_backup_location(self):
+        restoreBase.RestoreRunner.is_zipped = True
+        restoreBase.RestoreRunner.is_encrypted = True
+        RunnerClass = utils.import_class(RESTORE_SQLDUMP_CLS)
+        restr = RunnerClass(None, restore_location="/var/lib/mysql",
+                            backup_location="http://swift/c/1")
+        self.assertEqual(restr.restore_cmd, SQLDUMP_RESTORE)
+        self.assertIsNone(restr.process_env)
+
+    def test_restore_gzip_location_uses_pigz(self):
+        when(codec.CODECS['pigz']).is_available().thenReturn(True)
+        RunnerClass = utils.import_class(RESTORE_XTRA_CLS)
+        restr = RunnerClass(None, restore_location="/var/lib/mysql",
+                            backup_location="http://swift/c/1.xbstream.gz")
+        self.assertEqual(restr.restore_cmd,
+                         "pigz -d -c" + PIPE + XTRA_RESTORE)
+
+    def test_backup_incremental_xtrabackup_command(self):
+        backupBase.BackupRunner.is_zipped = True
+        backupBase.BackupRunner.is_encrypted = False
+        RunnerClass = utils.import_class(BACKUP_XTRA_INCR_CLS)
+        bkup = RunnerClass(12345, extra_opts="", lsn="1234",
+                           parent_location="swift/c/parent",
+                           parent_checksum="md5")
+        self.assertEqual(bkup.command, XTRA_BACKUP_INCR + PIPE + ZIP)
+        self.assertEqual(bkup.manifest, "12345.xbstream.gz")
+        when(mysql_impl.InnoBackupEx).metadata().thenReturn({'lsn': '5678'})
+        self.assertEqual(bkup.metadata(),
+                         {'lsn': '5678',
+                          'parent_location': 'swift/c/parent',
+                          'parent_checksum': 'md5'})
+
+    def test_backup_incremental_needs_lsn(self):
+        RunnerClass = utils.import_class(BACKUP_XTRA_INCR_CLS)
+        self.assertRaises(AttributeError, RunnerClass, 12345, extra_opts="")
+
+    def test_restore_incremental_chain(self):
+        metadata = {'swift/c/2.xbstream.gz': {'parent_location':
+                                              'swift/c/1.xbstream.gz',
+                                              'parent_checksum': 'md5-1'},
+                    'swift/c/1.xbstream.gz': {}}
+        storage = Mock()
+        storage.load_metadata.side_effect = lambda loc, md5: metadata[loc]
+        unpacked = []
+        prepared = []
+        RunnerClass = utils.import_class(RESTORE_XTRA_INCR_CLS)
+        when(codec.CODECS['pigz']).is_available().thenReturn(False)
+        when(utils).execute_with_timeout(any(), any(), any(),
+                                         any()).thenReturn(None)
+        when(utils).raise_if_process_errored(any(), any()).thenReturn(None)
+        restr = RunnerClass('stream', restore_location="/var/lib/mysql",
+                            backup_location='swift/c/2.xbstream.gz',
+                            backup_checksum='md5-2', storage=storage)
+
+        def unpack(stream, cmd):
+            unpacked.append((stream, cmd))
+            return 1
+
+        restr._unpack = unpack
+        restr._run_incremental_prepare = prepared.append
+        self.assertEqual(restr._run_restore(), 2)
+        self.assertEqual(unpacked,
+                         [(storage.load.return_value,
+                           UNZIP + PIPE + XTRA_RESTORE),
+                          ('stream', UNZIP + PIPE +
+                           "sudo xbstream -x -C /var/lib/mysql/md5-2")])
+        self.assertEqual(prepared, [None, '/var/lib/mysql/md5-2'])
+
+    def test_backup_mydumper_command(self):
+        backupBase.BackupRunner.is_zipped = True
+        backupBase.BackupRunner.is_encrypted = False
+        when(dbaas).get_backup_staging_dir().thenReturn(STAGING_DIR)
+        RunnerClass = utils.import_class(BACKUP_MYDUMPER_CLS)
+        bkup = RunnerClass(12345, user="user", password="password",
+                           extra_opts="")
+        self.assertEqual(bkup.command, MYDUMPER_BACKUP + PIPE + ZIP)
+        self.assertEqual(bkup.manifest, "12345.tar.gz")
+
+    def test_restore_mydumper_command(self):
+        restoreBase.RestoreRunner.is_zipped = True
+        restoreBase.RestoreRunner.is_encrypted = False
+        when(codec.CODECS['pigz']).is_available().thenReturn(False)
+        when(dbaas).get_backup_staging_dir().thenReturn(STAGING_DIR)
+        RunnerClass = utils.import_class(RESTORE_MYDUMPER_CLS)
+        restr = RunnerClass(None, restore_location="/var/lib/mysql",
+                            backup_location="http://swift/c/12345.tar.gz")
+        self.assertEqual(restr.restore_cmd, UNZIP + PIPE + MYDUMPER_RESTORE)
+
+    def test_restore_mydumper_before_secure(self):
+        # prepare restores the backup before secure() creates the admin
+        # user, while my.cnf has no password yet.
+        restoreBase.RestoreRunner.is_zipped = True
+        restoreBase.RestoreRunner.is_encrypted = False
+        when(dbaas)._read_auth_password().thenReturn('')
+        dbaas.CONFIG_CACHE.clear()
+        when(dbaas).get_backup_staging_dir().thenReturn(STAGING_DIR)
+        RunnerClass = utils.import_class(RESTORE_MYDUMPER_CLS)
+        restr = RunnerClass(None, restore_location="/var/lib/mysql",
+                            backup_location="http://swift/c/12345.tar.gz")
+        self.assertIn(" sudo myloader -u root ", restr.restore_cmd)
+        self.assertNotIn(dbaas.ADMIN_USER_NAME, restr.restore_cmd)
+        self.assertNotIn("--password", restr.restore_cmd)
+        verify(dbaas, never)._read_auth_password()
@@ -12,11 +12,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
+from eventlet import event
 import os
+import tempfile
 from uuid import uuid4
 import time
 from mock import Mock
 from mock import MagicMock
+from mock import patch
 from mockito import mock
 from mockito import when
 from mockito import any
@@ -26,6 +30,7 @@ from mockito import contains
 from mockito import never
 from mockito import matchers
 from mockito import inorder, verifyNoMoreInteractions
+from oslo.config.cfg import ConfigOpts
 import sqlalchemy
 import testtools
 from testtools.matchers import Is
@@ -88,11 +93,13 @@ class DbaasTest(testtools.TestCase):
         super(DbaasTest, self).setUp()
         self.orig_utils_execute_with_timeout = dbaas.utils.execute_with_timeout
         self.orig_utils_execute = dbaas.utils.execute
+        dbaas.CONFIG_CACHE.clear()
 
     def tearDown(self):
         super(DbaasTest, self).tearDown()
         dbaas.utils.execute_with_timeout = self.orig_utils_execute_with_timeout
         dbaas.utils.execute = self.orig_utils_execute
+        dbaas.CONFIG_CACHE.clear()
 
     def test_get_auth_password(self):
 
@@ -110,6 +117,22 @@ class DbaasTest(testtools.TestCase):
 
         self.assertRaises(RuntimeError, dbaas.get_auth_password)
 
+    def test_get_backup_staging_dir(self):
+        dbaas.CONF.set_override('backup_staging_dir', '/var/lib/staging')
+        self.addCleanup(dbaas.CONF.clear_override, 'backup_staging_dir')
+
+        self.assertEqual('/var/lib/staging', dbaas.get_backup_staging_dir())
+
+    def test_get_backup_staging_dir_not_set(self):
+        self.assertRaises(RuntimeError, dbaas.get_backup_staging_dir)
+
+    def test_get_backup_staging_dir_in_datadir(self):
+        # mysqld lists any directory in its datadir as a database.
+        dbaas.CONF.set_override('backup_staging_dir', '/var/lib/mysql/dump')
+        self.addCleanup(dbaas.CONF.clear_override, 'backup_staging_dir')
+
+        self.assertRaises(RuntimeError, dbaas.get_backup_staging_dir)
+
     def test_service_discovery(self):
         when(os.path).isfile(any()).thenReturn(True)
         mysql_service = dbaas.operating_system.service_discovery(["mysql"])
@@ -141,6 +164,55 @@ class DbaasTest(testtools.TestCase):
         self.assertFalse(dbaas.load_mysqld_options())
 
 
+class MySqlConfigCacheTest(testtools.TestCase):
+
+    def setUp(self):
+        super(MySqlConfigCacheTest, self).setUp()
+        self.mycnf = tempfile.NamedTemporaryFile()
+        self.mycnf.write("[client]\n")
+        self.mycnf.flush()
+        self.cache = dbaas.MySqlConfigCache(self.mycnf.name)
+        self.loader = Mock(return_value="password")
+
+    def tearDown(self):
+        super(MySqlConfigCacheTest, self).tearDown()
+        self.mycnf.close()
+
+    def test_value_is_loaded_once(self):
+        self.assertEqual("password", self.cache.get('password', self.loader))
+        self.assertEqual("password", self.cache.get('password', self.loader))
+        self.assertEqual(1, self.loader.call_count)
+
+    def test_modified_file_is_read_again(self):
+        self.cache.get('password', self.loader)
+        self.mycnf.write("password\t= secret\n")
+        self.mycnf.flush()
+        self.cache.get('password', self.loader)
+        self.assertEqual(2, self.loader.call_count)
+
+    def test_missing_file_is_not_cached(self):
+        cache = dbaas.MySqlConfigCache("/nonexistent/my.cnf")
+        cache.get('password', self.loader)
+        cache.get('password', self.loader)
+        self.assertEqual(2, self.loader.call_count)
+
+    def test_failed_load_is_not_cached(self):
+        self.loader.return_value = None
+        self.cache.get('mysqld_options', self.loader)
+        self.cache.get('mysqld_options', self.loader)
+        self.assertEqual(2, self.loader.call_count)
+
+    def test_reset_keeps_written_values(self):
+        self.cache.get('mysqld_options', Mock(return_value={}))
+        self.cache.reset(password="new_password")
+        self.assertEqual("new_password",
+                         self.cache.get('password', self.loader))
+        self.assertFalse(self.loader.called)
+        loader = Mock(return_value={'port': '3306'})
+        self.assertEqual({'port': '3306'},
+                         self.cache.get('mysqld_options', loader))
+
+
 class ResultSetStub(object):
 
     def __init__(self, rows):
@@ -178,6 +250,14 @@ class MySqlAdminMockTest(testtools.TestCase):
         self.assertThat(len(databases), Is(3))
 
 
+class FakeResult(list):
+    """A list of rows standing in for a sqlalchemy result."""
+
+    @property
+    def rowcount(self):
+        return len(self)
+
+
 class MySqlAdminTest(testtools.TestCase):
 
     def setUp(self):
@@ -251,6 +331,27 @@ class MySqlAdminTest(testtools.TestCase):
         self.assertEqual(2, dbaas.LocalSqlClient.execute.call_count,
                          "The client object was not 2 times")
 
+    def test_create_database_reports_failures(self):
+        dbaas.LocalSqlClient.execute.side_effect = [Exception("exists"),
+                                                    None]
+
+        failures = self.mySqlAdmin.create_database([FAKE_DB, FAKE_DB_2])
+
+        self.assertEqual(2, dbaas.LocalSqlClient.execute.call_count)
+        self.assertEqual([{'name': 'testDB', 'error': 'exists'}], failures)
+
+    def test_create_user_stops_user_at_failure(self):
+        user = {"_name": "random", "_password": "guesswhat",
+                "_databases": [FAKE_DB, FAKE_DB_2]}
+        dbaas.LocalSqlClient.execute.side_effect = [None,
+                                                    Exception("denied"),
+                                                    None]
+
+        failures = self.mySqlAdmin.create_user([user, FAKE_USER[0]])
+
+        self.assertEqual(3, dbaas.LocalSqlClient.execute.call_count)
+        self.assertEqual([{'name': 'random@%', 'error': 'denied'}], failures)
+
     def test_create_database_no_db(self):
 
         databases = []
@@ -448,6 +549,29 @@ class MySqlAdminTest(testtools.TestCase):
 
         self.assertTrue("AND Marker >= '" + marker + "'" in args[0].text)
 
+    def test_list_users_reads_privileges_once(self):
+        users = FakeResult([{'User': 'user1', 'Host': '%',
+                             'Marker': 'user1@%'},
+                            {'User': 'user2', 'Host': '%',
+                             'Marker': 'user2@%'}])
+        privileges = FakeResult([{'grantee': "'user1'@'%'",
+                                  'table_schema': 'db1'},
+                                 {'grantee': "'user2'@'%'",
+                                  'table_schema': 'db2'},
+                                 {'grantee': "'user2'@'%'",
+                                  'table_schema': 'db3'}])
+        dbaas.LocalSqlClient.execute.side_effect = [users, privileges]
+        found, next_marker = self.mySqlAdmin.list_users(limit=10)
+        self.assertEqual(2, dbaas.LocalSqlClient.execute.call_count)
+        args, kwargs = dbaas.LocalSqlClient.execute.call_args
+        self.assertTrue("grantee IN (:grantee0, :grantee1)" in args[0].text)
+        self.assertEqual(set(["'user1'@'%'", "'user2'@'%'"]),
+                         set(kwargs.values()))
+        self.assertEqual([['db1'], ['db2', 'db3']],
+                         [[db['_name'] for db in user['_databases']]
+                          for user in found])
+        self.assertIsNone(next_marker)
+
     def test_get_user(self):
         """
         Unit tests for mySqlAdmin.get_user.
@@ -1037,6 +1161,7 @@ class BaseDbStatusTest(testtools.TestCase):
         time.sleep = self.orig_dbaas_time_sleep
         InstanceServiceStatus.find_by(instance_id=self.FAKE_ID).delete()
         dbaas.CONF.guest_id = None
+        unstub()
 
     def test_begin_install(self):
 
@@ -1136,6 +1261,41 @@ class BaseDbStatusTest(testtools.TestCase):
                          wait_for_real_status_to_change_to
                          (rd_instance.ServiceStatuses.SHUTDOWN, 10))
 
+    def _build_installed_status(self, keepalive):
+        when(ConfigOpts)._get('guest_status_keepalive_interval').thenReturn(
+            keepalive)
+        self.baseDbStatus = BaseDbStatus()
+        self.baseDbStatus.status = rd_instance.ServiceStatuses.RUNNING
+        self.baseDbStatus.last_heartbeat = time.time()
+        self.baseDbStatus._get_actual_db_status = Mock(
+            return_value=rd_instance.ServiceStatuses.RUNNING)
+        self.baseDbStatus.set_status = Mock()
+
+    def test_update_sends_unchanged_status_without_keepalive(self):
+        self._build_installed_status(0)
+        self.baseDbStatus.update()
+        self.baseDbStatus.set_status.assert_called_once_with(
+            rd_instance.ServiceStatuses.RUNNING)
+
+    def test_update_skips_unchanged_status_within_keepalive(self):
+        self._build_installed_status(60)
+        self.baseDbStatus.update()
+        self.assertFalse(self.baseDbStatus.set_status.called)
+
+    def test_update_sends_unchanged_status_after_keepalive(self):
+        self._build_installed_status(60)
+        self.baseDbStatus.last_heartbeat = time.time() - 61
+        self.baseDbStatus.update()
+        self.assertTrue(self.baseDbStatus.set_status.called)
+
+    def test_update_sends_changed_status_within_keepalive(self):
+        self._build_installed_status(60)
+        self.baseDbStatus._get_actual_db_status.return_value = (
+            rd_instance.ServiceStatuses.SHUTDOWN)
+        self.baseDbStatus.update()
+        self.baseDbStatus.set_status.assert_called_once_with(
+            rd_instance.ServiceStatuses.SHUTDOWN)
+
 
 class MySqlAppStatusTest(testtools.TestCase):
 
@@ -1146,6 +1306,8 @@ class MySqlAppStatusTest(testtools.TestCase):
         self.orig_load_mysqld_options = dbaas.load_mysqld_options
         self.orig_dbaas_os_path_exists = dbaas.os.path.exists
         self.orig_dbaas_time_sleep = time.sleep
+        self.orig_probe_in_process = MySqlAppStatus._probe_in_process
+        MySqlAppStatus._probe_in_process = Mock(return_value=None)
         self.FAKE_ID = str(uuid4())
         InstanceServiceStatus.create(instance_id=self.FAKE_ID,
                                      status=rd_instance.ServiceStatuses.NEW)
@@ -1154,6 +1316,7 @@ class MySqlAppStatusTest(testtools.TestCase):
     def tearDown(self):
         super(MySqlAppStatusTest, self).tearDown()
         dbaas.utils.execute_with_timeout = self.orig_utils_execute_with_timeout
+        MySqlAppStatus._probe_in_process = self.orig_probe_in_process
         dbaas.load_mysqld_options = self.orig_load_mysqld_options
         dbaas.os.path.exists = self.orig_dbaas_os_path_exists
         time.sleep = self.orig_dbaas_time_sleep
@@ -1194,3 +1357,77 @@ class MySqlAppStatusTest(testtools.TestCase):
         status = self.mySqlAppStatus._get_actual_db_status()
 
         self.assertEqual(rd_instance.ServiceStatuses.BLOCKED, status)
+
+    def _in_process_status(self, pid=None):
+        MySqlAppStatus._probe_in_process = self.orig_probe_in_process
+        dbaas.utils.execute_with_timeout = Mock(return_value=(None, None))
+        app_status = MySqlAppStatus()
+        app_status._ping_admin = Mock(return_value=None)
+        app_status._ping_socket = Mock(return_value=False)
+        pid_file = tempfile.NamedTemporaryFile()
+        self.addCleanup(pid_file.close)
+        if pid is not None:
+            pid_file.write(str(pid))
+            pid_file.flush()
+        dbaas.load_mysqld_options = Mock(
+            return_value={'pid-file': pid_file.name})
+        return app_status
+
+    def test_get_actual_db_status_socket_ping(self):
+        app_status = self._in_process_status()
+        app_status._ping_socket.return_value = True
+
+        status = app_status._get_actual_db_status()
+
+        self.assertEqual(rd_instance.ServiceStatuses.RUNNING, status)
+        self.assertFalse(dbaas.utils.execute_with_timeout.called)
+        self.assertEqual(1, app_status.probe_timings['socket']['count'])
+        self.assertNotIn('subprocess', app_status.probe_timings)
+
+    def test_get_actual_db_status_stale_pid_file(self):
+        # This process is not mysqld, so its pid counts as stale.
+        app_status = self._in_process_status(pid=os.getpid())
+
+        status = app_status._get_actual_db_status()
+
+        self.assertEqual(rd_instance.ServiceStatuses.CRASHED, status)
+        self.assertFalse(dbaas.utils.execute_with_timeout.called)
+        self.assertEqual(1, app_status.probe_timings['pid']['count'])
+
+    def test_get_actual_db_status_falls_back_to_processes(self):
+        app_status = self._in_process_status()
+
+        status = app_status._get_actual_db_status()
+
+        self.assertEqual(rd_instance.ServiceStatuses.RUNNING, status)
+        self.assertTrue(dbaas.utils.execute_with_timeout.called)
+        self.assertEqual(1, app_status.probe_timings['subprocess']['count'])
+
+    @patch.object(dbaas, 'PING_TIMEOUT', 0.01)
+    @patch.object(dbaas, 'get_auth_password', Mock(return_value='password'))
+    @patch.object(dbaas.tpool, 'execute')
+    def test_ping_admin_gives_up_on_hung_query(self, execute):
+        # mysqld accepts the connection but never answers the query.
+        answer = event.Event()
+        execute.side_effect = lambda *args: answer.wait()
+        app_status = MySqlAppStatus()
+
+        self.assertIsNone(app_status._ping_admin())
+        self.assertIsNone(app_status._ping_admin())
+        self.assertEqual(1, execute.call_count)
+
+        answer.send(True)
+        eventlet.sleep(0)
+        self.assertTrue(app_status._ping_admin())
+        self.assertEqual(2, execute.call_count)
+
+    @patch.object(dbaas, 'get_auth_password',
+                  Mock(side_effect=RuntimeError("Problem reading my.cnf!")))
+    def test_ping_admin_error_is_unclear(self):
+        self.assertIsNone(MySqlAppStatus()._ping_admin())
+
+    @patch.object(dbaas.MySQLdb, 'connect',
+                  Mock(side_effect=dbaas.MySQLdb.OperationalError(
+                      2013, "Lost connection to MySQL server")))
+    def test_run_ping_error_is_unclear(self):
+        self.assertIsNone(dbaas._run_ping('password'))
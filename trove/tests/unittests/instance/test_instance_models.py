@@ -0,0 +1,180 @@
+#    Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from mock import Mock
+from mockito import mock, when, unstub, any, verify, never
+from oslo.config.cfg import ConfigOpts
+from testtools import TestCase
+from testtools.matchers import Equals, Is
+
+from trove.common import exception
+from trove.common.instance import ServiceStatuses
+from trove.datastore import models as datastore_models
+from trove.instance import models
+from trove.instance.models import InstanceServiceStatus
+from trove.instance.tasks import InstanceTasks
+
+
+class FakeServer(object):
+
+    def __init__(self, id, status='ACTIVE'):
+        self.id = id
+        self.status = status
+
+
+class LoadServersStatusTest(TestCase):
+
+    def setUp(self):
+        super(LoadServersStatusTest, self).setUp()
+        self.ds_version = mock()
+        self.ds_version.datastore_id = 'ds_1'
+        self.ds = mock()
+        self.db_infos = [self._build_db_info('1'), self._build_db_info('2')]
+        self.servers = [FakeServer('server_1'), FakeServer('server_2')]
+        when(InstanceServiceStatus).find_all_by_instance_ids(any()).thenReturn(
+            {'1': InstanceServiceStatus(ServiceStatuses.RUNNING),
+             '2': InstanceServiceStatus(ServiceStatuses.RUNNING)})
+        when(InstanceServiceStatus).find_by(instance_id=any()).thenRaise(
+            exception.ModelNotFoundError())
+        when(models).load_datastores(any()).thenReturn(
+            {'version_1': (self.ds_version, self.ds)})
+
+    def tearDown(self):
+        super(LoadServersStatusTest, self).tearDown()
+        unstub()
+
+    @staticmethod
+    def _build_db_info(id):
+        db_info = Mock()
+        db_info.id = id
+        db_info.compute_instance_id = 'server_%s' % id
+        db_info.datastore_version_id = 'version_1'
+        db_info.task_status = InstanceTasks.NONE
+        return db_info
+
+    def _load(self):
+        load_instance = Mock(side_effect=lambda *args, **kwargs: kwargs)
+        find_server = models.create_server_list_matcher(self.servers)
+        return models.Instances._load_servers_status(load_instance, None,
+                                                     self.db_infos,
+                                                     find_server)
+
+    def test_statuses_and_datastores_are_bulk_loaded(self):
+        loaded = self._load()
+        self.assertThat(len(loaded), Equals(2))
+        for kwargs in loaded:
+            self.assertThat(kwargs['ds_version'], Is(self.ds_version))
+            self.assertThat(kwargs['ds'], Is(self.ds))
+        verify(InstanceServiceStatus, never).find_by(instance_id=any())
+        verify(models, times=1).load_datastores(any())
+
+    def test_instance_without_status_is_skipped(self):
+        when(InstanceServiceStatus).find_all_by_instance_ids(any()).thenReturn(
+            {'2': InstanceServiceStatus(ServiceStatuses.RUNNING)})
+        loaded = self._load()
+        self.assertThat(len(loaded), Equals(1))
+        self.assertThat(loaded[0]['server'].id, Equals('server_2'))
+
+
+class ServerListMatcherTest(TestCase):
+
+    def test_find_server(self):
+        servers = [FakeServer('server_1'), FakeServer('server_2')]
+        find_server = models.create_server_list_matcher(servers)
+        self.assertThat(find_server('2', 'server_2'), Is(servers[1]))
+
+    def test_find_server_not_found(self):
+        find_server = models.create_server_list_matcher(
+            [FakeServer('server_1')])
+        self.assertRaises(exception.ComputeInstanceNotFound,
+                          find_server, '2', 'server_2')
+
+    def test_find_server_found_twice(self):
+        find_server = models.create_server_list_matcher(
+            [FakeServer('server_1'), FakeServer('server_1')])
+        self.assertRaises(exception.TroveError,
+                          find_server, '1', 'server_1')
+
+
+class LoadTenantServersTest(TestCase):
+
+    def setUp(self):
+        super(LoadTenantServersTest, self).setUp()
+        self.context = Mock()
+        self.context.tenant = 'tenant_1'
+        self.client = Mock()
+        self.client.servers.list.return_value = [FakeServer('server_1')]
+        models.SERVER_LIST_CACHE.clear()
+
+    def tearDown(self):
+        super(LoadTenantServersTest, self).tearDown()
+        models.SERVER_LIST_CACHE.clear()
+        unstub()
+
+    def test_list_lookup(self):
+        when(ConfigOpts)._get('instances_server_lookup').thenReturn('list')
+        servers = models.load_tenant_servers(self.context, self.client, [])
+        self.assertThat(servers, Equals(self.client.servers.list.return_value))
+
+    def test_page_lookup_only_fetches_page(self):
+        when(ConfigOpts)._get('instances_server_lookup').thenReturn('page')
+        building = LoadServersStatusTest._build_db_info('2')
+        building.task_status = InstanceTasks.BUILDING
+        db_infos = [LoadServersStatusTest._build_db_info('1'), building]
+        self.client.servers.get.side_effect = FakeServer
+        servers = models.load_tenant_servers(self.context, self.client,
+                                             db_infos)
+        self.assertThat([server.id for server in servers],
+                        Equals(['server_1']))
+        self.assertFalse(self.client.servers.list.called)
+
+    def test_cache_lookup_reuses_server_list(self):
+        when(ConfigOpts)._get('instances_server_lookup').thenReturn('cache')
+        models.load_tenant_servers(self.context, self.client, [])
+        models.load_tenant_servers(self.context, self.client, [])
+        self.assertThat(self.client.servers.list.call_count, Equals(1))
+
+
+class LoadDatastoresTest(TestCase):
+
+    def tearDown(self):
+        super(LoadDatastoresTest, self).tearDown()
+        unstub()
+
+    def test_load_datastores(self):
+        version = mock()
+        version.datastore_id = 'ds_1'
+        datastore = mock()
+        when(datastore_models.DatastoreVersion).load_by_ids(
+            ['version_1', 'version_1']).thenReturn({'version_1': version})
+        when(datastore_models.Datastore).load_by_ids(['ds_1']).thenReturn(
+            {'ds_1': datastore})
+        result = models.load_datastores(['version_1', 'version_1'])
+        self.assertThat(result, Equals({'version_1': (version, datastore)}))
+
+
+class LoadGuestInfoTest(TestCase):
+
+    def tearDown(self):
+        super(LoadGuestInfoTest, self).tearDown()
+        unstub()
+
+    def test_volume_used_comes_from_heartbeat(self):
+        instance = Mock()
+        instance.service_status.volume_used = 1.25
+        instance.service_status.volume_used_updated = 'now'
+        when(models).create_guest_client(any(), any()).thenRaise(
+            AssertionError('The guest must not be called.'))
+        models.load_guest_info(instance, None, '1')
+        self.assertThat(instance.volume_used, Equals(1.25))
+        self.assertThat(instance.volume_used_updated, Equals('now'))
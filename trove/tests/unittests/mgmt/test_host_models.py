@@ -0,0 +1,72 @@
+#    Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from mock import Mock
+from mockito import mock, when, unstub, any, verify, never
+from testtools import TestCase
+from testtools.matchers import Equals
+
+from trove.common import exception
+from trove.common import instance as rd_instance
+from trove.extensions.mgmt.host import models
+from trove.instance.models import DBInstance
+from trove.instance.models import InstanceServiceStatus
+from trove.instance.tasks import InstanceTasks
+
+
+class DetailedHostTest(TestCase):
+
+    def setUp(self):
+        super(DetailedHostTest, self).setUp()
+        self.host_info = mock()
+        self.host_info.name = 'host_1'
+        self.host_info.percentUsed = 10
+        self.host_info.totalRAM = 2048
+        self.host_info.usedRAM = 1024
+        self.host_info.instances = [{'uuid': 'server_1'},
+                                    {'uuid': 'server_2'}]
+        db_info = DBInstance(InstanceTasks.BUILDING, id='1',
+                             tenant_id='tenant_1',
+                             compute_instance_id='server_1',
+                             datastore_version_id='version_1')
+        when(DBInstance).find_all_by_compute_instance_ids(any()).thenReturn(
+            {'server_1': db_info})
+        when(InstanceServiceStatus).find_all_by_instance_ids(
+            ['1']).thenReturn(
+                {'1': InstanceServiceStatus(rd_instance.ServiceStatuses.NEW)})
+        when(models).load_datastores(['version_1']).thenReturn(
+            {'version_1': (mock(), mock())})
+        when(DBInstance).find_by(compute_instance_id=any()).thenRaise(
+            exception.ModelNotFoundError())
+
+    def tearDown(self):
+        super(DetailedHostTest, self).tearDown()
+        unstub()
+
+    def test_instances_are_bulk_loaded(self):
+        host = models.DetailedHost(self.host_info)
+        self.assertThat(host.instances[0]['id'], Equals('1'))
+        self.assertThat(host.instances[0]['tenant_id'], Equals('tenant_1'))
+        self.assertThat(host.instances[0]['status'], Equals('BUILD'))
+        self.assertThat(host.instances[1]['server_id'], Equals('server_2'))
+        self.assertThat(host.instances[1]['id'], Equals(None))
+        verify(DBInstance, never).find_by(compute_instance_id=any())
+        verify(models, times=1).load_datastores(any())
+
+    def test_update_all_reports_failed_guests(self):
+        host = models.DetailedHost(self.host_info)
+        client = Mock()
+        client.update_guest.side_effect = [None, exception.TroveError()]
+        when(models).create_guest_client(any(), any()).thenReturn(client)
+        self.assertRaises(exception.UpdateGuestError, host.update_all, None)
+        self.assertThat(client.update_guest.call_count, Equals(2))
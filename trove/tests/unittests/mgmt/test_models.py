@@ -13,10 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 #
+from mock import Mock
+from mock import patch
 from mockito import mock, when, verify, unstub, any
 from testtools import TestCase
 from testtools.matchers import Equals, Is, Not
 
+from novaclient import exceptions as nova_exceptions
 from novaclient.v1_1 import Client
 from novaclient.v1_1.flavors import FlavorManager, Flavor
 from novaclient.v1_1.servers import Server, ServerManager
@@ -25,13 +28,17 @@ from trove.backup.models import Backup
 from trove.common.context import TroveContext
 from trove.common import instance as rd_instance
 from trove.datastore import models as datastore_models
+from trove.flavor.models import FLAVOR_CATALOG
 from trove.db.models import DatabaseModelBase
+from trove.instance import models as instance_models
 from trove.instance.models import DBInstance
 from trove.instance.models import InstanceServiceStatus
 from trove.instance.tasks import InstanceTasks
 import trove.extensions.mgmt.instances.models as mgmtmodels
 from trove.openstack.common.notifier import api as notifier
 from trove.common import remote
+from trove.common import utils
+from trove.tests.unittests.util import util
 from trove.tests.util import test_config
 
 
@@ -52,9 +59,11 @@ class MockMgmtInstanceTest(TestCase):
         when(ConfigOpts)._get('report_interval').thenReturn(20)
         when(ConfigOpts)._get('notification_service_id').thenReturn(
             {'mysql': '123'})
+        FLAVOR_CATALOG.clear()
 
     def tearDown(self):
         super(MockMgmtInstanceTest, self).tearDown()
+        FLAVOR_CATALOG.clear()
         unstub()
 
     @staticmethod
@@ -79,16 +88,17 @@ class TestNotificationTransformer(MockMgmtInstanceTest):
         db_instance = MockMgmtInstanceTest.build_db_instance(
             status, InstanceTasks.BUILDING)
 
-        when(DatabaseModelBase).find_all(deleted=False).thenReturn(
-            [db_instance])
+        when(mgmtmodels)._iter_db_instance_chunks(any()).thenReturn(
+            [[db_instance]])
         stub_datastore = mock()
         stub_datastore.datastore_id = "stub"
         stub_datastore.manager = "mysql"
-        when(DatabaseModelBase).find_by(id=any()).thenReturn(stub_datastore)
-        when(DatabaseModelBase).find_by(instance_id='1').thenReturn(
-            InstanceServiceStatus(rd_instance.ServiceStatuses.BUILDING))
+        when(instance_models).load_datastores(any()).thenReturn(
+            {db_instance.datastore_version_id: (mock(), stub_datastore)})
+        when(InstanceServiceStatus).find_all_by_instance_ids(['1']).thenReturn(
+            {'1': InstanceServiceStatus(rd_instance.ServiceStatuses.BUILDING)})
 
-        payloads = transformer()
+        payloads = list(transformer())
         self.assertIsNotNone(payloads)
         self.assertThat(len(payloads), Equals(1))
         payload = payloads[0]
@@ -96,6 +106,32 @@ class TestNotificationTransformer(MockMgmtInstanceTest):
         self.assertThat(payload['audit_period_ending'], Not(Is(None)))
         self.assertThat(payload['state'], Equals(status.lower()))
 
+    def test_tranformer_skips_instance_without_status(self):
+        transformer = mgmtmodels.NotificationTransformer(context=self.context)
+        status = rd_instance.ServiceStatuses.BUILDING.api_status
+        db_instance = MockMgmtInstanceTest.build_db_instance(
+            status, InstanceTasks.BUILDING)
+        when(mgmtmodels)._iter_db_instance_chunks(any()).thenReturn(
+            [[db_instance]])
+        when(instance_models).load_datastores(any()).thenReturn({})
+        when(InstanceServiceStatus).find_all_by_instance_ids(
+            any()).thenReturn({})
+
+        self.assertThat(list(transformer()), Equals([]))
+
+    def test_iter_db_instance_chunks(self):
+        query = mock()
+        first = [DBInstance(InstanceTasks.NONE, id='1'),
+                 DBInstance(InstanceTasks.NONE, id='2')]
+        second = [DBInstance(InstanceTasks.NONE, id='3')]
+        when(DatabaseModelBase).find_all(deleted=False).thenReturn(query)
+        when(query).limit(limit=2, marker=None).thenReturn(first)
+        when(query).limit(limit=2, marker='2').thenReturn(second)
+
+        chunks = list(mgmtmodels._iter_db_instance_chunks(2))
+
+        self.assertThat(chunks, Equals([first, second]))
+
     def test_get_service_id(self):
         id_map = {
             'mysql': '123',
@@ -124,8 +160,12 @@ class TestNovaNotificationTransformer(MockMgmtInstanceTest):
             context=self.context)
         transformer2 = mgmtmodels.NovaNotificationTransformer(
             context=self.context)
-        self.assertThat(transformer._flavor_cache,
-                        Not(Is(transformer2._flavor_cache)))
+        # The transformers share the flavor catalog of the process.
+        self.assertThat(transformer._lookup_flavor('flavor_1'),
+                        Equals('db.small'))
+        self.assertThat(transformer2._lookup_flavor('flavor_1'),
+                        Equals('db.small'))
+        verify(self.flavor_mgr, times=1).get('flavor_1')
 
     def test_lookup_flavor(self):
         flavor = mock(Flavor)
@@ -147,9 +187,8 @@ class TestNovaNotificationTransformer(MockMgmtInstanceTest):
                                                       db_instance,
                                                       server,
                                                       None)
-        when(mgmtmodels).load_mgmt_instances(
+        when(mgmtmodels).iter_mgmt_instances(
             self.context,
-            deleted=False,
             client=self.client).thenReturn(
                 [mgmt_instance])
         flavor = mock(Flavor)
@@ -159,7 +198,7 @@ class TestNovaNotificationTransformer(MockMgmtInstanceTest):
         # invocation
         transformer = mgmtmodels.NovaNotificationTransformer(
             context=self.context)
-        payloads = transformer()
+        payloads = list(transformer())
         # assertions
         self.assertIsNotNone(payloads)
         self.assertThat(len(payloads), Equals(1))
@@ -187,9 +226,8 @@ class TestNovaNotificationTransformer(MockMgmtInstanceTest):
                                                       db_instance,
                                                       server,
                                                       None)
-        when(mgmtmodels).load_mgmt_instances(
+        when(mgmtmodels).iter_mgmt_instances(
             self.context,
-            deleted=False,
             client=self.client).thenReturn(
                 [mgmt_instance])
         flavor = mock(Flavor)
@@ -199,7 +237,7 @@ class TestNovaNotificationTransformer(MockMgmtInstanceTest):
         # invocation
         transformer = mgmtmodels.NovaNotificationTransformer(
             context=self.context)
-        payloads = transformer()
+        payloads = list(transformer())
         # assertions
         self.assertIsNotNone(payloads)
         self.assertThat(len(payloads), Equals(1))
@@ -225,9 +263,8 @@ class TestNovaNotificationTransformer(MockMgmtInstanceTest):
                                                       None)
         when(Backup).running('1').thenReturn(None)
         self.assertThat(mgmt_instance.status, Equals('SHUTDOWN'))
-        when(mgmtmodels).load_mgmt_instances(
+        when(mgmtmodels).iter_mgmt_instances(
             self.context,
-            deleted=False,
             client=self.client).thenReturn(
                 [mgmt_instance])
         flavor = mock(Flavor)
@@ -236,7 +273,7 @@ class TestNovaNotificationTransformer(MockMgmtInstanceTest):
         # invocation
         transformer = mgmtmodels.NovaNotificationTransformer(
             context=self.context)
-        payloads = transformer()
+        payloads = list(transformer())
         # assertion that SHUTDOWN instances are not reported
         self.assertIsNotNone(payloads)
         self.assertThat(len(payloads), Equals(0))
@@ -251,9 +288,8 @@ class TestNovaNotificationTransformer(MockMgmtInstanceTest):
                                                       None)
         when(Backup).running('1').thenReturn(None)
         self.assertThat(mgmt_instance.status, Equals('SHUTDOWN'))
-        when(mgmtmodels).load_mgmt_instances(
+        when(mgmtmodels).iter_mgmt_instances(
             self.context,
-            deleted=False,
             client=self.client).thenReturn(
                 [mgmt_instance])
         flavor = mock(Flavor)
@@ -262,7 +298,7 @@ class TestNovaNotificationTransformer(MockMgmtInstanceTest):
         # invocation
         transformer = mgmtmodels.NovaNotificationTransformer(
             context=self.context)
-        payloads = transformer()
+        payloads = list(transformer())
         # assertion that SHUTDOWN instances are not reported
         self.assertIsNotNone(payloads)
         self.assertThat(len(payloads), Equals(0))
@@ -278,9 +314,8 @@ class TestNovaNotificationTransformer(MockMgmtInstanceTest):
                                                       db_instance,
                                                       server,
                                                       None)
-        when(mgmtmodels).load_mgmt_instances(
+        when(mgmtmodels).iter_mgmt_instances(
             self.context,
-            deleted=False,
             client=self.client).thenReturn(
                 [mgmt_instance])
         flavor = mock(Flavor)
@@ -288,9 +323,9 @@ class TestNovaNotificationTransformer(MockMgmtInstanceTest):
         when(self.flavor_mgr).get('flavor_1').thenReturn(flavor)
         transformer = mgmtmodels.NovaNotificationTransformer(
             context=self.context)
-        transformer()
+        list(transformer())
         # call twice ensure client.flavor invoked once
-        payloads = transformer()
+        payloads = list(transformer())
         self.assertIsNotNone(payloads)
         self.assertThat(len(payloads), Equals(1))
         payload = payloads[0]
@@ -316,9 +351,8 @@ class TestMgmtInstanceTasks(MockMgmtInstanceTest):
                                                       db_instance,
                                                       server,
                                                       None)
-        when(mgmtmodels).load_mgmt_instances(
+        when(mgmtmodels).iter_mgmt_instances(
             self.context,
-            deleted=False,
             client=self.client).thenReturn(
                 [mgmt_instance, mgmt_instance])
         flavor = mock(Flavor)
@@ -341,3 +375,95 @@ class TestMgmtInstanceTasks(MockMgmtInstanceTest):
                                          'INFO',
                                          any(dict))
         self.assertThat(self.context.auth_token, Is(None))
+
+
+class LoadMgmtInstancesPageTest(TestCase):
+
+    def setUp(self):
+        super(LoadMgmtInstancesPageTest, self).setUp()
+        util.init_db()
+        self.context = TroveContext()
+        self.client = Mock()
+        self.client.rdservers.get.side_effect = self._server
+        self.tenant_1 = utils.generate_uuid()
+        self.tenant_2 = utils.generate_uuid()
+        self.db_infos = []
+        for index, (tenant, status) in enumerate(
+                [(self.tenant_1, rd_instance.ServiceStatuses.RUNNING),
+                 (self.tenant_1, rd_instance.ServiceStatuses.SHUTDOWN),
+                 (self.tenant_1, rd_instance.ServiceStatuses.RUNNING),
+                 (self.tenant_2, rd_instance.ServiceStatuses.RUNNING)]):
+            db_info = DBInstance.create(
+                name='instance_%d' % index,
+                tenant_id=tenant,
+                task_status=InstanceTasks.NONE,
+                compute_instance_id='server_%d' % index,
+                datastore_version_id='version_1')
+            InstanceServiceStatus.create(instance_id=db_info.id,
+                                         status=status)
+            self.db_infos.append(db_info)
+        when(instance_models).load_datastores(any()).thenReturn(
+            {'version_1': (mock(), mock())})
+
+    def tearDown(self):
+        super(LoadMgmtInstancesPageTest, self).tearDown()
+        unstub()
+        for db_info in self.db_infos:
+            InstanceServiceStatus.find_by(instance_id=db_info.id).delete()
+            db_info.delete()
+
+    @staticmethod
+    def _server(server_id):
+        server = Mock()
+        server.id = server_id
+        server.status = 'ACTIVE'
+        return server
+
+    def _load(self, **filters):
+        instances, marker = mgmtmodels.load_mgmt_instances_page(
+            self.context, client=self.client, **filters)
+        return [instance.id for instance in instances], marker
+
+    def test_tenant_filter(self):
+        ids, marker = self._load(tenant_id=self.tenant_2)
+        self.assertThat(len(ids), Equals(1))
+        self.assertThat(marker, Is(None))
+        self.assertThat(self.client.rdservers.get.call_count, Equals(1))
+
+    def test_status_filter(self):
+        ids, marker = self._load(tenant_id=self.tenant_1, status='shutdown')
+        self.assertThat(len(ids), Equals(1))
+
+    def test_servers_fetched_concurrently(self):
+        self.client.rdservers.get.side_effect = None
+        self.client.rdservers.get.return_value = self._server('server_0')
+        with patch.object(mgmtmodels.greenpool, 'GreenPool',
+                          wraps=mgmtmodels.greenpool.GreenPool) as pool:
+            self._load(deleted=False)
+        pool.assert_called_once_with(
+            mgmtmodels.CONF.mgmt_server_get_concurrency)
+        self.assertThat(self.client.rdservers.get.call_count, Equals(4))
+
+    def test_missing_server_skipped(self):
+        self.client.rdservers.get.side_effect = nova_exceptions.NotFound(404)
+        ids, marker = self._load(tenant_id=self.tenant_2)
+        self.assertThat(len(ids), Equals(1))
+
+    def test_pages_follow_marker(self):
+        expected = sorted(db_info.id for db_info in self.db_infos[:3])
+        self.context.limit = 2
+        first, marker = self._load(tenant_id=self.tenant_1, deleted=False)
+        self.assertThat(first, Equals(expected[:2]))
+        self.assertThat(marker, Equals(first[-1]))
+        self.context.marker = marker
+        second, marker = self._load(tenant_id=self.tenant_1, deleted=False)
+        self.assertThat(second, Equals(expected[2:]))
+        self.assertThat(marker, Is(None))
+
+    def test_host_filter_only_asks_nova_for_host(self):
+        self.client.servers.list.return_value = [self._server('server_3')]
+        ids, marker = self._load(host='host_1')
+        self.assertThat(len(ids), Equals(1))
+        self.client.servers.list.assert_called_once_with(
+            search_opts={'all_tenants': 1, 'host': 'host_1'})
+        self.assertFalse(self.client.rdservers.get.called)
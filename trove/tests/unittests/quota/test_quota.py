@@ -14,6 +14,8 @@
 import testtools
 from mockito import mock, when, unstub, any, verify, never
 from mock import Mock
+from trove.common import utils
+from trove.quota.quota import AtomicDbQuotaDriver
 from trove.quota.quota import DbQuotaDriver
 from trove.quota.models import Resource
 from trove.quota.models import Quota
@@ -25,6 +27,7 @@ from trove.common import exception
 from trove.common import cfg
 from trove.quota.quota import run_with_quotas
 from trove.quota.quota import QUOTAS
+from trove.tests.unittests.util import util
 """
 Unit tests for the classes and functions in DbQuotaDriver.py.
 """
@@ -610,3 +613,96 @@ class DbQuotaDriverTest(testtools.TestCase):
         self.assertEqual(0, FAKE_QUOTAS[1].reserved)
         self.assertEqual(Reservation.Statuses.ROLLEDBACK,
                          FAKE_RESERVATIONS[1].status)
+
+
+class AtomicDbQuotaDriverTest(testtools.TestCase):
+
+    def setUp(self):
+        super(AtomicDbQuotaDriverTest, self).setUp()
+        util.init_db()
+        self.driver = AtomicDbQuotaDriver(resources)
+        self.tenant_id = utils.generate_uuid()
+        Quota.create(tenant_id=self.tenant_id,
+                     resource=Resource.INSTANCES,
+                     hard_limit=2)
+
+    def tearDown(self):
+        super(AtomicDbQuotaDriverTest, self).tearDown()
+        for usage in QuotaUsage.find_all(tenant_id=self.tenant_id).all():
+            for reservation in Reservation.find_all(usage_id=usage.id).all():
+                reservation.delete()
+            usage.delete()
+        for quota in Quota.find_all(tenant_id=self.tenant_id).all():
+            quota.delete()
+
+    def _usage(self, resource=Resource.INSTANCES):
+        return QuotaUsage.find_by(tenant_id=self.tenant_id, resource=resource)
+
+    def test_reserve(self):
+        reservations = self.driver.reserve(self.tenant_id, resources,
+                                           {'instances': 2})
+        usage = self._usage()
+        self.assertEqual(0, usage.in_use)
+        self.assertEqual(2, usage.reserved)
+        reservation = Reservation.find_by(id=reservations[0].id)
+        self.assertEqual(2, reservation.delta)
+        self.assertEqual(Reservation.Statuses.RESERVED, reservation.status)
+
+    def test_reserve_over_quota_reserves_nothing(self):
+        self.driver.reserve(self.tenant_id, resources, {'instances': 1})
+        self.assertRaises(exception.QuotaExceeded, self.driver.reserve,
+                          self.tenant_id, resources,
+                          {'instances': 2, 'volumes': 1})
+        self.assertEqual(1, self._usage().reserved)
+        self.assertEqual(0, self._usage(Resource.VOLUMES).reserved)
+        self.assertEqual(1, Reservation.find_all(
+            usage_id=self._usage().id).count())
+
+    def test_reserve_over_quota_but_can_apply_negative_deltas(self):
+        reservations = self.driver.reserve(self.tenant_id, resources,
+                                           {'instances': 2})
+        self.driver.commit(reservations)
+        Quota.find_by(tenant_id=self.tenant_id,
+                      resource=Resource.INSTANCES).delete()
+        Quota.create(tenant_id=self.tenant_id,
+                     resource=Resource.INSTANCES,
+                     hard_limit=1)
+        self.driver.reserve(self.tenant_id, resources, {'instances': -1})
+        self.assertEqual(-1, self._usage().reserved)
+
+    def test_commit(self):
+        reservations = self.driver.reserve(self.tenant_id, resources,
+                                           {'instances': 2, 'volumes': 3})
+        self.driver.commit(reservations)
+        self.assertEqual(2, self._usage().in_use)
+        self.assertEqual(0, self._usage().reserved)
+        self.assertEqual(3, self._usage(Resource.VOLUMES).in_use)
+        for reservation in reservations:
+            self.assertEqual(Reservation.Statuses.COMMITTED,
+                             reservation.status)
+            self.assertEqual(Reservation.Statuses.COMMITTED,
+                             Reservation.find_by(id=reservation.id).status)
+
+    def test_commit_twice_applies_once(self):
+        reservations = self.driver.reserve(self.tenant_id, resources,
+                                           {'instances': 1})
+        self.driver.commit(reservations)
+        self.driver.commit(reservations)
+        self.assertEqual(1, self._usage().in_use)
+        self.assertEqual(0, self._usage().reserved)
+
+    def test_commit_cannot_be_less_than_zero(self):
+        reservations = self.driver.reserve(self.tenant_id, resources,
+                                           {'instances': -1})
+        self.driver.commit(reservations)
+        self.assertEqual(0, self._usage().in_use)
+        self.assertEqual(0, self._usage().reserved)
+
+    def test_rollback(self):
+        reservations = self.driver.reserve(self.tenant_id, resources,
+                                           {'instances': 2})
+        self.driver.rollback(reservations)
+        self.assertEqual(0, self._usage().in_use)
+        self.assertEqual(0, self._usage().reserved)
+        self.assertEqual(Reservation.Statuses.ROLLEDBACK,
+                         Reservation.find_by(id=reservations[0].id).status)
@@ -236,6 +236,7 @@ class BackupTasksTest(testtools.TestCase):
         when(backup_models.Backup).delete(any()).thenReturn(None)
         when(backup_models.Backup).get_by_id(
             any(), self.backup.id).thenReturn(self.backup)
+        when(backup_models.Backup).children(any()).thenReturn([])
         when(backup_models.DBBackup).save(any()).thenReturn(self.backup)
         when(self.backup).delete(any()).thenReturn(None)
         self.swift_client = mock()
@@ -290,6 +291,21 @@ class BackupTasksTest(testtools.TestCase):
             self.backup.state,
             "backup should be in DELETE_FAILED status")
 
+    def test_delete_backup_with_children(self):
+        deleted = []
+        backup, child, grandchild = Mock(), Mock(), Mock()
+        for name, bkup in (('backup', backup), ('child', child),
+                           ('grandchild', grandchild)):
+            bkup.filename = None
+            bkup.delete.side_effect = lambda name=name: deleted.append(name)
+        when(backup_models.Backup).get_by_id(any(), 'parent').thenReturn(
+            backup)
+        when(backup_models.Backup).children('parent').thenReturn(
+            [child, grandchild])
+        taskmanager_models.BackupTasks.delete_backup('dummy context',
+                                                     'parent')
+        self.assertEqual(['grandchild', 'child', 'backup'], deleted)
+
     def test_parse_manifest(self):
         manifest = 'container/prefix'
         cont, prefix = taskmanager_models.BackupTasks._parse_manifest(manifest)
@@ -0,0 +1,129 @@
+#    Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import eventlet
+import mock
+from mock import Mock
+from mock import patch
+from testtools import TestCase
+from testtools.matchers import Equals
+
+from trove.common import exception
+from trove.taskmanager import manager
+from trove.taskmanager import waiters
+
+
+class WaitRegistryTest(TestCase):
+
+    def setUp(self):
+        super(WaitRegistryTest, self).setUp()
+        self.registry = waiters.WaitRegistry()
+        self.key = waiters.service_key('instance_1')
+
+    def test_notify_wakes_waiting_task(self):
+        retriever = Mock(side_effect=[False, True])
+        waiting = eventlet.spawn(self.registry.wait_until, [self.key],
+                                 retriever, sleep_time=60, time_out=120)
+        eventlet.sleep(0)
+        self.assertThat(self.registry.waiting(self.key), Equals(1))
+        self.registry.notify(self.key)
+        with eventlet.Timeout(1):
+            self.assertTrue(waiting.wait())
+        self.assertThat(retriever.call_count, Equals(2))
+        self.assertThat(self.registry.waiting(self.key), Equals(0))
+
+    def test_notify_other_key_does_not_wake(self):
+        retriever = Mock(return_value=False)
+        waiting = eventlet.spawn(self.registry.wait_until, [self.key],
+                                 retriever, sleep_time=60, time_out=120)
+        eventlet.sleep(0)
+        self.registry.notify(waiters.service_key('instance_2'))
+        eventlet.sleep(0)
+        self.assertThat(retriever.call_count, Equals(1))
+        waiting.kill()
+
+    @patch.object(waiters, 'CONF')
+    def test_fallback_interval_backs_off(self, conf):
+        conf.task_wait_max_fallback_interval = 0.04
+        conf.poll_jitter = 0
+        retriever = Mock(return_value=False)
+        self.assertRaises(exception.PollTimeOut, self.registry.wait_until,
+                          [self.key], retriever, sleep_time=0.01,
+                          time_out=0.15)
+        # Waits of 0.01, 0.02, 0.04, 0.04 and the rest before the timeout,
+        # where a fixed interval would have polled fifteen times.
+        self.assertTrue(retriever.call_count <= 7)
+        self.assertThat(self.registry.waiting(self.key), Equals(0))
+
+    @patch.object(waiters, 'CONF')
+    def test_disabled_registry_polls(self, conf):
+        conf.task_wait_notifications = False
+        retriever = Mock(side_effect=[False, True])
+        self.assertTrue(waiters.wait_until([self.key], retriever,
+                                           sleep_time=0.01, time_out=1,
+                                           name='disabled_wait'))
+        self.assertThat(waiters.REGISTRY.waiting(self.key), Equals(0))
+
+    @patch.object(waiters, 'CONF')
+    def test_unnotified_server_keys_poll(self, conf):
+        conf.task_wait_notifications = True
+        conf.nova_notification_topic = None
+        retriever = Mock(side_effect=[False, True])
+        key = waiters.server_key('server_1')
+        with patch.object(waiters.utils, 'poll_until') as poll_until:
+            waiters.wait_until([key], retriever, sleep_time=2, time_out=10,
+                               name='server_wait')
+        poll_until.assert_called_once_with(retriever, mock.ANY, sleep_time=2,
+                                           time_out=10, name='server_wait')
+        self.assertThat(waiters.REGISTRY.waiting(key), Equals(0))
+
+    @patch.object(waiters, 'CONF')
+    def test_notified_keys_wait_on_registry(self, conf):
+        conf.task_wait_notifications = True
+        conf.nova_notification_topic = None
+        conf.task_wait_fallback_interval = 5
+        keys = [waiters.service_key('instance_1'),
+                waiters.server_key('server_1')]
+        with patch.object(waiters.REGISTRY, 'wait_until') as wait_until:
+            waiters.wait_until(keys, Mock(), sleep_time=1, time_out=10)
+        self.assertThat(wait_until.call_args[1]['sleep_time'], Equals(5))
+
+
+class ManagerNotificationTest(TestCase):
+
+    def setUp(self):
+        super(ManagerNotificationTest, self).setUp()
+        self.manager = manager.Manager()
+        self.notify = Mock()
+        self.original_notify = waiters.REGISTRY.notify
+        waiters.REGISTRY.notify = self.notify
+
+    def tearDown(self):
+        super(ManagerNotificationTest, self).tearDown()
+        waiters.REGISTRY.notify = self.original_notify
+
+    def test_service_status_changed(self):
+        self.manager.service_status_changed(None, ['instance_1'])
+        self.notify.assert_called_once_with(
+            waiters.service_key('instance_1'))
+
+    def test_nova_notification(self):
+        self.manager._process_nova_notification(
+            {'event_type': 'compute.instance.update',
+             'payload': {'instance_id': 'server_1'}})
+        self.notify.assert_called_once_with(waiters.server_key('server_1'))
+
+    def test_other_nova_notification_ignored(self):
+        self.manager._process_nova_notification(
+            {'event_type': 'compute.metrics.update', 'payload': {}})
+        self.assertFalse(self.notify.called)